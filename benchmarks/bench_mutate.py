@@ -0,0 +1,220 @@
+"""
+This script times the stages of the generation of mutations and writes the results in a json file
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from os.path import abspath, dirname, join
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+from pmx import Model
+from pmx.rotamer import load_bbdep, get_rotamers, select_best_rotamer
+from satumut.mutate_pdb import Mutagenesis, annotate_pdb, load_rotamers, rotamer_version
+from satumut.helper import read_pdb
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the generation of mutations")
+    parser.add_argument("-i", "--input", required=False, default="data/test/PK2_F454T.pdb",
+                        help="Include PDB file's path")
+    parser.add_argument("-p", "--position", required=False, default="A:135",
+                        help="The position to mutate -> Chain ID:position")
+    parser.add_argument("-p2", "--position2", required=False, default="A:454",
+                        help="The second position for the double mutants -> Chain ID:position")
+    parser.add_argument("-s", "--scale", required=False, nargs="+", type=int, default=[1, 2],
+                        help="Number of copies of the input in the synthetic structures")
+    parser.add_argument("-r", "--repeat", required=False, default=3, type=int,
+                        help="How many times each stage is timed")
+    parser.add_argument("-o", "--out", required=False, default="bench_results.json",
+                        help="The json file for the results")
+    parser.add_argument("-c", "--compare", required=False,
+                        help="A json file from a previous run to compare with")
+    args = parser.parse_args()
+
+    return args.input, args.position, args.position2, args.scale, args.repeat, args.out, args.compare
+
+
+def timeit(func, repeat=3):
+    """
+    Times a function
+
+    Parameters
+    ___________
+    func: callable
+        The function to time, without arguments
+    repeat: int, optional
+        How many times to run it
+
+    Returns
+    _______
+    seconds: list[float]
+        The time of each run
+    """
+    seconds = []
+    for _ in range(repeat):
+        start = time.time()
+        func()
+        seconds.append(time.time() - start)
+    return seconds
+
+
+def synthetic_pdb(input_, copies, folder):
+    """
+    Builds a larger structure with copies of the input translated along x, each copy with new chain IDs
+
+    Parameters
+    ___________
+    input_: str
+        The input PDB
+    copies: int
+        The number of copies, 1 returns the input
+    folder: str
+        The folder for the new PDB
+
+    Returns
+    _______
+    pdb: str
+        The path of the structure
+    """
+    if copies == 1:
+        return input_
+    records = read_pdb(input_).lines
+    atoms = [line for line in records if line.startswith("ATOM") or line.startswith("HETATM")]
+    chains = sorted(set(line[21] for line in atoms))
+    free = [c for c in "BDEFGHIJKMNOPQRSTUVWXYZ" if c not in chains]
+    if len(free) < (copies - 1) * len(chains):
+        raise Exception("There are not enough chain IDs for {} copies".format(copies))
+    lines = []
+    for copy_ in range(copies):
+        names = dict(zip(chains, chains if copy_ == 0 else free[(copy_ - 1) * len(chains):copy_ * len(chains)]))
+        for line in records:
+            if line.startswith("ATOM") or line.startswith("HETATM"):
+                x = float(line[30:38]) + 150.0 * copy_
+                lines.append("{}{}{}{:8.3f}{}".format(line[:21], names[line[21]], line[22:30], x, line[38:]))
+            elif copy_ == 0 and not line.startswith("END"):
+                lines.append(line)
+    lines.append("END\n")
+    pdb = join(folder, "synthetic_{}.pdb".format(copies))
+    with open(pdb, "w") as new:
+        new.writelines(lines)
+    return pdb
+
+
+def bench_structure(input_, position, position2, repeat, folder):
+    """
+    Times every stage of the mutagenesis on one structure
+
+    Parameters
+    ___________
+    input_: str
+        The PDB file
+    position: str
+        The position to mutate
+    position2: str
+        The second position for the double mutants
+    repeat: int
+        How many times each stage is timed
+    folder: str
+        A temporary folder for the PDB files
+
+    Returns
+    _______
+    results: list[dict]
+        One entry per stage with the times in seconds
+    """
+    atoms = len(read_pdb(input_))
+    results = []
+
+    def record(stage, seconds, **extra):
+        entry = {"stage": stage, "structure": os.path.basename(input_), "atoms": atoms, "seconds": seconds,
+                 "median": sorted(seconds)[len(seconds) // 2]}
+        entry.update(extra)
+        results.append(entry)
+        print("{:<35} {:>8} atoms {:>10.4f} s".format(stage + " " + str(extra.get("residue", "")), atoms,
+                                                       entry["median"]))
+
+    record("parse", timeit(lambda: Model(input_), repeat))
+    record("load_bbdep", timeit(load_bbdep, 1))
+    rotamers = load_rotamers()
+    out = join(folder, "out")
+    run = Mutagenesis(input_, position, out, rotamers=rotamers)
+    run._check_coords()
+    residue = run.chain.residues[run.position]
+    phi, psi = residue.get_phi(), residue.get_psi()
+    for new_aa in Mutagenesis.residues:
+        candidates = get_rotamers(rotamers, new_aa, phi, psi, residue=residue, full=True, hydrogens=True)
+        record("select_best_rotamer", timeit(lambda: select_best_rotamer(run.model, candidates), repeat),
+               residue=new_aa, rotamers=len(candidates))
+        record("select_rotamer", timeit(lambda: run.select_rotamer(residue, candidates), repeat),
+               residue=new_aa, rotamers=len(candidates))
+    pdb = join(folder, "write.pdb")
+    record("write", timeit(lambda: run.model.write(pdb), repeat))
+    atom_map = read_pdb(input_).element_map()
+
+    def insert():
+        run.model.write(pdb)
+        annotate_pdb(pdb, atom_map, [(run.chain_id, run.position + 1)])
+    record("write+insert_atomtype", timeit(insert, repeat))
+
+    def saturate():
+        shutil.rmtree(out, ignore_errors=True)
+        saturation = Mutagenesis(input_, position, out, rotamers=rotamers)
+        saturation.saturated_mutagenesis()
+        saturation.insert_atomtypes()
+    record("saturation", timeit(saturate, 1))
+
+    first_aa = [aa for aa in Mutagenesis.residues if aa != residue.resname][0]
+
+    def double():
+        saturation = Mutagenesis(input_, position, out, rotamers=rotamers)
+        saturation.double_mutagenesis(position2, first_aa)
+    record("double_mutants_one_site", timeit(double, 1))
+
+    return results
+
+
+def compare(results, previous):
+    """
+    Prints the ratio of the medians with respect to a previous run
+
+    Parameters
+    ___________
+    results: list[dict]
+        The new results
+    previous: str
+        The json file of the previous run
+    """
+    with open(previous, "r") as old:
+        old = json.load(old)["results"]
+    old = {(r["stage"], r["structure"], r.get("residue")): r["median"] for r in old}
+    for r in results:
+        key = (r["stage"], r["structure"], r.get("residue"))
+        if old.get(key):
+            print("{:<35} {:<16} {:>6.2f}x".format(r["stage"] + " " + str(r.get("residue", "")), r["structure"],
+                                                    r["median"] / old[key]))
+
+
+def main():
+    input_, position, position2, scale, repeat, out, previous = parse_args()
+    folder = tempfile.mkdtemp()
+    results = []
+    try:
+        for copies in scale:
+            pdb = synthetic_pdb(input_, copies, folder)
+            results.extend(bench_structure(pdb, position, position2, repeat, folder))
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    with open(out, "w") as res:
+        json.dump({"python": platform.python_version(), "rotamers": rotamer_version(), "time": time.time(),
+                   "results": results}, res, indent=1)
+    if previous:
+        compare(results, previous)
+
+
+if __name__ == "__main__":
+    main()
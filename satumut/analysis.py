@@ -1,612 +1,2003 @@
-from glob import glob
-import pandas as pd
-import seaborn as sns
-import argparse
-from os.path import basename, dirname, abspath, isdir, isfile, join
-import os
-import sys
-import re
-from fpdf import FPDF
-import logging
-import matplotlib.pyplot as plt
-import multiprocessing as mp
-from functools import partial
-from helper import isiterable
-plt.switch_backend('agg')
-
-
-def parse_args():
-    parser = argparse.ArgumentParser(description="Analyse the different PELE simulations and create plots")
-    # main required arguments
-    parser.add_argument("--inp", required=True,
-                        help="Include a file or list with the path to the folders with PELE simulations inside")
-    parser.add_argument("--dpi", required=False, default=800, type=int,
-                        help="Set the quality of the plots")
-    parser.add_argument("--box", required=False, default=30, type=int,
-                        help="Set how many data points are used for the boxplot")
-    parser.add_argument("--traj", required=False, default=10, type=int,
-                        help="Set how many PDBs are extracted from the trajectories")
-    parser.add_argument("--out", required=False, default="summary",
-                        help="Name of the summary file created at the end of the analysis")
-    parser.add_argument("--folder", required=False,
-                        help="Path of the plots folder")
-    parser.add_argument("--analyse", required=False, choices=("energy", "distance", "all"), default="distance",
-                        help="The metric to measure the improvement of the system")
-    parser.add_argument("--cpus", required=False, default=24, type=int,
-                        help="Include the number of cpus desired")
-    parser.add_argument("--thres", required=False, default=-0.1, type=float,
-                        help="The threshold for the improvement which will affect what will be included in the summary")
-    args = parser.parse_args()
-
-    return [args.inp, args.dpi, args.box, args.traj, args.out, args.folder, args.analyse,
-            args.cpus, args.thres]
-
-
-class SimulationData:
-    """
-    A class to store data from the simulations
-    """
-    def __init__(self, folder, points=30, pdb=10):
-        """
-        Initialize the SimulationData Object
-
-        Parameters
-        ___________
-        folder: str
-            path to the simulation folder
-        points: int, optional
-            Number of points to consider for the boxplots
-        pdb: int, optional
-            how many pdbs to extract from the trajectories
-        """
-        self.folder = folder
-        self.dataframe = None
-        self.distance = None
-        self.dist_diff = None
-        self.profile = None
-        self.trajectory = None
-        self.points = points
-        self.pdb = pdb
-        self.binding = None
-        self.bind_diff = None
-
-    def filtering(self):
-        """
-        Constructs a dataframe from all the reports in a PELE simulation folder with the best 20% binding energies
-        and a Series with the 100 best ligand distances
-        """
-        pd.options.mode.chained_assignment = None
-        reports = []
-        for files in glob("{}/output/0/report_*".format(self.folder)):
-            rep = basename(files).split("_")[1]
-            data = pd.read_csv(files, sep="    ", engine="python")
-            data['#Task'].replace({1: rep}, inplace=True)
-            data.rename(columns={'#Task': "ID"}, inplace=True)
-            reports.append(data)
-        self.dataframe = pd.concat(reports)
-        self.dataframe.sort_values(by="Binding Energy", inplace=True)
-        self.dataframe.reset_index(drop=True, inplace=True)
-        self.dataframe = self.dataframe.iloc[:len(self.dataframe) - 99]
-
-        # for the PELE profiles
-        self.profile = self.dataframe.drop(["Step", "numberOfAcceptedPeleSteps", 'ID'], axis=1)
-        self.trajectory = self.dataframe.sort_values(by="distance0.5")
-        self.trajectory.reset_index(drop=True, inplace=True)
-        self.trajectory.drop(["Step", 'sasaLig', 'currentEnergy'], axis=1, inplace=True)
-        self.trajectory = self.trajectory.iloc[:self.pdb]
-
-        # For the box plots
-        data_20 = self.dataframe.iloc[:len(self.dataframe) * 20 / 100]
-        data_20.sort_values(by="distance0.5", inplace=True)
-        data_20.reset_index(drop=True, inplace=True)
-        data_20 = data_20.iloc[:min(self.points, len(data_20))]
-        self.distance = data_20["distance0.5"].copy()
-        self.binding = data_20["Binding Energy"].copy()
-        self.binding.sort_values(inplace=True)
-        self.binding.reset_index(drop=True, inplace=True)
-
-        if "original" in self.folder:
-            self.distance = self.distance.iloc[0]
-            self.binding = self.binding.iloc[0]
-
-    def set_distance(self, original_distance):
-        """
-        Set the distance difference
-
-        Parameters
-        __________
-        original_distance: int
-            The distrance for the wild type
-
-        """
-        self.dist_diff = self.distance - original_distance
-
-    def set_binding(self, original_binding):
-        """
-        Set the binding energy difference
-
-        Parameters
-        __________
-        original_binding: int
-            The binding energy for the wild type
-        """
-        self.bind_diff = self.binding - original_binding
-
-
-def analyse_all(folders=".", box=30, traj=10):
-    """
-    Analyse all the 19 simulations folders and build SimulationData objects for each of them
-
-    Parameters
-    ___________
-    folders: str, optional
-        path to the different PELE simulation folders to be analyzed
-    box: int, optional
-        How many points to use for the box plots
-    traj: int, optional
-        How many snapshots to extract from the trajectories
-
-    Returns
-    _______
-    data_dict: dict
-        Dictionary of SimulationData objects
-    """
-    data_dict = {}
-    if len(folders.split("/")) > 1:
-        mutation_dir = dirname(folders)
-        original = SimulationData("{}/PELE_original".format(mutation_dir), points=box, pdb=traj)
-    else:
-        original = SimulationData("PELE_original", points=box, pdb=traj)
-    original.filtering()
-    data_dict["original"] = original
-    for folder in glob("{}/PELE_*".format(folders)):
-        name = basename(folder)
-        data = SimulationData(folder, points=box, pdb=traj)
-        data.filtering()
-        data.set_distance(original.distance)
-        data.set_binding(original.binding)
-        data_dict[name[5:]] = data
-
-    return data_dict
-
-
-def box_plot(res_dir, data_dict, position_num, dpi=800):
-    """
-    Creates a box plot of the 19 mutations from the same position
-
-    Parameters
-    ___________
-    res_dir: str
-        name of the results folder
-    data_dict: dict
-        A dictionary that contains SimulationData objects from the simulation folders
-    position_num: str
-        Position at the which the mutations occurred
-    dpi: int, optional
-        The quality of the plots produced
-    """
-    if not os.path.exists("{}_results/Plots/box".format(res_dir)):
-        os.makedirs("{}_results/Plots/box".format(res_dir))
-    # create a dataframe with only the distance differences for each simulation
-    plot_dict_dist = {}
-    plot_dict_bind = {}
-    for key, value in data_dict.items():
-        if "original" not in key:
-            plot_dict_dist[key] = value.dist_diff
-            plot_dict_bind[key] = value.bind_diff
-
-    data_dist = pd.DataFrame(plot_dict_dist)
-    data_bind = pd.DataFrame(plot_dict_bind)
-
-    # Distance boxplot
-    sns.set(font_scale=1.8)
-    sns.set_style("ticks")
-    sns.set_context("paper")
-    ax = sns.catplot(data=data_dist, kind="box", palette="Accent", height=4.5, aspect=2.3)
-    ax.set(title="{} distance variation with respect to wild type".format(position_num))
-    ax.set_ylabels("Distance variation", fontsize=8)
-    ax.set_xlabels("Mutations {}".format(position_num), fontsize=6)
-    ax.set_xticklabels(fontsize=6)
-    ax.set_yticklabels(fontsize=6)
-    ax.savefig("{}_results/Plots/box/{}_distance.png".format(res_dir, position_num), dpi=dpi)
-
-    # Binding energy Box plot
-    ex = sns.catplot(data=data_bind, kind="box", palette="Accent", height=4.5, aspect=2.3)
-    ex.set(title="{} Binding energy variation with respect to wild type".format(position_num))
-    ex.set_ylabels("Binding energy variation", fontsize=8)
-    ex.set_xlabels("Mutations {}".format(position_num), fontsize=6)
-    ex.set_xticklabels(fontsize=6)
-    ex.set_yticklabels(fontsize=6)
-    ex.savefig("{}_results/Plots/box/{}_binding.png".format(res_dir, position_num), dpi=dpi)
-    plt.close("all")
-
-
-def pele_profile_single(key, mutation, res_dir, wild, type_, position_num, dpi=800):
-    """
-    Creates a plot for a single mutation
-
-    Parameters
-    ___________
-    key: str
-        name for the axis title and plot
-    mutation: SimulationData
-        A SimulationData object
-    res_dir: str
-        name of the results folder
-    wild: SimulationData
-        SimulationData object that stores data for the wild type protein
-    type_: str
-        Type of scatter plot - distance0.5, sasaLig or currentEnergy
-    position_num: str
-        name for the folder to keep the images from the different mutations
-    dpi: int, optional
-        Quality of the plots
-    """
-    # Configuring the plot
-    sns.set(font_scale=1.2)
-    sns.set_style("ticks")
-    sns.set_context("paper")
-    original = wild.profile
-    original.index = ["Wild type"] * len(original)
-    distance = mutation.profile
-    distance.index = [key] * len(distance)
-    cat = pd.concat([original, distance], axis=0)
-    cat.index.name = "Type"
-    cat.reset_index(inplace=True)
-    # Creating the scatter plots
-    if not os.path.exists("{}_results/Plots/scatter_{}_{}".format(res_dir, position_num, type_)):
-        os.makedirs("{}_results/Plots/scatter_{}_{}".format(res_dir, position_num, type_))
-    ax = sns.relplot(x=type_, y='Binding Energy', hue="Type", style="Type", palette="Set1", data=cat,
-                     height=3.5, aspect=1.5, s=80, linewidth=0)
-
-    ax.set(title="{} scatter plot of binding energy vs {} ".format(key, type_))
-    ax.savefig("{}_results/Plots/scatter_{}_{}/{}_{}.png".format(res_dir, position_num, type_,
-                                                                 key, type_), dpi=dpi)
-    plt.close(ax.fig)
-
-
-def pele_profiles(type_, res_dir, data_dict, position_num, dpi=800):
-    """
-    Creates a scatter plot for each of the 19 mutations from the same position by comparing it to the wild type
-
-    Parameters
-    ___________
-    type_: str
-        distance0.5, sasaLig or currentEnergy - different possibilities for the scatter plot
-    res_dir: str
-        Name of the results folder
-    data_dict: dict
-        A dictionary that contains SimulationData objects from the 19 simulation folders
-    position_num: str
-        Name for the folders where you want the scatter plot go in
-    dpi: int, optional
-        Quality of the plots
-    """
-    for key, value in data_dict.items():
-        if "original" not in key:
-            pele_profile_single(key, value, res_dir=res_dir, wild=data_dict["original"],
-                                type_=type_, position_num=position_num, dpi=dpi)
-
-
-def all_profiles(res_dir, data_dict, position_num, dpi=800):
-    """
-    Creates all the possible scatter plots for the same mutated position
-
-    Parameters
-    ___________
-    res_dir: str
-        Name of the results folder for the output
-    data_dict: dict
-        A dictionary that contains SimulationData objects from the simulation folders
-    position_num: str
-        name for the folders where you want the scatter plot go in
-    dpi: int, optional
-        Quality of the plots
-    """
-    types = ["distance0.5", "sasaLig", "currentEnergy"]
-    for type_ in types:
-        pele_profiles(type_, res_dir, data_dict, position_num, dpi)
-
-
-def extract_snapshot_from_pdb(res_dir, simulation_folder, f_id, position_num, mutation, step, dist, bind):
-    """
-    Extracts PDB files from trajectories
-
-    Parameters
-    ___________
-    res_dir: str
-        Name of the results folder where to store the output
-    simulation_folder: str
-        Path to the simulation folder
-    f_id: str
-        trajectory file ID
-    position_num: str
-        The folder name for the output of this function for the different simulations
-    mutation: str
-        The folder name for the output of this function for one of the simulations
-    step: int
-        The step in the trajectory you want to keep
-    dist: float
-        The distance between ligand and protein (used as name for the result file - not essential)
-    bind: float
-        The binding energy between ligand and protein (used as name for the result file - not essential)
-    """
-    if not os.path.exists("{}_results/distances_{}/{}_pdbs".format(res_dir, position_num, mutation)):
-        os.makedirs("{}_results/distances_{}/{}_pdbs".format(res_dir, position_num, mutation))
-
-    f_in = glob("{}/output/0/*trajectory*_{}.*".format(simulation_folder, f_id))
-    if len(f_in) == 0:
-        sys.exit("Trajectory_{} not found. Be aware that PELE trajectories must contain the label 'trajectory' in "
-                 "their file name to be detected".format(f_id))
-    f_in = f_in[0]
-    with open(f_in, 'r') as res_dirfile:
-        file_content = res_dirfile.read()
-    trajectory_selected = re.search(r'MODEL\s+{}(.*?)ENDMDL'.format(int(step) + 1), file_content, re.DOTALL)
-
-    # Output Snapshot
-    traj = []
-    path_ = "{}_results/distances_{}/{}_pdbs".format(res_dir, position_num, mutation)
-    name = "traj{}_step{}_dist{}_bind{}.pdb".format(f_id, step, round(dist, 2), round(bind, 2))
-    with open(os.path.join(path_, name), 'w') as f:
-        traj.append("MODEL     {}".format(int(step) + 1))
-        try:
-            traj.append(trajectory_selected.group(1))
-        except AttributeError:
-            raise AttributeError("Model not found")
-        traj.append("ENDMDL\n")
-        f.write("\n".join(traj))
-
-
-def extract_10_pdb_single(info, res_dir, data_dict):
-    """
-    Extracts the top 10 distances for one mutation
-
-    Parameters
-    ___________
-    info: iterable
-       An iterable with the variables simulation_folder, position_num and mutation
-    res_dir: str
-       Name of the results folder
-    data_dict: dict
-       A dictionary that contains SimulationData objects from the simulation folders
-    """
-    simulation_folder, position_num, mutation = info
-    data = data_dict[mutation]
-    for ind in data.trajectory.index:
-        ids = data.trajectory["ID"][ind]
-        step = data.trajectory["numberOfAcceptedPeleSteps"][ind]
-        dist = data.trajectory["distance0.5"][ind]
-        bind = data.trajectory["Binding Energy"][ind]
-        extract_snapshot_from_pdb(res_dir, simulation_folder, ids, position_num, mutation, step, dist, bind)
-
-
-def extract_all(res_dir, data_dict, folders, cpus=24):
-    """
-    Extracts the top 10 distances for the 19 mutations at the same position
-
-    Parameters
-    ___________
-    res_dir: str
-       name of the results folder
-    data_dict: dict
-       A dictionary that contains SimulationData objects from the 19 simulation folders
-    folders: str
-       Path to the folder that has all the simulations at the same position
-    cpus: int, optional
-       How many cpus to paralelize the function
-
-    """
-    args = []
-    for pele in glob("{}/PELE_*".format(folders)):
-        name = basename(pele)[5:]
-        output = basename(dirname(pele))
-        args.append((pele, output, name))
-
-    # parallelizing the function
-    p = mp.Pool(cpus)
-    func = partial(extract_10_pdb_single, res_dir=res_dir, data_dict=data_dict)
-    p.map(func, args, 1)
-    p.close()
-    p.terminate()
-
-
-def create_report(res_dir, mutation, position_num, output="summary", analysis="distance"):
-    """
-    Create pdf files with the plots of chosen mutations and the path to the
-
-    Parameters
-    ___________
-    res_dir: str
-       Name of the results folder
-    mutation: dict
-       A dictionary of SimulationData objects {key: SimulationData}
-    position_num: str
-       part of the path to the plots, the position that was mutated
-    output: str, optional
-       The pdf filename without the extension
-    analysis: str, optional
-       Type of the analysis (distance, binding or all)
-
-    Returns
-    _______
-    name: str
-       The path of the pdf file
-    """
-    pdf = FPDF()
-    pdf.set_top_margin(17.0)
-    pdf.set_left_margin(15.0)
-    pdf.set_right_margin(15.0)
-    pdf.add_page()
-
-    # Title
-    pdf.set_font('Arial', 'B', 14)
-    pdf.cell(0, 10, "Best mutations in terms of distance and/or binding energy", align='C', ln=1)
-    pdf.set_font('Arial', '', size=10)
-    for key, val in mutation.items():
-        dis = val.dist_diff.median()
-        bind = val.bind_diff.median()
-        message = 'Mutation {}: median distance increment {}, median binding energy increment {}'.format(key, dis, bind)
-        pdf.ln(3)  # linebreaks
-        pdf.cell(0, 5, message, ln=1)
-    pdf.ln(8)  # linebreaks
-
-    # box plots
-    pdf.set_font('Arial', 'B', size=12)
-    pdf.cell(0, 10, "Box plot of {}".format(analysis), align='C', ln=1)
-    pdf.ln(8)
-    if analysis == "distance":
-        box1 = "{}_results/Plots/box/{}_distance.png".format(res_dir, position_num)
-        pdf.image(box1, w=180)
-        pdf.ln(1000000)
-    elif analysis == "energy":
-        box1 = "{}_results/Plots/box/{}_binding.png".format(res_dir, position_num)
-        pdf.image(box1, w=180)
-        pdf.ln(1000000)
-    elif analysis == "all":
-        box1 = "{}_results/Plots/box/{}_distance.png".format(res_dir, position_num)
-        box2 = "{}_results/Plots/box/{}_binding.png".format(res_dir, position_num)
-        pdf.image(box1, w=180)
-        pdf.ln(5)
-        pdf.image(box2, w=180)
-        pdf.ln(1000000)
-
-    # Plots
-    pdf.set_font('Arial', 'B', size=12)
-    pdf.cell(0, 10, "Scatter plots", align='C', ln=1)
-    pdf.set_font('Arial', '', size=10)
-    for mut, key in mutation.items():
-        pdf.ln(3)
-        pdf.cell(0, 10, "Plots {}".format(mut), ln=1)
-        pdf.ln(3)
-        plot1 = "{}_results/Plots/scatter_{}_{}/{}_{}.png".format(res_dir, position_num, "distance0.5", mut,
-                                                                  "distance0.5")
-        plot2 = "{}_results/Plots/scatter_{}_{}/{}_{}.png".format(res_dir, position_num, "sasaLig", mut, "sasaLig")
-        plot3 = "{}_results/Plots/scatter_{}_{}/{}_{}.png".format(res_dir, position_num, "currentEnergy", mut,
-                                                                  "currentEnergy")
-        pdf.image(plot1, w=180)
-        pdf.ln(3)
-        pdf.image(plot2, w=180)
-        pdf.ln(1000000)  # page break
-        pdf.ln(3)
-        pdf.image(plot3, w=180)
-        pdf.ln(1000000)  # page break
-
-    # Top poses
-    pdf.set_font('Arial', 'B', size=12)
-    pdf.cell(0, 10, "Path to the top poses", align='C', ln=1)
-    pdf.set_font('Arial', size=10)
-    pdf.ln(5)
-    for mut, key in mutation.items():
-        path = "{}_results/distances_{}/{}_pdbs".format(res_dir, position_num, mut)
-        pdf.cell(0, 10, "{}: {} ".format(mut, abspath(path)), ln=1)
-        pdf.ln(5)
-
-    # Output report
-    name = "{}_results/{}_{}.pdf".format(res_dir, output, position_num)
-    pdf.output(name, 'F')
-    return name
-
-
-def find_top_mutations(res_dir, data_dict, position_num, output="summary", analysis="distance", thres=-0.1):
-    """
-    Finds those mutations that decreases the binding distance and binding energy and creates a report
-
-    Parameters
-    ___________
-    res_dir: str
-       Name of the results folder
-    data_dict: dict
-       A dictionary of SimulationData objects that holds information for all mutations
-    position_num: str
-       The position that was mutated
-    output: str, optional
-       Name of the reports created
-    analysis: str, optional
-       Choose between ("distance", "binding" or "all") to specify how to filter the mutations to keep
-    thres: float, optional
-       Set the threshold for those mutations to be included in the pdf
-    """
-    # Find top mutations
-    logging.basicConfig(filename='{}_results/top_mutations.log'.format(res_dir), level=logging.DEBUG)
-    count = 0
-    mutation_dict = {}
-    for key, value in data_dict.items():
-        if "original" not in key:
-            if analysis == "distance" and value.dist_diff.median() < thres:
-                mutation_dict[key] = value
-                count += 1
-            elif analysis == "energy" and value.bind_diff.median() < thres:
-                mutation_dict[key] = value
-                count += 1
-            elif analysis == "all" and value.dist_diff.median() < thres and value.bind_diff.median() < thres:
-                mutation_dict[key] = value
-                count += 1
-
-    # Create a summary report with the top mutations
-    if len(mutation_dict) != 0:
-        logging.info(
-            "{} mutations at position {} decrease {} by {} or less".format(count, position_num, analysis, thres))
-        create_report(res_dir, mutation_dict, position_num, output, analysis)
-    else:
-        logging.warning("No mutations at position {} decrease {} by {} or less".format(position_num, analysis, thres))
-
-
-def consecutive_analysis(file_name, dpi=800, box=30, traj=10, output="summary",
-                         plot_dir=None, opt="distance", cpus=24, thres=-0.1):
-    """
-    Creates all the plots for the different mutated positions
-
-    Parameters
-    ___________
-    file_name : str, iterable, directory
-       A file, an iterable that contains the path to the PELE simulations folders or
-       the path to the folders where the simulations are stored --> it is equivalent to dirname(iterable[0])
-    dpi : int, optional
-       The quality of the plots
-    box : int, optional
-       how many points are used for the box plots
-    traj : int, optional
-       how many top pdbs are extracted from the trajectories
-    output : str, optional
-       name of the output file for the pdfs
-    plot_dir : str
-       Name for the results folder
-    opt : str, optional
-       choose if to analyse distance, binding or all
-    cpus : int, optional
-       How many cpus to use to extract the top pdbs
-    thres : float, optional
-       The threshold for the mutations to be included in the pdf
-    """
-    if isfile(str(file_name)):
-        with open("{}".format(file_name), "r") as pele:
-            pele_folders = pele.readlines()
-    elif isdir(str(file_name)):
-        pele_folders = list(filter(isdir, os.listdir(file_name)))
-        pele_folders = [join(file_name, folder) for folder in pele_folders]
-    elif isiterable(file_name):
-        pele_folders = file_name[:]
-    else:
-        raise Exception("No file or iterable passed")
-
-    if not plot_dir:
-        plot_dir = pele_folders[0].strip("\n")
-        plot_dir = basename(dirname(plot_dir)).replace("_mutations", "")
-    for folders in pele_folders:
-        folders = folders.strip("\n")
-        base = basename(folders)
-        data_dict = analyse_all(folders, box=box, traj=traj)
-        box_plot(plot_dir, data_dict, base, dpi)
-        all_profiles(plot_dir, data_dict, base, dpi)
-        extract_all(plot_dir, data_dict, folders, cpus=cpus)
-        find_top_mutations(plot_dir, data_dict, base, output, analysis=opt, thres=thres)
-
-
-def main():
-    inp, dpi, box, traj, out, folder, analysis, cpus, thres = parse_args()
-    consecutive_analysis(inp, dpi, box, traj, out, folder, analysis, cpus, thres)
-
-
-if __name__ == "__main__":
-    # Run this if this file is executed from command line but not if is imported as API
-    main()
+from glob import glob
+import pandas as pd
+import numpy as np
+import seaborn as sns
+import argparse
+from os.path import basename, dirname, abspath, isdir, isfile, join
+import os
+import sys
+import json
+import mmap
+import re
+import time
+import traceback
+try:
+    from Queue import Empty
+except ImportError:
+    from queue import Empty
+from fpdf import FPDF
+import logging
+import matplotlib.pyplot as plt
+import multiprocessing as mp
+from functools import partial
+from helper import isiterable, Log, QueueHandler, listen_logs, ArtifactCache, file_signature, atomic_write
+from store import write_simulation
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+plt.switch_backend('agg')
+
+# The columns of the reports that are not read as floats, the rest are float32 to halve the memory of the frames
+REPORT_INTEGERS = {"#Task": np.int16, "Step": np.int32, "numberOfAcceptedPeleSteps": np.int32}
+# The empty lines of a report, the C parser of pandas skips them
+BLANK_LINE = re.compile(r"^[ \t\r\f\v]*\n", re.M)
+# The scatter plots of binding energy created for each mutation
+PROFILE_TYPES = ("distance0.5", "sasaLig", "currentEnergy")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Analyse the different PELE simulations and create plots")
+    # main required arguments
+    parser.add_argument("--inp", required=True,
+                        help="Include a file or list with the path to the folders with PELE simulations inside")
+    parser.add_argument("--dpi", required=False, default=800, type=int,
+                        help="Set the quality of the plots")
+    parser.add_argument("--box", required=False, default=30, type=int,
+                        help="Set how many data points are used for the boxplot")
+    parser.add_argument("--traj", required=False, default=10, type=int,
+                        help="Set how many PDBs are extracted from the trajectories")
+    parser.add_argument("--out", required=False, default="summary",
+                        help="Name of the summary file created at the end of the analysis")
+    parser.add_argument("--folder", required=False,
+                        help="Path of the plots folder")
+    parser.add_argument("--analyse", required=False, choices=("energy", "distance", "all"), default="distance",
+                        help="The metric to measure the improvement of the system")
+    parser.add_argument("--cpus", required=False, default=24, type=int,
+                        help="Include the number of cpus desired")
+    parser.add_argument("--thres", required=False, default=-0.1, type=float,
+                        help="The threshold for the improvement which will affect what will be included in the summary")
+    parser.add_argument("--positions", required=False, default=1, type=int,
+                        help="How many positions are analysed at the same time, they share the cpus")
+    parser.add_argument("--render", required=False, default=1, type=int,
+                        help="How many plots of each position are rendered at the same time")
+    parser.add_argument("--lazy", required=False, action="store_true",
+                        help="Only create the scatter plots of the mutations included in the summary")
+    parser.add_argument("--plots", required=False, nargs="*",
+                        help="Only create the scatter plots of these mutations, or of all of them if none is given, "
+                             "without the rest of the analysis")
+    parser.add_argument("--cache", required=False,
+                        help="A folder to keep the parsed reports, plots and snapshots to reuse them in the next runs")
+    parser.add_argument("--watch", required=False, type=int,
+                        help="Follow the simulations while they run, refreshing the box plots and the ranking of the "
+                             "mutations every this many seconds")
+    parser.add_argument("--stream", required=False, action="store_true",
+                        help="Read the reports in chunks to analyse long simulations with a bounded memory")
+    parser.add_argument("--store", required=False,
+                        help="A SQLite file to keep all the steps of the reports, they are not kept by default")
+    args = parser.parse_args()
+
+    return [args.inp, args.dpi, args.box, args.traj, args.out, args.folder, args.analyse,
+            args.cpus, args.thres, args.positions, args.render, args.lazy, args.plots, args.cache,
+            args.watch, args.stream, args.store]
+
+
+def _report_header(first):
+    """
+    Reads the column names from the first line of a report
+    """
+    # the names are separated by 4 spaces because some of them have spaces inside
+    return [name.strip() for name in first.split("    ") if name.strip()]
+
+
+def parse_report_rows(header, chunks, ids):
+    """
+    Parses the rows of several reports with a single call to the C parser of pandas
+
+    Parameters
+    ___________
+    header: list[str]
+        The column names of the reports
+    chunks: list[str]
+        The complete lines of each report without the header
+    ids: list[int]
+        The number of each report
+
+    Returns
+    _______
+    data: pd.DataFrame
+        The rows of the reports, the #Task column is replaced by the ID column with the number of the report
+    """
+    rows = []
+    for ind, body in enumerate(chunks):
+        if body and not body.endswith("\n"):
+            chunks[ind] = body = body + "\n"
+        # the parser skips the blank lines, so they are not rows of the report
+        rows.append(body.count("\n") - len(BLANK_LINE.findall(body)))
+    dtypes = {name: REPORT_INTEGERS.get(name, np.float32) for name in header}
+    if not sum(rows):
+        data = pd.DataFrame({name: pd.Series([], dtype=dtypes[name]) for name in header}, columns=header)
+    else:
+        data = pd.read_csv(StringIO("".join(chunks)), sep=r"\s+", header=None, names=header, dtype=dtypes,
+                           engine="c")
+    data["#Task"] = np.repeat(np.array(ids, dtype=np.int16), rows)
+    data.rename(columns={"#Task": "ID"}, inplace=True)
+
+    return data
+
+
+def read_reports(folder):
+    """
+    Reads all the reports of a PELE simulation with a single call to the C parser of pandas
+
+    Parameters
+    ___________
+    folder: str
+        path to the simulation folder
+
+    Returns
+    _______
+    data: pd.DataFrame
+        The rows of all the reports, the #Task column is replaced by the ID column with the number of the report
+    """
+    reports = glob("{}/output/0/report_*".format(folder))
+    if not reports:
+        raise Exception("No reports found in {}/output/0".format(folder))
+    header = None
+    ids = []
+    chunks = []
+    for files in reports:
+        with open(files, "r") as report:
+            columns = _report_header(report.readline())
+            chunks.append(report.read())
+        if header is None:
+            header = columns
+        elif columns != header:
+            raise Exception("{} does not have the same columns as the other reports".format(files))
+        ids.append(int(basename(files).split("_")[1]))
+
+    return parse_report_rows(header, chunks, ids)
+
+
+class SimulationData:
+    """
+    A class to store data from the simulations
+    """
+    def __init__(self, folder, points=30, pdb=10):
+        """
+        Initialize the SimulationData Object
+
+        Parameters
+        ___________
+        folder: str
+            path to the simulation folder
+        points: int, optional
+            Number of points to consider for the boxplots
+        pdb: int, optional
+            how many pdbs to extract from the trajectories
+        """
+        self.folder = folder
+        self.dataframe = None
+        self.distance = None
+        self.dist_diff = None
+        self.profile = None
+        self.trajectory = None
+        self.points = points
+        self.pdb = pdb
+        self.binding = None
+        self.bind_diff = None
+
+    def filtering(self, keep=None):
+        """
+        Constructs a dataframe from all the reports in a PELE simulation folder with the best 20% binding energies
+        and a Series with the 100 best ligand distances
+
+        Parameters
+        __________
+        keep: callable, optional
+            Receives the rows of all the reports before they are selected, in a list with one dataframe
+        """
+        data = read_reports(self.folder)
+        if keep is not None:
+            keep([data])
+        self.select(data)
+
+    def select(self, data):
+        """
+        Keeps the rows for the profiles, the snapshots and the box plots
+
+        Parameters
+        __________
+        data: pd.DataFrame
+            The rows of all the reports as returned by read_reports
+        """
+        pd.options.mode.chained_assignment = None
+        # leave out the 99 worst binding energies, the rest of the rows are not sorted
+        keep = len(data.index[:len(data) - 99])
+        self.dataframe = data.drop(data["Binding Energy"].nlargest(len(data) - keep).index)
+        self.dataframe.reset_index(drop=True, inplace=True)
+
+        # for the PELE profiles
+        self.profile = self.dataframe.drop(["Step", "numberOfAcceptedPeleSteps", 'ID'], axis=1)
+        self.trajectory = self.dataframe.nsmallest(self.pdb, "distance0.5")
+        self.trajectory.reset_index(drop=True, inplace=True)
+        self.trajectory.drop(["Step", 'sasaLig', 'currentEnergy'], axis=1, inplace=True)
+
+        # For the box plots, the best 20% binding energies in any order and from them the shortest distances
+        top = len(self.dataframe) * 20 // 100
+        best = np.argpartition(self.dataframe["Binding Energy"].values, top - 1)[:top] if top else []
+        data_20 = self.dataframe.iloc[best]
+        data_20 = data_20.nsmallest(min(self.points, len(data_20)), "distance0.5")
+        data_20.reset_index(drop=True, inplace=True)
+        self.distance = data_20["distance0.5"].copy()
+        self.binding = pd.Series(np.sort(data_20["Binding Energy"].values), name="Binding Energy")
+
+        if "original" in self.folder:
+            self.distance = self.distance.iloc[0]
+            self.binding = self.binding.iloc[0]
+
+    def set_distance(self, original_distance):
+        """
+        Set the distance difference
+
+        Parameters
+        __________
+        original_distance: int
+            The distrance for the wild type
+
+        """
+        self.dist_diff = self.distance - original_distance
+
+    def set_binding(self, original_binding):
+        """
+        Set the binding energy difference
+
+        Parameters
+        __________
+        original_binding: int
+            The binding energy for the wild type
+        """
+        self.bind_diff = self.binding - original_binding
+
+
+class QuantileSketch:
+    """
+    Estimates the quantiles of a stream of values with a bounded number of them kept, the estimate is exact while
+    fewer values than the capacity have been added
+    """
+    def __init__(self, capacity=100000):
+        """
+        Initialize the QuantileSketch Object
+
+        Parameters
+        ___________
+        capacity: int, optional
+            How many values are kept in each level before half of them are discarded
+        """
+        self.capacity = capacity
+        self.levels = [np.array([], dtype=np.float64)]
+        self.count = 0
+        self._offset = 0
+
+    def update(self, values):
+        """
+        Adds values to the sketch
+
+        Parameters
+        ___________
+        values: numpy.ndarray
+            The new values
+        """
+        self.count += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], np.asarray(values, dtype=np.float64)])
+        level = 0
+        while len(self.levels[level]) > self.capacity:
+            # every other value of the level goes to the next one with twice the weight
+            values = np.sort(self.levels[level])
+            self.levels[level] = np.array([], dtype=np.float64)
+            if level + 1 == len(self.levels):
+                self.levels.append(np.array([], dtype=np.float64))
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], values[self._offset::2]])
+            self._offset = 1 - self._offset
+            level += 1
+
+    def kth(self, k):
+        """
+        The k-th smallest value added to the sketch
+
+        Parameters
+        ___________
+        k: int
+            The rank of the value starting with 1
+
+        Returns
+        _______
+        value: float
+            The estimate of the value
+        """
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(x), 2 ** i) for i, x in enumerate(self.levels)])
+        order = np.argsort(values, kind="mergesort")
+        ranks = np.cumsum(weights[order])
+        return values[order][min(np.searchsorted(ranks, k), len(values) - 1)]
+
+
+class Reservoir:
+    """
+    A uniform sample with a bounded number of rows of a stream of dataframes
+    """
+    def __init__(self, size=10000, seed=12345):
+        """
+        Initialize the Reservoir Object
+
+        Parameters
+        ___________
+        size: int, optional
+            The number of rows kept
+        seed: int, optional
+            The seed of the sample so that it is reproducible
+        """
+        self.size = size
+        self.seen = 0
+        self.sample = None
+        self._random = np.random.RandomState(seed)
+
+    def update(self, chunk):
+        """
+        Adds the rows of a dataframe to the stream
+
+        Parameters
+        ___________
+        chunk: pd.DataFrame
+            The new rows
+        """
+        if self.sample is None:
+            self.sample = chunk.iloc[:0].copy()
+        if len(self.sample) < self.size:
+            take = self.size - len(self.sample)
+            self.sample = pd.concat([self.sample, chunk.iloc[:take]], ignore_index=True)
+            self.seen += len(chunk.iloc[:take])
+            chunk = chunk.iloc[take:]
+        if not len(chunk):
+            return
+        # each new row replaces a random row of the sample with probability size / rows seen
+        # randint of older numpy versions does not take an array of upper bounds
+        slots = (self._random.random_sample(len(chunk)) * np.arange(self.seen + 1, self.seen + len(chunk) + 1))
+        slots = slots.astype(np.int64)
+        self.seen += len(chunk)
+        replace = dict((slot, row) for row, slot in enumerate(slots) if slot < self.size)
+        if replace:
+            slots, rows = list(replace.keys()), list(replace.values())
+            for column in self.sample.columns:
+                values = self.sample[column].values.copy()
+                values[slots] = chunk[column].values[rows]
+                self.sample[column] = values
+
+
+def report_chunks(folder, chunksize=100000):
+    """
+    Reads the reports of a PELE simulation in chunks of rows
+
+    Parameters
+    ___________
+    folder: str
+        path to the simulation folder
+    chunksize: int, optional
+        The maximum number of rows of each chunk
+
+    Returns
+    _______
+    chunks: generator
+        Dataframes with the ID column with the number of the report and the _row column with the number of the row
+    """
+    reports = glob("{}/output/0/report_*".format(folder))
+    if not reports:
+        raise Exception("No reports found in {}/output/0".format(folder))
+    header = None
+    for files in reports:
+        with open(files, "r") as report:
+            columns = _report_header(report.readline())
+            # only the lines up to the first step are read
+            empty = not any(line.strip() for line in report)
+        if header is None:
+            header = columns
+        elif columns != header:
+            raise Exception("{} does not have the same columns as the other reports".format(files))
+        if empty:
+            continue
+        dtypes = {name: REPORT_INTEGERS.get(name, np.float32) for name in header}
+        row = 0
+        for chunk in pd.read_csv(files, sep=r"\s+", header=None, skiprows=1, names=header, dtype=dtypes,
+                                 engine="c", chunksize=chunksize):
+            chunk["#Task"] = np.full(len(chunk), int(basename(files).split("_")[1]), dtype=np.int16)
+            chunk.rename(columns={"#Task": "ID"}, inplace=True)
+            chunk["_row"] = np.arange(row, row + len(chunk))
+            row += len(chunk)
+            yield chunk
+
+
+class StreamingSimulation(SimulationData):
+    """
+    A SimulationData object built from the reports in chunks, it only keeps a bounded number of rows in memory
+    """
+    def __init__(self, folder, points=30, pdb=10, sample=10000, sketch=100000, pool=5000):
+        """
+        Initialize the StreamingSimulation Object
+
+        Parameters
+        ___________
+        folder: str
+            path to the simulation folder
+        points: int, optional
+            Number of points to consider for the boxplots
+        pdb: int, optional
+            how many pdbs to extract from the trajectories
+        sample: int, optional
+            How many rows are kept for the scatter plots, dataframe and profile are a uniform sample of this size
+        sketch: int, optional
+            The capacity of the quantile sketch that finds the best 20% binding energies, the results are the
+            same as in SimulationData while the simulation has fewer rows
+        pool: int, optional
+            How many of the shortest distances are kept, the reports are only read again for the box plots if
+            fewer than points of them are among the best 20% binding energies
+        """
+        SimulationData.__init__(self, folder, points, pdb)
+        self.sample = sample
+        self.sketch = sketch
+        self.pool = max(pool, pdb + 99)
+        self.rows = 0
+        self._clear()
+
+    def _clear(self):
+        """
+        Empties the bounded state built from the chunks
+        """
+        self._worst = None
+        self._closest = None
+        self._reservoir = Reservoir(self.sample)
+        self._sketch = QuantileSketch(self.sketch)
+
+    def _chunks(self):
+        """
+        The rows of the reports in chunks with the ID and _row columns
+        """
+        return report_chunks(self.folder)
+
+    def _add(self, chunk):
+        """
+        Merges the rows of a chunk into the worst binding energies, the shortest distances, the sample and the sketch
+
+        Parameters
+        ___________
+        chunk: pd.DataFrame
+            The new rows with the ID and _row columns
+        """
+        worst = chunk.nlargest(99, "Binding Energy")
+        closest = chunk.nsmallest(self.pool, "distance0.5")
+        if self._worst is not None:
+            worst = pd.concat([self._worst, worst]).nlargest(99, "Binding Energy")
+            closest = pd.concat([self._closest, closest]).nsmallest(self.pool, "distance0.5")
+        self._worst = worst
+        self._closest = closest
+        self._reservoir.update(chunk)
+        self._sketch.update(chunk["Binding Energy"].values)
+
+    def _select(self):
+        """
+        Keeps the rows for the profiles, the snapshots and the box plots from the bounded state as select does
+        """
+        pd.options.mode.chained_assignment = None
+        if self._worst is None:
+            raise Exception("The reports in {}/output/0 are empty".format(self.folder))
+
+        # leave out the 99 worst binding energies as in SimulationData
+        total = self._sketch.count
+        keep = slice(None, total - 99).indices(total)[1]
+        worst = self._worst.nlargest(total - keep, "Binding Energy")
+        left_out = set(zip(worst["ID"].tolist(), worst["_row"].tolist()))
+
+        def kept(frame):
+            mask = [x not in left_out for x in zip(frame["ID"].tolist(), frame["_row"].tolist())]
+            return frame[np.array(mask, dtype=bool)].drop("_row", axis=1)
+
+        self.rows = keep
+        self.dataframe = kept(self._reservoir.sample)
+        self.dataframe.reset_index(drop=True, inplace=True)
+        self.profile = self.dataframe.drop(["Step", "numberOfAcceptedPeleSteps", 'ID'], axis=1)
+        closest = kept(self._closest)
+        self.trajectory = closest.nsmallest(self.pdb, "distance0.5")
+        self.trajectory.reset_index(drop=True, inplace=True)
+        self.trajectory.drop(["Step", 'sasaLig', 'currentEnergy'], axis=1, inplace=True)
+
+        # For the box plots, the shortest distances among the best 20% binding energies
+        top = keep * 20 // 100
+        data_20 = closest.iloc[:0]
+        if top:
+            cut = self._sketch.kth(top)
+            data_20 = closest[closest["Binding Energy"] <= cut]
+            if len(data_20) < self.points and len(self._closest) < total:
+                # the rest of the rows could have shorter distances among the best binding energies
+                data_20 = None
+                for chunk in self._chunks():
+                    chunk = kept(chunk[chunk["Binding Energy"] <= cut])
+                    data_20 = chunk if data_20 is None else pd.concat([data_20, chunk])
+                    data_20 = data_20.nsmallest(self.points, "distance0.5")
+            data_20 = data_20.nsmallest(self.points, "distance0.5")
+        data_20.reset_index(drop=True, inplace=True)
+        self.distance = data_20["distance0.5"].copy()
+        self.binding = pd.Series(np.sort(data_20["Binding Energy"].values), name="Binding Energy")
+
+        if "original" in self.folder:
+            self.distance = self.distance.iloc[0]
+            self.binding = self.binding.iloc[0]
+
+    def _feed(self):
+        """
+        Adds the chunks of the reports to the bounded state and passes them on without the _row column
+        """
+        for chunk in self._chunks():
+            self._add(chunk)
+            yield chunk.drop("_row", axis=1)
+
+    def filtering(self, keep=None):
+        """
+        Reads the reports in chunks for the worst binding energies, the candidate snapshots, the sample for the
+        profiles and the quantile of the best 20% binding energies, then once more for the rows of the box plots
+        only if the shortest distances kept are not enough
+
+        Parameters
+        __________
+        keep: callable, optional
+            Receives the generator of the chunks of the reports, the chunks it does not read are still added
+        """
+        self._clear()
+        chunks = self._feed()
+        if keep is not None:
+            keep(chunks)
+        for _ in chunks:
+            pass
+        self._select()
+        # the state is not needed once the rows are selected, it is left out of the pickles of the cache
+        self._clear()
+
+
+class LiveSimulation(StreamingSimulation):
+    """
+    A StreamingSimulation object that follows the reports while PELE is still writing them, each update only reads
+    the new lines and merges them into the bounded state
+    """
+    def __init__(self, folder, points=30, pdb=10, sample=10000, sketch=100000, pool=5000, block=2 ** 25):
+        """
+        Initialize the LiveSimulation Object
+
+        Parameters
+        ___________
+        folder: str
+            path to the simulation folder
+        points: int, optional
+            Number of points to consider for the boxplots
+        pdb: int, optional
+            how many pdbs to extract from the trajectories
+        sample: int, optional
+            How many rows are kept for dataframe and profile
+        sketch: int, optional
+            The capacity of the quantile sketch of the binding energies
+        pool: int, optional
+            How many of the shortest distances are kept
+        block: int, optional
+            The maximum number of bytes of the reports parsed at once
+        """
+        StreamingSimulation.__init__(self, folder, points, pdb, sample, sketch, pool)
+        self.block = block
+        self.header = None
+        self.offsets = {}
+        self.counts = {}
+
+    def _read(self, files, offset, size, row):
+        """
+        Parses the complete lines of a report between two positions in blocks
+
+        Parameters
+        ___________
+        files: str
+            The path to the report
+        offset: int
+            The position of the first line, the header is read if it is 0
+        size: int
+            The position where the reading stops
+        row: int
+            The number of the first row
+
+        Returns
+        _______
+        blocks: generator
+            Tuples of the rows with the ID and _row columns and the position after them
+        """
+        with open(files, "rb") as report:
+            while offset < size:
+                report.seek(offset)
+                text = report.read(min(self.block, size - offset))
+                # the last line is left for the next update if PELE is still writing it
+                end = text.rfind(b"\n") + 1
+                if not end:
+                    return
+                text = text[:end]
+                if not isinstance(text, str):
+                    text = text.decode()
+                if offset == 0:
+                    first, text = text.split("\n", 1)
+                    if self.header is None:
+                        self.header = _report_header(first)
+                    elif _report_header(first) != self.header:
+                        raise Exception("{} does not have the same columns as the other reports".format(files))
+                offset += end
+                if not text:
+                    continue
+                rows = parse_report_rows(self.header, [text], [int(basename(files).split("_")[1])])
+                rows["_row"] = np.arange(row, row + len(rows))
+                row += len(rows)
+                yield rows, offset
+
+    def _chunks(self):
+        for files in sorted(self.offsets):
+            for rows, _ in self._read(files, 0, self.offsets[files], 0):
+                yield rows
+
+    def update(self):
+        """
+        Reads the lines added to the reports since the last update and selects the rows again
+
+        Returns
+        _______
+        new: int
+            The number of rows read, all of them again if a report has been written again from the beginning
+        """
+        new = 0
+        reports = glob("{}/output/0/report_*".format(self.folder))
+        sizes = dict((files, os.path.getsize(files)) for files in reports)
+        reset = any(sizes[files] < self.offsets.get(files, 0) for files in reports)
+        if reset:
+            # the rows of a report that is written again cannot be taken out of the bounded state
+            self._clear()
+            self.offsets = {}
+            self.counts = {}
+        for files in reports:
+            offset = self.offsets.get(files, 0)
+            for rows, offset in self._read(files, offset, sizes[files], self.counts.get(files, 0)):
+                self.offsets[files] = offset
+                self.counts[files] = self.counts.get(files, 0) + len(rows)
+                new += len(rows)
+                self._add(rows)
+        if new:
+            self._select()
+        elif reset:
+            self.dataframe = self.profile = self.trajectory = self.distance = self.binding = None
+
+        return new
+
+
+def store_simulation(store, position, mutation, folder, chunks=None):
+    """
+    Keeps all the steps of the reports of a simulation in the store of the campaign
+
+    Parameters
+    ___________
+    store: str
+        The path to the SQLite file
+    position: str
+        The name of the position
+    mutation: str
+        The name of the mutation, original for the wild type
+    folder: str
+        path to the simulation folder
+    chunks: iterable, optional
+        The rows already parsed by the analysis with the ID column, by default the reports are read again if the
+        simulation is not stored yet
+
+    Returns
+    _______
+    written: bool
+        False if the simulation was already stored from the same reports
+    """
+    reports = sorted(glob("{}/output/0/report_*".format(folder)))
+    if chunks is None:
+        chunks = (chunk.drop("_row", axis=1) for chunk in report_chunks(folder))
+
+    return write_simulation(store, position, mutation, abspath(folder), chunks, file_signature(reports))
+
+
+def original_folder(folders):
+    """
+    Finds the simulation of the wild type for the simulations of one position
+
+    Parameters
+    ___________
+    folders: str
+        path to the different PELE simulation folders of the position
+
+    Returns
+    _______
+    folder: str
+        path to the wild type simulation
+    """
+    if len(folders.split("/")) > 1:
+        return "{}/PELE_original".format(dirname(folders))
+    return "PELE_original"
+
+
+def load_simulation(folder, box=30, traj=10, cache=None, stream=False, store=None, position=None):
+    """
+    Builds the SimulationData of a simulation or takes it from the cache if the reports have not changed
+
+    Parameters
+    ___________
+    folder: str
+        path to the simulation folder
+    box: int, optional
+        How many points to use for the box plots
+    traj: int, optional
+        How many snapshots to extract from the trajectories
+    cache: helper.ArtifactCache, optional
+        The cache of the analysis
+    stream: bool, optional
+        Read the reports in chunks with StreamingSimulation so that the memory does not grow with the simulation
+    store: str, optional
+        The SQLite file where the steps of the reports are kept from the rows parsed for the analysis
+    position: str, optional
+        The name of the position in the store
+
+    Returns
+    _______
+    data: SimulationData
+        The SimulationData object after filtering
+    """
+    keep = None
+    if store:
+        keep = partial(store_simulation, store, position, basename(folder)[5:], folder)
+    if cache is not None:
+        reports = sorted(glob("{}/output/0/report_*".format(folder)))
+        key = cache.key("simulation", abspath(folder), box, traj, stream, file_signature(reports))
+        data = cache.get(key)
+        if data is not None:
+            if keep is not None:
+                # the reports are only read if they are not stored yet
+                keep()
+            return data
+    if stream:
+        data = StreamingSimulation(folder, points=box, pdb=traj)
+    else:
+        data = SimulationData(folder, points=box, pdb=traj)
+    data.filtering(keep)
+    if cache is not None:
+        cache.put(key, data)
+
+    return data
+
+
+def load_original(folder, box=30, traj=10, memo=None, cache=None, stream=False, store=None):
+    """
+    Builds the SimulationData of the wild type only once for all the positions
+
+    Parameters
+    ___________
+    folder: str
+        path to the wild type simulation
+    box: int, optional
+        How many points to use for the box plots
+    traj: int, optional
+        How many snapshots to extract from the trajectories
+    memo: dict, optional
+        The wild types already built during this analysis
+    cache: helper.ArtifactCache, optional
+        The cache of the analysis, it keeps the wild type between analyses until its reports change
+    stream: bool, optional
+        Read the reports in chunks with StreamingSimulation
+    store: str, optional
+        The SQLite file where the steps of the reports are kept, the wild type is stored once as the position
+        original
+
+    Returns
+    _______
+    original: SimulationData
+        The SimulationData object of the wild type
+    """
+    key = (abspath(folder), box, traj) + ((stream,) if stream else ())
+    if memo is not None and key in memo:
+        return memo[key]
+    original = load_simulation(folder, box, traj, cache, stream, store, "original")
+    if memo is not None:
+        memo[key] = original
+
+    return original
+
+
+def analyse_all(folders=".", box=30, traj=10, original=None, cache=None, stream=False, store=None):
+    """
+    Analyse all the 19 simulations folders and build SimulationData objects for each of them
+
+    Parameters
+    ___________
+    folders: str, optional
+        path to the different PELE simulation folders to be analyzed
+    box: int, optional
+        How many points to use for the box plots
+    traj: int, optional
+        How many snapshots to extract from the trajectories
+    original: SimulationData, optional
+        The wild type already analysed, by default it is built from the PELE_original folder
+    cache: helper.ArtifactCache, optional
+        The cache of the analysis, the simulations whose reports have not changed are not parsed again
+    stream: bool, optional
+        Read the reports in chunks with StreamingSimulation
+    store: str, optional
+        The SQLite file where the steps of the reports are kept, the mutations under the name of the position
+
+    Returns
+    _______
+    data_dict: dict
+        Dictionary of SimulationData objects
+    """
+    data_dict = {}
+    if original is None:
+        original = load_original(original_folder(folders), box, traj, cache=cache, stream=stream, store=store)
+    data_dict["original"] = original
+    for folder in glob("{}/PELE_*".format(folders)):
+        name = basename(folder)
+        data = load_simulation(folder, box, traj, cache, stream, store, basename(folders))
+        data.set_distance(original.distance)
+        data.set_binding(original.binding)
+        data_dict[name[5:]] = data
+
+    return data_dict
+
+
+def _box_figure(data, title, ylabel, position_num, path, dpi=800):
+    """
+    Renders one box plot of a position
+    """
+    sns.set(font_scale=1.8)
+    sns.set_style("ticks")
+    sns.set_context("paper")
+    ax = sns.catplot(data=data, kind="box", palette="Accent", height=4.5, aspect=2.3)
+    ax.set(title=title)
+    ax.set_ylabels(ylabel, fontsize=8)
+    ax.set_xlabels("Mutations {}".format(position_num), fontsize=6)
+    ax.set_xticklabels(fontsize=6)
+    ax.set_yticklabels(fontsize=6)
+    ax.savefig(path, dpi=dpi)
+    plt.close(ax.fig)
+
+
+def _scatter_figure(cat, key, type_, path, dpi=800):
+    """
+    Renders one scatter plot of a mutation against the wild type
+    """
+    sns.set(font_scale=1.2)
+    sns.set_style("ticks")
+    sns.set_context("paper")
+    ax = sns.relplot(x=type_, y='Binding Energy', hue="Type", style="Type", palette="Set1", data=cat,
+                     height=3.5, aspect=1.5, s=80, linewidth=0)
+
+    ax.set(title="{} scatter plot of binding energy vs {} ".format(key, type_))
+    ax.savefig(path, dpi=dpi)
+    plt.close(ax.fig)
+
+
+def _render(task):
+    func, args = task
+    func(*args)
+
+
+def _init_render():
+    plt.switch_backend('agg')
+
+
+def render_plots(tasks, workers=1, cache=None):
+    """
+    Renders the plots, in a pool of processes if there is more than one worker
+
+    Parameters
+    ___________
+    tasks: list[tuple]
+        The plots to render as (function, arguments), from box_plot_tasks and profile_tasks
+    workers: int, optional
+        How many plots are rendered at the same time
+    cache: helper.ArtifactCache, optional
+        The cache of the analysis, the plots already rendered with the same data are not rendered again
+    """
+    if cache is not None:
+        # the path of the image is the second to last argument of the functions that render the plots
+        keys = [cache.key("plot", func.__name__, args) for func, args in tasks]
+        pending = [(task, key) for task, key in zip(tasks, keys) if cache.get(key) is None]
+        render_plots([task for task, key in pending], workers)
+        for (func, args), key in pending:
+            cache.put(key, True, [args[-2]])
+        return
+    if workers > 1 and len(tasks) > 1:
+        pool = mp.Pool(min(workers, len(tasks)), initializer=_init_render)
+        pool.map(_render, tasks, 1)
+        pool.close()
+        pool.join()
+    else:
+        for task in tasks:
+            _render(task)
+
+
+def box_plot_tasks(res_dir, data_dict, position_num, dpi=800):
+    """
+    Prepares the box plots of the 19 mutations from the same position
+
+    Parameters
+    ___________
+    res_dir: str
+        name of the results folder
+    data_dict: dict
+        A dictionary that contains SimulationData objects from the simulation folders
+    position_num: str
+        Position at the which the mutations occurred
+    dpi: int, optional
+        The quality of the plots produced
+
+    Returns
+    _______
+    tasks: list[tuple]
+        The plots to pass to render_plots
+    """
+    if not os.path.exists("{}_results/Plots/box".format(res_dir)):
+        os.makedirs("{}_results/Plots/box".format(res_dir))
+    # create a dataframe with only the distance differences for each simulation
+    plot_dict_dist = {}
+    plot_dict_bind = {}
+    for key, value in data_dict.items():
+        if "original" not in key:
+            plot_dict_dist[key] = value.dist_diff
+            plot_dict_bind[key] = value.bind_diff
+
+    data_dist = pd.DataFrame(plot_dict_dist)
+    data_bind = pd.DataFrame(plot_dict_bind)
+    tasks = [(_box_figure, (data_dist, "{} distance variation with respect to wild type".format(position_num),
+                            "Distance variation", position_num,
+                            "{}_results/Plots/box/{}_distance.png".format(res_dir, position_num), dpi)),
+             (_box_figure, (data_bind, "{} Binding energy variation with respect to wild type".format(position_num),
+                            "Binding energy variation", position_num,
+                            "{}_results/Plots/box/{}_binding.png".format(res_dir, position_num), dpi))]
+
+    return tasks
+
+
+def box_plot(res_dir, data_dict, position_num, dpi=800):
+    """
+    Creates a box plot of the 19 mutations from the same position
+
+    Parameters
+    ___________
+    res_dir: str
+        name of the results folder
+    data_dict: dict
+        A dictionary that contains SimulationData objects from the simulation folders
+    position_num: str
+        Position at the which the mutations occurred
+    dpi: int, optional
+        The quality of the plots produced
+    """
+    render_plots(box_plot_tasks(res_dir, data_dict, position_num, dpi))
+
+
+def _profile_task(key, mutation, res_dir, wild, type_, position_num, dpi=800):
+    """
+    Prepares the scatter plot of a mutation with only the columns it needs
+    """
+    original = wild.profile[[type_, "Binding Energy"]]
+    original.index = ["Wild type"] * len(original)
+    distance = mutation.profile[[type_, "Binding Energy"]]
+    distance.index = [key] * len(distance)
+    cat = pd.concat([original, distance], axis=0)
+    cat.index.name = "Type"
+    cat.reset_index(inplace=True)
+    if not os.path.exists("{}_results/Plots/scatter_{}_{}".format(res_dir, position_num, type_)):
+        os.makedirs("{}_results/Plots/scatter_{}_{}".format(res_dir, position_num, type_))
+    path = "{}_results/Plots/scatter_{}_{}/{}_{}.png".format(res_dir, position_num, type_, key, type_)
+
+    return _scatter_figure, (cat, key, type_, path, dpi)
+
+
+def pele_profile_single(key, mutation, res_dir, wild, type_, position_num, dpi=800):
+    """
+    Creates a plot for a single mutation
+
+    Parameters
+    ___________
+    key: str
+        name for the axis title and plot
+    mutation: SimulationData
+        A SimulationData object
+    res_dir: str
+        name of the results folder
+    wild: SimulationData
+        SimulationData object that stores data for the wild type protein
+    type_: str
+        Type of scatter plot - distance0.5, sasaLig or currentEnergy
+    position_num: str
+        name for the folder to keep the images from the different mutations
+    dpi: int, optional
+        Quality of the plots
+    """
+    _render(_profile_task(key, mutation, res_dir, wild, type_, position_num, dpi))
+
+
+def profile_tasks(res_dir, data_dict, position_num, dpi=800, types=PROFILE_TYPES, keys=None):
+    """
+    Prepares the scatter plots of each of the 19 mutations from the same position against the wild type
+
+    Parameters
+    ___________
+    res_dir: str
+        Name of the results folder
+    data_dict: dict
+        A dictionary that contains SimulationData objects from the simulation folders
+    position_num: str
+        Name for the folders where you want the scatter plot go in
+    dpi: int, optional
+        Quality of the plots
+    types: iterable, optional
+        The scatter plots for each mutation - distance0.5, sasaLig or currentEnergy
+    keys: iterable, optional
+        Only the plots of these mutations, all of them by default
+
+    Returns
+    _______
+    tasks: list[tuple]
+        The plots to pass to render_plots
+    """
+    tasks = []
+    for type_ in types:
+        for key in sorted(data_dict):
+            if "original" not in key and (keys is None or key in keys):
+                tasks.append(_profile_task(key, data_dict[key], res_dir, data_dict["original"], type_,
+                                           position_num, dpi))
+
+    return tasks
+
+
+def pele_profiles(type_, res_dir, data_dict, position_num, dpi=800):
+    """
+    Creates a scatter plot for each of the 19 mutations from the same position by comparing it to the wild type
+
+    Parameters
+    ___________
+    type_: str
+        distance0.5, sasaLig or currentEnergy - different possibilities for the scatter plot
+    res_dir: str
+        Name of the results folder
+    data_dict: dict
+        A dictionary that contains SimulationData objects from the 19 simulation folders
+    position_num: str
+        Name for the folders where you want the scatter plot go in
+    dpi: int, optional
+        Quality of the plots
+    """
+    render_plots(profile_tasks(res_dir, data_dict, position_num, dpi, types=[type_]))
+
+
+def all_profiles(res_dir, data_dict, position_num, dpi=800, workers=1):
+    """
+    Creates all the possible scatter plots for the same mutated position
+
+    Parameters
+    ___________
+    res_dir: str
+        Name of the results folder for the output
+    data_dict: dict
+        A dictionary that contains SimulationData objects from the simulation folders
+    position_num: str
+        name for the folders where you want the scatter plot go in
+    dpi: int, optional
+        Quality of the plots
+    workers: int, optional
+        How many plots are rendered at the same time
+    """
+    render_plots(profile_tasks(res_dir, data_dict, position_num, dpi), workers)
+
+
+def index_trajectory(trajectory):
+    """
+    Finds where each model of a trajectory is in one scan of the file
+
+    Parameters
+    ___________
+    trajectory: str
+        Path to the trajectory file
+
+    Returns
+    _______
+    index: dict
+        {model number: (offset, length)} of the text between the model number and ENDMDL
+    """
+    index = {}
+    with open(trajectory, "rb") as traj:
+        if not os.fstat(traj.fileno()).st_size:
+            return index
+        mapped = mmap.mmap(traj.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            pos = mapped.find(b"MODEL")
+            while pos != -1:
+                end_line = mapped.find(b"\n", pos)
+                line = mapped[pos:end_line if end_line != -1 else len(mapped)]
+                fields = line.split()
+                if len(fields) < 2 or not fields[1].isdigit():
+                    # not the line of a model, the next model may start before the next ENDMDL
+                    pos = mapped.find(b"MODEL", pos + len(b"MODEL"))
+                    continue
+                end = mapped.find(b"ENDMDL", pos)
+                # the last model is left out while PELE is still writing it
+                if end == -1:
+                    break
+                start = pos + line.index(fields[1], len(b"MODEL")) + len(fields[1])
+                index.setdefault(int(fields[1]), (start, end - start))
+                pos = mapped.find(b"MODEL", end + len(b"ENDMDL"))
+        finally:
+            mapped.close()
+
+    return index
+
+
+def trajectory_index(trajectory):
+    """
+    Returns the index of the models of a trajectory, kept in a file next to it until the trajectory changes
+
+    Parameters
+    ___________
+    trajectory: str
+        Path to the trajectory file
+
+    Returns
+    _______
+    index: dict
+        {model number: (offset, length)} of the text between the model number and ENDMDL
+    """
+    index_file = "{}.index".format(trajectory)
+    stat = os.stat(trajectory)
+    if isfile(index_file):
+        try:
+            with open(index_file, "r") as cached:
+                cached = json.load(cached)
+            if cached["size"] == stat.st_size and cached["mtime"] == stat.st_mtime:
+                return {int(model): tuple(place) for model, place in cached["models"].items()}
+        except (ValueError, KeyError):
+            pass
+    index = index_trajectory(trajectory)
+    try:
+        with atomic_write(index_file) as new:
+            json.dump({"size": stat.st_size, "mtime": stat.st_mtime, "models": index}, new)
+    except (IOError, OSError):
+        # the index is only kept in memory if the folder is not writable
+        pass
+
+    return index
+
+
+def find_trajectory(simulation_folder, f_id):
+    """
+    Finds a trajectory file of a PELE simulation
+
+    Parameters
+    ___________
+    simulation_folder: str
+        Path to the simulation folder
+    f_id: str
+        trajectory file ID
+
+    Returns
+    _______
+    trajectory: str
+        The path of the trajectory or None if it is not found
+    """
+    f_in = glob("{}/output/0/*trajectory*_{}.*".format(simulation_folder, f_id))
+    f_in = [x for x in f_in if not x.endswith(".index")]
+    if len(f_in) == 0:
+        return None
+    return f_in[0]
+
+
+def read_model(trajectory, model, index=None):
+    """
+    Reads one model of a trajectory without reading the rest of the file
+
+    Parameters
+    ___________
+    trajectory: str
+        Path to the trajectory file
+    model: int
+        The model number
+    index: dict, optional
+        The index of the trajectory, by default trajectory_index
+
+    Returns
+    _______
+    text: str
+        The text between the model number and ENDMDL or None if the model is not in the trajectory
+    """
+    if index is None:
+        index = trajectory_index(trajectory)
+    if model not in index:
+        return None
+    start, length = index[model]
+    with open(trajectory, "rb") as traj:
+        traj.seek(start)
+        text = traj.read(length)
+    if not isinstance(text, str):
+        text = text.decode()
+
+    return text
+
+
+def _snapshot_name(f_id, step, dist, bind):
+    return "traj{}_step{}_dist{}_bind{}.pdb".format(f_id, step, round(dist, 2), round(bind, 2))
+
+
+def extract_snapshot_from_pdb(res_dir, simulation_folder, f_id, position_num, mutation, step, dist, bind):
+    """
+    Extracts PDB files from trajectories
+
+    Parameters
+    ___________
+    res_dir: str
+        Name of the results folder where to store the output
+    simulation_folder: str
+        Path to the simulation folder
+    f_id: str
+        trajectory file ID
+    position_num: str
+        The folder name for the output of this function for the different simulations
+    mutation: str
+        The folder name for the output of this function for one of the simulations
+    step: int
+        The step in the trajectory you want to keep
+    dist: float
+        The distance between ligand and protein (used as name for the result file - not essential)
+    bind: float
+        The binding energy between ligand and protein (used as name for the result file - not essential)
+    """
+    if not os.path.exists("{}_results/distances_{}/{}_pdbs".format(res_dir, position_num, mutation)):
+        os.makedirs("{}_results/distances_{}/{}_pdbs".format(res_dir, position_num, mutation))
+
+    f_in = find_trajectory(simulation_folder, f_id)
+    if f_in is None:
+        sys.exit("Trajectory_{} not found. Be aware that PELE trajectories must contain the label 'trajectory' in "
+                 "their file name to be detected".format(f_id))
+    trajectory_selected = read_model(f_in, int(step) + 1)
+    if trajectory_selected is None:
+        raise AttributeError("Model not found")
+
+    # Output Snapshot
+    traj = []
+    path_ = "{}_results/distances_{}/{}_pdbs".format(res_dir, position_num, mutation)
+    name = _snapshot_name(f_id, step, dist, bind)
+    with open(os.path.join(path_, name), 'w') as f:
+        traj.append("MODEL     {}".format(int(step) + 1))
+        traj.append(trajectory_selected)
+        traj.append("ENDMDL\n")
+        f.write("\n".join(traj))
+
+
+def extract_snapshots(res_dir, simulation_folder, position_num, mutation, snapshots):
+    """
+    Extracts several PDB files from the trajectories, each trajectory is only opened once
+
+    Parameters
+    ___________
+    res_dir: str
+        Name of the results folder where to store the output
+    simulation_folder: str
+        Path to the simulation folder
+    position_num: str
+        The folder name for the output of this function for the different simulations
+    mutation: str
+        The folder name for the output of this function for one of the simulations
+    snapshots: iterable
+        (trajectory file ID, step, distance, binding energy) of each snapshot
+
+    Returns
+    _______
+    missing: list[str]
+        The snapshots that are not in the trajectories
+    """
+    path_ = "{}_results/distances_{}/{}_pdbs".format(res_dir, position_num, mutation)
+    if not os.path.exists(path_):
+        os.makedirs(path_)
+    by_file = {}
+    for f_id, step, dist, bind in snapshots:
+        by_file.setdefault(f_id, []).append((int(step), dist, bind))
+
+    missing = []
+    for f_id, steps in by_file.items():
+        f_in = find_trajectory(simulation_folder, f_id)
+        if f_in is None:
+            missing.extend("trajectory_{} step {}".format(f_id, step) for step, dist, bind in steps)
+            continue
+        index = trajectory_index(f_in)
+        # the models are read in the order of the file, one at a time
+        steps.sort(key=lambda x: index.get(x[0] + 1, (-1,))[0])
+        with open(f_in, "rb") as traj:
+            for step, dist, bind in steps:
+                if step + 1 not in index:
+                    missing.append("trajectory_{} step {}".format(f_id, step))
+                    continue
+                start, length = index[step + 1]
+                traj.seek(start)
+                model = traj.read(length)
+                if not isinstance(model, str):
+                    model = model.decode()
+                name = _snapshot_name(f_id, step, dist, bind)
+                with open(os.path.join(path_, name), 'w') as f:
+                    f.write("\n".join(["MODEL     {}".format(step + 1), model, "ENDMDL\n"]))
+
+    return missing
+
+
+def extract_10_pdb_single(info, res_dir, data_dict):
+    """
+    Extracts the top 10 distances for one mutation
+
+    Parameters
+    ___________
+    info: iterable
+       An iterable with the variables simulation_folder, position_num and mutation
+    res_dir: str
+       Name of the results folder
+    data_dict: dict
+       A dictionary that contains SimulationData objects from the simulation folders
+
+    Returns
+    _______
+    missing: list[str]
+        The snapshots that are not in the trajectories
+    """
+    simulation_folder, position_num, mutation = info
+    return _extract_batch((simulation_folder, position_num, mutation, _snapshots(data_dict[mutation])), res_dir)
+
+
+def _snapshots(data):
+    """
+    The snapshots to extract from the trajectories of a simulation
+
+    Parameters
+    ___________
+    data: SimulationData
+        The SimulationData object of the simulation
+
+    Returns
+    _______
+    snapshots: list[tuple]
+        (trajectory file ID, step, distance, binding energy) of each snapshot
+    """
+    trajectory = data.trajectory
+    return list(zip(trajectory["ID"].tolist(), trajectory["numberOfAcceptedPeleSteps"].tolist(),
+                    trajectory["distance0.5"].tolist(), trajectory["Binding Energy"].tolist()))
+
+
+def _extract_batch(info, res_dir):
+    """
+    Extracts the snapshots of one mutation in a worker of extract_all
+    """
+    simulation_folder, position_num, mutation, snapshots = info
+    return extract_snapshots(res_dir, simulation_folder, position_num, mutation, snapshots)
+
+
+def extract_all(res_dir, data_dict, folders, cpus=24, cache=None):
+    """
+    Extracts the top 10 distances for the 19 mutations at the same position
+
+    Parameters
+    ___________
+    res_dir: str
+       name of the results folder
+    data_dict: dict
+       A dictionary that contains SimulationData objects from the 19 simulation folders
+    folders: str
+       Path to the folder that has all the simulations at the same position
+    cpus: int, optional
+       How many cpus to paralelize the function
+    cache: helper.ArtifactCache, optional
+       The cache of the analysis, the snapshots already extracted from the same trajectories are not extracted again
+
+    Returns
+    _______
+    missing: list[str]
+        The snapshots that are not in the trajectories
+    """
+    args = []
+    keys = []
+    missing = []
+    for pele in glob("{}/PELE_*".format(folders)):
+        name = basename(pele)[5:]
+        output = basename(dirname(pele))
+        # only the snapshots are sent to the workers instead of all the SimulationData objects
+        snapshots = _snapshots(data_dict[name])
+        if cache is not None:
+            trajectories = sorted(x for x in glob("{}/output/0/*trajectory*".format(pele)) if not x.endswith(".index"))
+            key = cache.key("snapshots", abspath(res_dir), abspath(pele), output, name, snapshots,
+                            file_signature(trajectories))
+            lost = cache.get(key)
+            if lost is not None:
+                missing.extend("{} {}".format(name, x) for x in lost)
+                continue
+            keys.append(key)
+        args.append((pele, output, name, snapshots))
+
+    # parallelizing the function
+    if args:
+        p = mp.Pool(min(cpus, len(args)))
+        func = partial(_extract_batch, res_dir=res_dir)
+        results = p.map(func, args, 1)
+        p.close()
+        p.terminate()
+    else:
+        results = []
+    for ind, ((pele, output, name, snapshots), lost) in enumerate(zip(args, results)):
+        missing.extend("{} {}".format(name, x) for x in lost)
+        if cache is not None:
+            path_ = "{}_results/distances_{}/{}_pdbs".format(res_dir, output, name)
+            lost_set = set(lost)
+            outputs = [os.path.join(path_, _snapshot_name(f_id, int(step), dist, bind))
+                       for f_id, step, dist, bind in snapshots
+                       if "trajectory_{} step {}".format(f_id, int(step)) not in lost_set]
+            cache.put(keys[ind], lost, outputs)
+    if missing:
+        logging.warning("{} snapshots not found in the trajectories: {}".format(len(missing), ", ".join(missing)))
+
+    return missing
+
+
+def create_report(res_dir, mutation, position_num, output="summary", analysis="distance"):
+    """
+    Create pdf files with the plots of chosen mutations and the path to the
+
+    Parameters
+    ___________
+    res_dir: str
+       Name of the results folder
+    mutation: dict
+       A dictionary of SimulationData objects {key: SimulationData}
+    position_num: str
+       part of the path to the plots, the position that was mutated
+    output: str, optional
+       The pdf filename without the extension
+    analysis: str, optional
+       Type of the analysis (distance, binding or all)
+
+    Returns
+    _______
+    name: str
+       The path of the pdf file
+    """
+    pdf = FPDF()
+    pdf.set_top_margin(17.0)
+    pdf.set_left_margin(15.0)
+    pdf.set_right_margin(15.0)
+    pdf.add_page()
+
+    # Title
+    pdf.set_font('Arial', 'B', 14)
+    pdf.cell(0, 10, "Best mutations in terms of distance and/or binding energy", align='C', ln=1)
+    pdf.set_font('Arial', '', size=10)
+    for key, val in mutation.items():
+        dis = val.dist_diff.median()
+        bind = val.bind_diff.median()
+        message = 'Mutation {}: median distance increment {}, median binding energy increment {}'.format(key, dis, bind)
+        pdf.ln(3)  # linebreaks
+        pdf.cell(0, 5, message, ln=1)
+    pdf.ln(8)  # linebreaks
+
+    # box plots
+    pdf.set_font('Arial', 'B', size=12)
+    pdf.cell(0, 10, "Box plot of {}".format(analysis), align='C', ln=1)
+    pdf.ln(8)
+    if analysis == "distance":
+        box1 = "{}_results/Plots/box/{}_distance.png".format(res_dir, position_num)
+        pdf.image(box1, w=180)
+        pdf.ln(1000000)
+    elif analysis == "energy":
+        box1 = "{}_results/Plots/box/{}_binding.png".format(res_dir, position_num)
+        pdf.image(box1, w=180)
+        pdf.ln(1000000)
+    elif analysis == "all":
+        box1 = "{}_results/Plots/box/{}_distance.png".format(res_dir, position_num)
+        box2 = "{}_results/Plots/box/{}_binding.png".format(res_dir, position_num)
+        pdf.image(box1, w=180)
+        pdf.ln(5)
+        pdf.image(box2, w=180)
+        pdf.ln(1000000)
+
+    # Plots
+    pdf.set_font('Arial', 'B', size=12)
+    pdf.cell(0, 10, "Scatter plots", align='C', ln=1)
+    pdf.set_font('Arial', '', size=10)
+    for mut, key in mutation.items():
+        pdf.ln(3)
+        pdf.cell(0, 10, "Plots {}".format(mut), ln=1)
+        pdf.ln(3)
+        plot1 = "{}_results/Plots/scatter_{}_{}/{}_{}.png".format(res_dir, position_num, "distance0.5", mut,
+                                                                  "distance0.5")
+        plot2 = "{}_results/Plots/scatter_{}_{}/{}_{}.png".format(res_dir, position_num, "sasaLig", mut, "sasaLig")
+        plot3 = "{}_results/Plots/scatter_{}_{}/{}_{}.png".format(res_dir, position_num, "currentEnergy", mut,
+                                                                  "currentEnergy")
+        pdf.image(plot1, w=180)
+        pdf.ln(3)
+        pdf.image(plot2, w=180)
+        pdf.ln(1000000)  # page break
+        pdf.ln(3)
+        pdf.image(plot3, w=180)
+        pdf.ln(1000000)  # page break
+
+    # Top poses
+    pdf.set_font('Arial', 'B', size=12)
+    pdf.cell(0, 10, "Path to the top poses", align='C', ln=1)
+    pdf.set_font('Arial', size=10)
+    pdf.ln(5)
+    for mut, key in mutation.items():
+        path = "{}_results/distances_{}/{}_pdbs".format(res_dir, position_num, mut)
+        pdf.cell(0, 10, "{}: {} ".format(mut, abspath(path)), ln=1)
+        pdf.ln(5)
+
+    # Output report
+    name = "{}_results/{}_{}.pdf".format(res_dir, output, position_num)
+    pdf.output(name, 'F')
+    return name
+
+
+def select_mutations(data_dict, analysis="distance", thres=-0.1):
+    """
+    Finds those mutations that decreases the binding distance and binding energy
+
+    Parameters
+    ___________
+    data_dict: dict
+       A dictionary of SimulationData objects that holds information for all mutations
+    analysis: str, optional
+       Choose between ("distance", "binding" or "all") to specify how to filter the mutations to keep
+    thres: float, optional
+       Set the threshold for those mutations to be kept
+
+    Returns
+    _______
+    mutation_dict: dict
+       The SimulationData objects of the mutations kept
+    """
+    mutation_dict = {}
+    for key, value in data_dict.items():
+        if "original" not in key:
+            if analysis == "distance" and value.dist_diff.median() < thres:
+                mutation_dict[key] = value
+            elif analysis == "energy" and value.bind_diff.median() < thres:
+                mutation_dict[key] = value
+            elif analysis == "all" and value.dist_diff.median() < thres and value.bind_diff.median() < thres:
+                mutation_dict[key] = value
+
+    return mutation_dict
+
+
+def find_top_mutations(res_dir, data_dict, position_num, output="summary", analysis="distance", thres=-0.1):
+    """
+    Finds those mutations that decreases the binding distance and binding energy and creates a report
+
+    Parameters
+    ___________
+    res_dir: str
+       Name of the results folder
+    data_dict: dict
+       A dictionary of SimulationData objects that holds information for all mutations
+    position_num: str
+       The position that was mutated
+    output: str, optional
+       Name of the reports created
+    analysis: str, optional
+       Choose between ("distance", "binding" or "all") to specify how to filter the mutations to keep
+    thres: float, optional
+       Set the threshold for those mutations to be included in the pdf
+    """
+    # Find top mutations
+    logging.basicConfig(filename='{}_results/top_mutations.log'.format(res_dir), level=logging.DEBUG)
+    mutation_dict = select_mutations(data_dict, analysis, thres)
+    count = len(mutation_dict)
+
+    # Create a summary report with the top mutations
+    if len(mutation_dict) != 0:
+        logging.info(
+            "{} mutations at position {} decrease {} by {} or less".format(count, position_num, analysis, thres))
+        create_report(res_dir, mutation_dict, position_num, output, analysis)
+    else:
+        logging.warning("No mutations at position {} decrease {} by {} or less".format(position_num, analysis, thres))
+
+
+def analyse_position(folders, plot_dir, original, log, dpi=800, box=30, traj=10, output="summary",
+                     opt="distance", cpus=24, thres=-0.1, render=1, lazy=False, cache=None, stream=False, store=None):
+    """
+    Creates all the plots, snapshots and reports of one mutated position
+
+    Parameters
+    ___________
+    folders : str
+       The path to the PELE simulations of the position
+    plot_dir : str
+       Name for the results folder
+    original : SimulationData
+       The wild type
+    log : helper.Log
+       The log that keeps the time and memory of each stage
+    dpi : int, optional
+       The quality of the plots
+    box : int, optional
+       how many points are used for the box plots
+    traj : int, optional
+       how many top pdbs are extracted from the trajectories
+    output : str, optional
+       name of the output file for the pdfs
+    opt : str, optional
+       choose if to analyse distance, binding or all
+    cpus : int, optional
+       How many cpus to use to extract the top pdbs
+    thres : float, optional
+       The threshold for the mutations to be included in the pdf
+    render : int, optional
+       How many plots are rendered at the same time
+    lazy : bool, optional
+       Only render the scatter plots of the mutations in the report, the rest can be rendered later with
+       render_on_demand
+    cache : helper.ArtifactCache, optional
+       The cache of the analysis to reuse the simulations, plots and snapshots whose inputs have not changed
+    stream : bool, optional
+       Read the reports in chunks with StreamingSimulation
+    store : str, optional
+       The SQLite file where all the steps of the reports of the position are kept while they are parsed
+    """
+    base = basename(folders)
+    with log.timer("parse", position=base):
+        data_dict = analyse_all(folders, box=box, traj=traj, original=original, cache=cache, stream=stream,
+                                store=store)
+    with log.timer("plot", position=base, render=render, lazy=lazy):
+        keys = select_mutations(data_dict, opt, thres) if lazy else None
+        tasks = box_plot_tasks(plot_dir, data_dict, base, dpi) + profile_tasks(plot_dir, data_dict, base, dpi,
+                                                                               keys=keys)
+        render_plots(tasks, render, cache)
+    with log.timer("extract", position=base, cpus=cpus):
+        extract_all(plot_dir, data_dict, folders, cpus=cpus, cache=cache)
+    with log.timer("report", position=base):
+        find_top_mutations(plot_dir, data_dict, base, output, analysis=opt, thres=thres)
+
+
+def _position_worker(tasks, results, logs, plot_dir, originals, kwargs):
+    """
+    Analyses the positions in the tasks queue in a process of consecutive_analysis
+    """
+    # the log records are written by the main process so that the processes do not write the same file
+    logging.getLogger().handlers = [QueueHandler(logs)]
+    for folders in iter(tasks.get, None):
+        log = Log(None)
+        try:
+            analyse_position(folders, plot_dir, originals[original_folder(folders)], log, **kwargs)
+            results.put((folders, log.records, None))
+        except Exception:
+            results.put((folders, log.records, traceback.format_exc()))
+
+
+def read_folders(file_name, plot_dir=None):
+    """
+    Reads the paths to the folders with the simulations of each position
+
+    Parameters
+    ___________
+    file_name : str, iterable, directory
+       A file, an iterable that contains the path to the PELE simulations folders or
+       the path to the folders where the simulations are stored --> it is equivalent to dirname(iterable[0])
+    plot_dir : str, optional
+       Name for the results folder, by default the name of the mutations folder
+
+    Returns
+    _______
+    pele_folders : list[str]
+       The path to the folder of each position
+    plot_dir : str
+       Name for the results folder
+    """
+    if isfile(str(file_name)):
+        with open("{}".format(file_name), "r") as pele:
+            pele_folders = pele.readlines()
+    elif isdir(str(file_name)):
+        pele_folders = list(filter(isdir, os.listdir(file_name)))
+        pele_folders = [join(file_name, folder) for folder in pele_folders]
+    elif isiterable(file_name):
+        pele_folders = file_name[:]
+    else:
+        raise Exception("No file or iterable passed")
+    pele_folders = [folders.strip("\n") for folders in pele_folders]
+
+    if not plot_dir:
+        plot_dir = basename(dirname(pele_folders[0])).replace("_mutations", "")
+
+    return pele_folders, plot_dir
+
+
+def render_on_demand(file_name, mutations=None, dpi=800, box=30, traj=10, plot_dir=None, render=1, cache=None,
+                     stream=False):
+    """
+    Renders the scatter plots left out by the lazy mode of consecutive_analysis
+
+    Parameters
+    ___________
+    file_name : str, iterable, directory
+       The same simulations passed to consecutive_analysis
+    mutations : iterable, optional
+       The mutations to plot, for example T454A, all of them by default
+    dpi : int, optional
+       The quality of the plots
+    box : int, optional
+       how many points are used for the box plots
+    traj : int, optional
+       how many top pdbs are extracted from the trajectories
+    plot_dir : str, optional
+       Name for the results folder
+    render : int, optional
+       How many plots are rendered at the same time
+    cache : str, optional
+       The folder of the cache of the analysis
+    stream : bool, optional
+       Read the reports in chunks with StreamingSimulation
+    """
+    pele_folders, plot_dir = read_folders(file_name, plot_dir)
+    if cache:
+        cache = ArtifactCache(cache)
+    originals = {}
+    for folders in pele_folders:
+        original = load_original(original_folder(folders), box, traj, originals, cache=cache, stream=stream)
+        data_dict = analyse_all(folders, box=box, traj=traj, original=original, cache=cache, stream=stream)
+        render_plots(profile_tasks(plot_dir, data_dict, basename(folders), dpi, keys=mutations or None), render,
+                     cache)
+
+
+def consecutive_analysis(file_name, dpi=800, box=30, traj=10, output="summary",
+                         plot_dir=None, opt="distance", cpus=24, thres=-0.1, positions=1,
+                         render=1, lazy=False, cache=None, stream=False, store=None):
+    """
+    Creates all the plots for the different mutated positions
+
+    Parameters
+    ___________
+    file_name : str, iterable, directory
+       A file, an iterable that contains the path to the PELE simulations folders or
+       the path to the folders where the simulations are stored --> it is equivalent to dirname(iterable[0])
+    dpi : int, optional
+       The quality of the plots
+    box : int, optional
+       how many points are used for the box plots
+    traj : int, optional
+       how many top pdbs are extracted from the trajectories
+    output : str, optional
+       name of the output file for the pdfs
+    plot_dir : str
+       Name for the results folder
+    opt : str, optional
+       choose if to analyse distance, binding or all
+    cpus : int, optional
+       How many cpus to use to extract the top pdbs, in total for all the positions analysed at the same time
+    thres : float, optional
+       The threshold for the mutations to be included in the pdf
+    positions : int, optional
+       How many positions are analysed at the same time, each one in its own process
+    render : int, optional
+       How many plots of each position are rendered at the same time
+    lazy : bool, optional
+       Only render the scatter plots of the mutations in the reports, the rest can be rendered later with
+       render_on_demand
+    cache : str, optional
+       A folder to keep the parsed simulations, plots and snapshots, they are reused while their inputs do not
+       change
+    stream : bool, optional
+       Read the reports in chunks so that the memory of each simulation is bounded, the scatter plots show a
+       uniform sample of the steps
+    store : str, optional
+       The SQLite file that keeps all the steps of the reports of every position, written from the rows parsed
+       for the analysis and read with store.load_steps, by default the steps are not kept
+    """
+    pele_folders, plot_dir = read_folders(file_name, plot_dir)
+    if cache:
+        cache = ArtifactCache(cache)
+    if not os.path.exists("{}_results".format(plot_dir)):
+        os.makedirs("{}_results".format(plot_dir))
+    log = Log("{}_results/analysis".format(plot_dir))
+    if store:
+        store = abspath(store)
+    # the records of all the positions are written by this process, also those analysed in other processes
+    handler = logging.FileHandler('{}_results/top_mutations.log'.format(plot_dir))
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(logging.DEBUG)
+    try:
+        # the wild type is only analysed once for all the positions that share it
+        originals = {}
+        for folder in sorted(set(original_folder(folders) for folders in pele_folders)):
+            with log.timer("parse_original", folder=folder):
+                originals[folder] = load_original(folder, box, traj, cache=cache, stream=stream, store=store)
+        kwargs = {"dpi": dpi, "box": box, "traj": traj, "output": output, "opt": opt, "cpus": cpus, "thres": thres,
+                  "render": render, "lazy": lazy, "cache": cache, "stream": stream, "store": store}
+        positions = max(1, min(positions, len(pele_folders)))
+        if positions == 1:
+            for folders in pele_folders:
+                analyse_position(folders, plot_dir, originals[original_folder(folders)], log, **kwargs)
+        else:
+            # the cpus are shared by the positions analysed at the same time
+            kwargs["cpus"] = max(1, cpus // positions)
+            parallel_positions(pele_folders, plot_dir, originals, log, positions, kwargs)
+    finally:
+        root.removeHandler(handler)
+        handler.close()
+
+
+def parallel_positions(pele_folders, plot_dir, originals, log, positions, kwargs):
+    """
+    Analyses several positions at the same time, each one in its own process
+
+    Parameters
+    ___________
+    pele_folders : list[str]
+       The path to the folder of each position
+    plot_dir : str
+       Name for the results folder
+    originals : dict
+       The wild type of each position by the path of its simulation
+    log : helper.Log
+       The log that keeps the time and memory of each stage, also those of the other processes
+    positions : int
+       How many processes
+    kwargs : dict
+       The rest of the arguments of analyse_position
+    """
+    # the pools that extract the snapshots are created inside the processes, so they cannot be daemonic
+    tasks, results, logs = mp.Queue(), mp.Queue(), mp.Queue()
+    for folders in pele_folders:
+        tasks.put(folders)
+    workers = []
+    for _ in range(positions):
+        tasks.put(None)
+        worker = mp.Process(target=_position_worker, args=(tasks, results, logs, plot_dir, originals, kwargs))
+        worker.start()
+        workers.append(worker)
+    # started after the processes so that they do not inherit the lock of the logging module
+    listener = listen_logs(logs)
+    errors = []
+    done = 0
+    while done < len(pele_folders):
+        try:
+            folders, records, error = results.get(timeout=5)
+        except Empty:
+            if not any(worker.is_alive() for worker in workers):
+                errors.append("{} positions were not analysed".format(len(pele_folders) - done))
+                break
+            continue
+        done += 1
+        log.add(records)
+        if error:
+            errors.append("{}: {}".format(folders, error))
+    for worker in workers:
+        worker.join()
+    logs.put(None)
+    listener.join()
+    if errors:
+        raise Exception("The analysis failed:\n{}".format("\n".join(errors)))
+
+
+def write_ranking(res_dir, data_dict, position_num, analysis="distance", thres=-0.1):
+    """
+    Writes the mutations of a position from the best to the worst median increment
+
+    Parameters
+    ___________
+    res_dir: str
+       Name of the results folder
+    data_dict: dict
+       A dictionary of SimulationData objects that holds information for all mutations
+    position_num: str
+       The position that was mutated
+    analysis: str, optional
+       Choose between ("distance", "binding" or "all") to rank by distance or binding energy
+    thres: float, optional
+       The mutations that would be included in the summary with this threshold are marked with *
+
+    Returns
+    _______
+    name: str
+       The path of the ranking
+    """
+    selected = select_mutations(data_dict, analysis, thres)
+    ranking = []
+    for key, value in data_dict.items():
+        if "original" not in key:
+            dist, bind = value.dist_diff.median(), value.bind_diff.median()
+            ranking.append((bind if analysis == "energy" else dist, key, dist, bind, len(value.dataframe)))
+    ranking.sort(key=lambda x: (np.isnan(x[0]), x[0]))
+    lines = ["mutation    distance increment    binding energy increment    rows\n"]
+    for _, key, dist, bind, rows in ranking:
+        lines.append("{}{}    {:.3f}    {:.3f}    {}\n".format(key, "*" if key in selected else "", dist, bind, rows))
+    name = "{}_results/ranking_{}.txt".format(res_dir, position_num)
+    with atomic_write(name) as rank:
+        rank.writelines(lines)
+
+    return name
+
+
+def watch(file_name, interval=600, dpi=800, box=30, traj=10, plot_dir=None, opt="distance", thres=-0.1, rounds=None):
+    """
+    Follows the simulations while PELE runs, only the new lines of the reports are read in each round to refresh
+    the box plots and the ranking of the mutations of each position
+
+    Parameters
+    ___________
+    file_name : str, iterable, directory
+       The same simulations passed to consecutive_analysis
+    interval : int, optional
+       The seconds between the rounds
+    dpi : int, optional
+       The quality of the plots
+    box : int, optional
+       how many points are used for the box plots
+    traj : int, optional
+       how many top pdbs are extracted from the trajectories
+    plot_dir : str, optional
+       Name for the results folder
+    opt : str, optional
+       choose if to rank by distance, binding or all
+    thres : float, optional
+       The threshold to mark the mutations in the ranking
+    rounds : int, optional
+       Stop after this many rounds, by default it runs until it is interrupted
+    """
+    pele_folders, plot_dir = read_folders(file_name, plot_dir)
+    if not os.path.exists("{}_results".format(plot_dir)):
+        os.makedirs("{}_results".format(plot_dir))
+    live = {}
+    count = 0
+    while rounds is None or count < rounds:
+        updated = set()
+        for folders in pele_folders:
+            folder = original_folder(folders)
+            original = live.setdefault(folder, LiveSimulation(folder, box, traj))
+            if folder not in updated:
+                updated.add(folder)
+                try:
+                    original.update()
+                except IndexError:
+                    # there are not enough rows of the wild type yet
+                    original.distance = None
+            if original.distance is None:
+                continue
+            data_dict = {"original": original}
+            for pele in glob("{}/PELE_*".format(folders)):
+                data = live.setdefault(pele, LiveSimulation(pele, box, traj))
+                data.update()
+                if data.distance is not None:
+                    data.set_distance(original.distance)
+                    data.set_binding(original.binding)
+                    data_dict[basename(pele)[5:]] = data
+            if len(data_dict) > 1:
+                render_plots(box_plot_tasks(plot_dir, data_dict, basename(folders), dpi))
+                write_ranking(plot_dir, data_dict, basename(folders), opt, thres)
+        count += 1
+        if rounds is None or count < rounds:
+            time.sleep(interval)
+
+
+def main():
+    inp, dpi, box, traj, out, folder, analysis, cpus, thres, positions, render, lazy, \
+        plots, cache, interval, stream, store = parse_args()
+    if interval:
+        watch(inp, interval, dpi, box, traj, folder, analysis, thres)
+    elif plots is not None:
+        render_on_demand(inp, plots, dpi, box, traj, folder, render, cache, stream)
+    else:
+        consecutive_analysis(inp, dpi, box, traj, out, folder, analysis, cpus, thres, positions, render,
+                             lazy, cache, stream, store)
+
+
+if __name__ == "__main__":
+    # Run this if this file is executed from command line but not if is imported as API
+    main()
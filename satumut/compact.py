@@ -0,0 +1,298 @@
+"""
+This module stores the mutant PDBs as patches of the wild type and writes them back when they are needed
+"""
+
+import argparse
+import difflib
+import hashlib
+import json
+import os
+from glob import glob
+from os.path import basename, dirname, join, isfile, abspath
+from helper import atomic_write
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Write the full PDB files of the mutants stored in a patch file")
+    # main required arguments
+    parser.add_argument("-p", "--patch", required=True, help="Include the patch file's path")
+    parser.add_argument("-m", "--mutants", required=False, nargs="+",
+                        help="The names of the mutant PDBs to write, all of them by default")
+    parser.add_argument("-o", "--out", required=False,
+                        help="The folder for the PDB files, by default the folder of the patch file")
+    parser.add_argument("-ow", "--overwrite", required=False, action="store_true",
+                        help="Write the PDB files again even if they already exist")
+    args = parser.parse_args()
+
+    return args.patch, args.mutants, args.out, args.overwrite
+
+
+def _is_atom(line):
+    return line.startswith("ATOM") or line.startswith("HETATM")
+
+
+def _mask(line):
+    """
+    Blanks the atom serial number so that the lines after a replaced residue are still equal
+    """
+    if _is_atom(line):
+        return line[:6] + "     " + line[11:]
+    return line
+
+
+def _renumber(lines):
+    """
+    Numbers the atoms consecutively as pmx does when it writes a model
+    """
+    renumbered = []
+    serial = 0
+    for line in lines:
+        if _is_atom(line):
+            serial += 1
+            line = "{}{:5d}{}".format(line[:6], serial, line[11:])
+        renumbered.append(line)
+    return renumbered
+
+
+def _checksum(lines):
+    return hashlib.sha1("".join(lines).encode("utf-8")).hexdigest()
+
+
+def _read_lines(pdb):
+    with open(pdb, "r") as pdb_file:
+        return pdb_file.readlines()
+
+
+def make_patch(base_lines, lines):
+    """
+    Creates the patch that converts the wild type into the mutant
+
+    Parameters
+    ___________
+    base_lines: list[str]
+        The lines of the wild type PDB
+    lines: list[str]
+        The lines of the mutant PDB
+
+    Returns
+    _______
+    patch: dict
+        The replaced blocks of lines {"renumber": bool, "hunks": [[start, end, lines], ..]}
+    """
+    for renumber in (True, False):
+        if renumber:
+            base, mutant = [_mask(x) for x in base_lines], [_mask(x) for x in lines]
+        else:
+            base, mutant = base_lines, lines
+        matcher = difflib.SequenceMatcher(None, base, mutant, autojunk=False)
+        hunks = [[i1, i2, mutant[j1:j2]] for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != "equal"]
+        patch = {"renumber": renumber, "hunks": hunks}
+        # the serial numbers are only left out if renumbering gives back the same file
+        if apply_patch(base_lines, patch) == lines:
+            return patch
+
+    return patch
+
+
+def apply_patch(base_lines, patch):
+    """
+    Converts the wild type into the mutant
+
+    Parameters
+    ___________
+    base_lines: list[str]
+        The lines of the wild type PDB
+    patch: dict
+        The patch created by make_patch
+
+    Returns
+    _______
+    lines: list[str]
+        The lines of the mutant PDB
+    """
+    lines = []
+    start = 0
+    for i1, i2, block in patch["hunks"]:
+        lines.extend(base_lines[start:i1])
+        lines.extend(block)
+        start = i2
+    lines.extend(base_lines[start:])
+    if patch["renumber"]:
+        lines = _renumber(lines)
+    return lines
+
+
+def read_patch(patch_file):
+    """
+    Reads a patch file and checks that its wild type has not changed
+
+    Parameters
+    ___________
+    patch_file: str
+        Path to the patch file
+
+    Returns
+    _______
+    patches: dict
+        {"base": name of the wild type PDB, "checksum": str, "mutants": {name: patch}}
+    base_lines: list[str]
+        The lines of the wild type PDB
+    """
+    with open(patch_file, "r") as patch:
+        patches = json.load(patch)
+    base_lines = _read_lines(join(dirname(patch_file), patches["base"]))
+    if _checksum(base_lines) != patches["checksum"]:
+        raise Exception("{} has changed since {} was created".format(patches["base"], patch_file))
+
+    return patches, base_lines
+
+
+def compact_pdbs(pdbs, base, patch_file):
+    """
+    Replaces the mutant PDBs by their patches with respect to the wild type, all of them in the same file
+
+    Parameters
+    ___________
+    pdbs: list[path]
+        The mutant PDBs, the wild type is left as it is
+    base: str
+        The wild type PDB, it has to be in the same folder as the patch file
+    patch_file: str
+        The path of the patch file, the new mutants are added to it if it already exists
+
+    Returns
+    _______
+    patch_file: str
+        The path of the patch file
+    """
+    base_lines = _read_lines(base)
+    checksum = _checksum(base_lines)
+    patches = {"base": basename(base), "checksum": checksum, "mutants": {}}
+    if isfile(patch_file):
+        with open(patch_file, "r") as patch:
+            old = json.load(patch)
+        if old["base"] == patches["base"] and old["checksum"] == checksum:
+            patches = old
+    compacted = []
+    for pdb in pdbs:
+        if abspath(pdb) == abspath(base) or not isfile(pdb):
+            continue
+        patches["mutants"][basename(pdb)] = make_patch(base_lines, _read_lines(pdb))
+        compacted.append(pdb)
+
+    with atomic_write(patch_file) as patch:
+        json.dump(patches, patch)
+    for pdb in compacted:
+        os.remove(pdb)
+
+    return patch_file
+
+
+def patch_base(patch_file):
+    """
+    Finds the wild type PDB of a patch file
+
+    Parameters
+    ___________
+    patch_file: str
+        Path to the patch file
+
+    Returns
+    _______
+    base: str
+        The path of the wild type PDB
+    """
+    with open(patch_file, "r") as patch:
+        return join(dirname(patch_file), json.load(patch)["base"])
+
+
+def patch_index(folder):
+    """
+    Maps the mutant PDBs stored in the patch files of a folder to their patch file, reading each one only once
+
+    Parameters
+    ___________
+    folder: str
+        The folder of the PDB files
+
+    Returns
+    _______
+    index: dict
+        {name of the mutant PDB: path of the patch file}, the first patch file in order if there are several
+    """
+    index = {}
+    for patch_file in sorted(glob(join(folder or ".", "*.patch"))):
+        with open(patch_file, "r") as patch:
+            for name in json.load(patch)["mutants"]:
+                index.setdefault(name, patch_file)
+    return index
+
+
+def find_patch(pdb):
+    """
+    Finds the patch file that stores a mutant PDB
+
+    Parameters
+    ___________
+    pdb: str
+        The path the mutant PDB would have
+
+    Returns
+    _______
+    patch_file: str
+        The path of the patch file or None if there is none
+    """
+    return patch_index(dirname(pdb)).get(basename(pdb))
+
+
+def materialize(patch_file, mutants=None, folder=None, overwrite=False):
+    """
+    Writes the full PDB files of the mutants stored in a patch file
+
+    Parameters
+    ___________
+    patch_file: str
+        Path to the patch file
+    mutants: list[str], optional
+        The names of the mutant PDBs to write, all of them by default
+    folder: str, optional
+        The folder for the PDB files, by default the folder of the patch file
+    overwrite: bool, optional
+        Write the PDB files again even if they already exist
+
+    Returns
+    _______
+    pdbs: list[path]
+        The paths of the mutant PDBs
+    """
+    patches, base_lines = read_patch(patch_file)
+    if not folder:
+        folder = dirname(patch_file) or "."
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    if not mutants:
+        mutants = sorted(patches["mutants"])
+    pdbs = []
+    for name in mutants:
+        name = basename(name)
+        if name not in patches["mutants"]:
+            raise Exception("{} is not stored in {}".format(name, patch_file))
+        pdb = join(folder, name)
+        if overwrite or not isfile(pdb):
+            with atomic_write(pdb) as new:
+                new.writelines(apply_patch(base_lines, patches["mutants"][name]))
+        pdbs.append(pdb)
+
+    return pdbs
+
+
+def main():
+    patch_file, mutants, folder, overwrite = parse_args()
+    pdbs = materialize(patch_file, mutants, folder, overwrite)
+
+    return pdbs
+
+
+if __name__ == "__main__":
+    # Run this if this file is executed from command line but not if is imported as API
+    pdb_list = main()
@@ -1,171 +1,635 @@
-import logging
-
-
-def map_atom_string(atom_string, initial_pdb, prep_pdb):
-    """
-    Maps the chain ID and residue number of the original PDb file to the PDB file after pmx
-
-    Parameters
-    ___________
-    atom_string: str
-        The positions to map
-    initial_pdb: str
-        The original PDB
-    prep_pdb: str
-        The changed PDB
-
-    Return
-    _______
-    after: str
-        The new atom string or position
-    """
-    # read in user input
-    with open(initial_pdb, "r") as initial:
-        initial_lines = initial.readlines()
-
-    # read in preprocessed input
-    with open(prep_pdb, "r") as prep:
-        prep_lines = prep.readlines()
-
-    # split the atom string or retrieve from the number
-    if len(atom_string.split(":")) == 3:
-        chain, resnum, atom_name = atom_string.split(":")
-        # extract coordinates from user input
-        for i in initial_lines:
-            if (i.startswith("HETATM") or i.startswith("ATOM")) and i[21].strip() == chain.strip() and i[
-                    22:26].strip() == resnum.strip() and i[12:16].strip() == atom_name.strip():
-
-                coords = i[30:54].split()
-
-                # extract coordinates from preprocessed file
-                for p in prep_lines:
-                    if p[30:54].split() == coords:
-                        new_atom_name = p[12:16].strip()
-                        new_resnum = p[22:26].strip()
-                        new_chain = p[21].strip()
-                        after = "{}:{}:{}".format(new_chain, new_resnum, new_atom_name)
-                        break
-                break
-
-    else:
-        chain, resnum = atom_string.split(":")
-        for i in initial_lines:
-            if (i.startswith("HETATM") or i.startswith("ATOM")) and i[21].strip() == chain.strip() and i[
-                                                                    22:26].strip() == resnum.strip():
-                coords = i[30:54].split()
-
-                # extract coordinates from preprocessed file
-                for p in prep_lines:
-                    if p[30:54].split() == coords:
-                        new_resnum = p[22:26].strip()
-                        new_chain = p[21].strip()
-                        after = "{}:{}".format(new_chain, new_resnum)
-                        break
-                break
-
-    return after
-
-
-def isiterable(p_object):
-    """
-    Test if the parameter is an iterable (not a string or a dict) or a file
-
-    Parameters
-    ___________
-    p_object: object
-        Any object
-
-    Returns
-    _______
-    True: bool
-        Returns true if the conditions are met
-    """
-    if type(p_object) == str or type(p_object) == dict:
-        return False
-    try:
-        iter(p_object)
-    except TypeError:
-        return False
-    return True
-
-class Log:
-    """
-    A class to keep log of the output from different modules
-    """
-
-    def __init__(self, name):
-        """
-        Initialize the Log class
-        Parameters
-        __________
-        name: str
-            The name of the log file
-        """
-        self._logger = logging.getLogger(__name__)
-        self._logger.handlers = []
-        self._logger.setLevel(logging.DEBUG)
-        self.fh = logging.FileHandler("{}.log".format(name))
-        self.fh.setLevel(logging.DEBUG)
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        self.fh.setFormatter(formatter)
-        self._logger.addHandler(self.fh)
-
-    def debug(self, messages, exc_info=False):
-        """
-        It pulls a debug message.
-        Parameters
-        ----------
-        messages : str
-            The messages to log
-        exc_info : bool, optional
-            Set to true to include the exception error message
-        """
-        self._logger.debug(messages, exc_info=exc_info)
-
-    def info(self, messages, exc_info=False):
-        """
-        It pulls an info message.
-        Parameters
-        ----------
-        messages : str
-            The messages to log
-        exc_info : bool, optional
-            Set to true to include the exception error message
-        """
-        self._logger.info(messages, exc_info=exc_info)
-
-    def warning(self, messages, exc_info=False):
-        """
-        It pulls a warning message.
-        Parameters
-        ----------
-        messages : str
-            The messages to log
-        exc_info : bool, optional
-            Set to true to include the exception error message
-        """
-        self._logger.warning(messages, exc_info=exc_info)
-
-    def error(self, messages, exc_info=False):
-        """
-        It pulls a error message.
-        Parameters
-        ----------
-        messages : str
-            The messages to log
-        exc_info : bool, optional
-            Set to true to include the exception error message
-        """
-        self._logger.error(messages, exc_info=exc_info)
-
-    def critical(self, messages, exc_info=False):
-        """
-        It pulls a critical message.
-        Parameters
-        ----------
-        messages : str
-            The messages to log
-        exc_info : bool, optional
-            Set to true to include the exception error message
-        """
+import logging
+import os
+import mmap
+import json
+import hashlib
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
+try:
+    import resource
+except ImportError:
+    resource = None
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+
+# Parsed PDB files shared by all the modules -> {path: ((mtime, size), PdbRecords)}, the least recently used first
+_PDB_CACHE = OrderedDict()
+PDB_CACHE_SIZE = 16
+
+
+def _coords_key(line):
+    """
+    Reads the coordinates of a PDB atom line as a hashable key
+
+    Parameters
+    ___________
+    line: str
+        An ATOM or HETATM line
+
+    Return
+    _______
+    key: tuple(float)
+        The x, y, z coordinates rounded to 3 decimals
+    """
+    return round(float(line[30:38]), 3), round(float(line[38:46]), 3), round(float(line[46:54]), 3)
+
+
+class PdbRecords:
+    """
+    A column oriented view of the ATOM and HETATM records of a PDB file
+    """
+    def __init__(self, pdb):
+        """
+        Initialize the PdbRecords object
+
+        Parameters
+        ___________
+        pdb: str
+            Path to the PDB file
+        """
+        self.pdb = pdb
+        self.lines = []
+        rows = []
+        with open(pdb, "rb") as pdb_file:
+            if os.fstat(pdb_file.fileno()).st_size:
+                mapped = mmap.mmap(pdb_file.fileno(), 0, access=mmap.ACCESS_READ)
+                try:
+                    for line in iter(mapped.readline, b""):
+                        if not isinstance(line, str):
+                            line = line.decode()
+                        if line.startswith("HETATM") or line.startswith("ATOM"):
+                            rows.append(len(self.lines))
+                        self.lines.append(line)
+                finally:
+                    mapped.close()
+        atoms = [self.lines[row].rstrip("\r\n") for row in rows]
+        self.rows = np.array(rows, dtype=int)
+        self.record = np.array([line[:6].strip() for line in atoms], dtype=str)
+        self.chain = np.array([line[21:22].strip() for line in atoms], dtype=str)
+        self.resnum = np.array([line[22:26].strip() for line in atoms], dtype=str)
+        self.atom = np.array([line[12:16].strip() for line in atoms], dtype=str)
+        self.coords = np.array([_coords_key(line) for line in atoms], dtype=float).reshape(-1, 3)
+        self.element = np.array([line[66:81] for line in atoms], dtype=str)
+        self._coord_keys = None
+        self._coord_index = None
+        self._element_map = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    def coord_keys(self):
+        """
+        The coordinates of every atom as hashable keys
+
+        Return
+        _______
+        keys: list[tuple(float)]
+            The x, y, z coordinates of each atom rounded to 3 decimals
+        """
+        if self._coord_keys is None:
+            self._coord_keys = [tuple(xyz) for xyz in self.coords.tolist()]
+        return self._coord_keys
+
+    def coord_index(self):
+        """
+        Indexes the atoms by their coordinates, built only once
+
+        Return
+        _______
+        index: dict
+            {coordinates: atom number}, keeping the first atom found at those coordinates
+        """
+        if self._coord_index is None:
+            self._coord_index = {}
+            for ind, key in enumerate(self.coord_keys()):
+                self._coord_index.setdefault(key, ind)
+        return self._coord_index
+
+    def element_map(self):
+        """
+        Maps the coordinates of the atoms to their element columns, built only once
+
+        Return
+        _______
+        element_map: dict
+            {coordinates: element columns}, keeping the first atom found at those coordinates
+        """
+        if self._element_map is None:
+            self._element_map = {}
+            for key, element in zip(self.coord_keys(), self.element.tolist()):
+                self._element_map.setdefault(key, element)
+        return self._element_map
+
+    def residue_atoms(self, chain, resnum, atom_name=None):
+        """
+        Finds the atoms of a residue
+
+        Parameters
+        ___________
+        chain: str
+            The chain ID
+        resnum: str
+            The residue number
+        atom_name: str, optional
+            The atom name, if None all the atoms of the residue are returned
+
+        Return
+        _______
+        atoms: numpy.ndarray
+            The atom numbers in the order of the file
+        """
+        mask = (self.chain == chain.strip()) & (self.resnum == str(resnum).strip())
+        if atom_name is not None:
+            mask &= self.atom == atom_name.strip()
+        return np.flatnonzero(mask)
+
+
+def read_pdb(pdb, cache=True):
+    """
+    Returns the parsed records of a PDB file, it is only parsed again if the file is new or has been modified
+
+    Parameters
+    ___________
+    pdb: str
+        Path to the PDB file
+    cache: bool, optional
+        False to parse a file that will only be read once without keeping it in the cache
+
+    Return
+    _______
+    records: PdbRecords
+        The records of the PDB file
+    """
+    path = os.path.abspath(pdb)
+    stat = os.stat(path)
+    version = (stat.st_mtime, stat.st_size)
+    cached = _PDB_CACHE.pop(path, None)
+    if cached and cached[0] == version:
+        records = cached[1]
+    else:
+        records = PdbRecords(path)
+    if cache:
+        _PDB_CACHE[path] = (version, records)
+        while len(_PDB_CACHE) > PDB_CACHE_SIZE:
+            _PDB_CACHE.popitem(last=False)
+
+    return records
+
+
+def map_atom_strings(atom_strings, initial_pdb, prep_pdb):
+    """
+    Maps several chain ID and residue numbers of the original PDB file to the PDB file after pmx,
+    both files are only parsed once
+
+    Parameters
+    ___________
+    atom_strings: list[str]
+        The positions to map -> chain ID:position or chain ID:position:atom name
+    initial_pdb: str
+        The original PDB
+    prep_pdb: str
+        The changed PDB
+
+    Return
+    _______
+    after: list[str]
+        The new atom strings or positions in the same order
+    """
+    initial = read_pdb(initial_pdb)
+    prep = read_pdb(prep_pdb)
+    initial_keys = initial.coord_keys()
+    prep_index = prep.coord_index()
+    after = []
+    for atom_string in atom_strings:
+        fields = atom_string.split(":")
+        if len(fields) == 3:
+            chain, resnum, atom_name = fields
+            atoms = initial.residue_atoms(chain, resnum, atom_name)
+        else:
+            chain, resnum = fields
+            atoms = initial.residue_atoms(chain, resnum)
+        # extract the first atom whose coordinates are in the preprocessed file
+        for ind in atoms:
+            new = prep_index.get(initial_keys[ind])
+            if new is not None:
+                if len(fields) == 3:
+                    after.append("{}:{}:{}".format(prep.chain[new], prep.resnum[new], prep.atom[new]))
+                else:
+                    after.append("{}:{}".format(prep.chain[new], prep.resnum[new]))
+                break
+        else:
+            raise Exception("{} not found in {}".format(atom_string, prep_pdb))
+
+    return after
+
+
+def map_atom_string(atom_string, initial_pdb, prep_pdb):
+    """
+    Maps the chain ID and residue number of the original PDb file to the PDB file after pmx
+
+    Parameters
+    ___________
+    atom_string: str
+        The positions to map
+    initial_pdb: str
+        The original PDB
+    prep_pdb: str
+        The changed PDB
+
+    Return
+    _______
+    after: str
+        The new atom string or position
+    """
+    return map_atom_strings([atom_string], initial_pdb, prep_pdb)[0]
+
+
+def isiterable(p_object):
+    """
+    Test if the parameter is an iterable (not a string or a dict) or a file
+
+    Parameters
+    ___________
+    p_object: object
+        Any object
+
+    Returns
+    _______
+    True: bool
+        Returns true if the conditions are met
+    """
+    if type(p_object) == str or type(p_object) == dict:
+        return False
+    try:
+        iter(p_object)
+    except TypeError:
+        return False
+    return True
+
+
+def file_signature(paths):
+    """
+    Describes the state of several files without reading them
+
+    Parameters
+    ___________
+    paths: iterable
+        The paths of the files
+
+    Returns
+    _______
+    signature: list[tuple]
+        (path, size, mtime) of each file, with None as size and mtime if it does not exist
+    """
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((path, stat.st_size, stat.st_mtime))
+        except OSError:
+            signature.append((path, None, None))
+    return signature
+
+
+@contextmanager
+def atomic_write(path, mode="w"):
+    """
+    Opens a temporary file that replaces the file in path once it is closed, so that other processes never read
+    the file half written
+
+    Parameters
+    ___________
+    path: str
+        The path of the file
+    mode: str, optional
+        w for text files or wb for binary files
+
+    Returns
+    _______
+    new: file
+        The temporary file to write
+    """
+    temp = "{}.{}".format(path, os.getpid())
+    try:
+        with open(temp, mode) as new:
+            yield new
+        os.rename(temp, path)
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+
+
+class ArtifactCache:
+    """
+    A folder that keeps the results of the stages of the analysis by a hash of their inputs
+    """
+
+    def __init__(self, folder):
+        """
+        Initialize the ArtifactCache class
+        Parameters
+        __________
+        folder: str
+            The folder for the cached results, it is created if it does not exist
+        """
+        self.folder = os.path.abspath(folder)
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+
+    @staticmethod
+    def key(*inputs):
+        """
+        Hashes the inputs of a result, they can be any picklable objects
+
+        Returns
+        _______
+        key: str
+            The sha1 of the inputs
+        """
+        return hashlib.sha1(pickle.dumps(inputs, 2)).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.folder, key[:2], "{}.pkl".format(key))
+
+    def get(self, key, default=None):
+        """
+        Returns a result if it is kept and the files it created have not changed
+
+        Parameters
+        __________
+        key: str
+            The hash of the inputs
+        default: optional
+            What to return if there is no valid result
+
+        Returns
+        _______
+        value:
+            The result or default
+        """
+        try:
+            with open(self._path(key), "rb") as cached:
+                value, outputs = pickle.load(cached)
+        except (IOError, OSError, EOFError, ValueError, pickle.UnpicklingError, ImportError, AttributeError):
+            return default
+        if outputs and file_signature([x[0] for x in outputs]) != outputs:
+            return default
+        return value
+
+    def put(self, key, value=None, outputs=()):
+        """
+        Keeps a result
+
+        Parameters
+        __________
+        key: str
+            The hash of the inputs
+        value: optional
+            The result, for example a parsed simulation
+        outputs: iterable, optional
+            The files created, the result is not valid anymore if any of them changes or is removed
+        """
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path))
+        except OSError:
+            # another process may have created it
+            if not os.path.isdir(os.path.dirname(path)):
+                raise
+        with atomic_write(path, "wb") as cached:
+            pickle.dump((value, file_signature(outputs)), cached, pickle.HIGHEST_PROTOCOL)
+
+
+def peak_memory():
+    """
+    The peak resident memory of this process and of its finished child processes
+
+    Returns
+    _______
+    peak: tuple(float, float)
+        The peak memory in MB of the process and of the largest child, None if it cannot be measured
+    """
+    if resource is None:
+        return None, None
+    # linux reports kilobytes and mac bytes
+    unit = 1024.0 ** 2 if sys.platform == "darwin" else 1024.0
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / unit
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / unit
+
+    return round(own, 1), round(children, 1)
+
+
+class QueueHandler(logging.Handler):
+    """
+    A logging handler that sends the records to another process, where listen_logs writes them
+    """
+
+    def __init__(self, queue):
+        """
+        Initialize the QueueHandler class
+        Parameters
+        __________
+        queue: multiprocessing.Queue
+            The queue read by listen_logs
+        """
+        logging.Handler.__init__(self)
+        self.queue = queue
+
+    def emit(self, record):
+        try:
+            # the arguments and the traceback may not be picklable so they are formatted here
+            record.msg = record.getMessage()
+            record.args = None
+            if record.exc_info:
+                self.format(record)
+                record.exc_info = None
+            self.queue.put(record)
+        except Exception:
+            self.handleError(record)
+
+
+def listen_logs(queue):
+    """
+    Writes the records sent by QueueHandler with the handlers of this process until None is received
+
+    Parameters
+    __________
+    queue: multiprocessing.Queue
+        The queue of the QueueHandler
+
+    Returns
+    _______
+    listener: threading.Thread
+        The thread that writes the records, join it after sending None
+    """
+    def listen():
+        for record in iter(queue.get, None):
+            logging.getLogger(record.name).handle(record)
+
+    listener = threading.Thread(target=listen)
+    listener.daemon = True
+    listener.start()
+
+    return listener
+
+
+class Log:
+    """
+    A class to keep log of the output from different modules
+    """
+
+    def __init__(self, name):
+        """
+        Initialize the Log class
+        Parameters
+        __________
+        name: str
+            The name of the log file, the metrics of the stages are written in name_metrics.jsonl, one line for
+            each stage. If None nothing is written but the metrics are still kept in the records attribute
+        """
+        self._logger = logging.getLogger("{}.{}".format(__name__, os.path.basename(str(name))))
+        self._logger.handlers = []
+        self._logger.setLevel(logging.DEBUG)
+        self._logger.propagate = False
+        self.records = []
+        # the metrics file of an earlier run is replaced by the first stage of this one
+        self._appending = False
+        if name is None:
+            self.fh = logging.NullHandler()
+            self.metrics_file = None
+        else:
+            self.fh = logging.FileHandler("{}.log".format(name))
+            self.metrics_file = os.path.abspath("{}_metrics.jsonl".format(name))
+        self.fh.setLevel(logging.DEBUG)
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        self.fh.setFormatter(formatter)
+        self._logger.addHandler(self.fh)
+
+    @contextmanager
+    def timer(self, stage, **info):
+        """
+        Measures the time and memory of the code inside the with statement and logs it as a stage
+
+        Parameters
+        __________
+        stage: str
+            The name of the stage
+        info: optional
+            Other values to keep with the metrics of the stage, for example the position
+        """
+        start = time.time()
+        times = os.times()
+        status = "failed"
+        try:
+            yield
+            status = "done"
+        finally:
+            end = os.times()
+            self.record(stage, time.time() - start, cpu=end[0] + end[1] - times[0] - times[1],
+                        children_cpu=end[2] + end[3] - times[2] - times[3], status=status, **info)
+
+    def record(self, stage, seconds, **info):
+        """
+        Adds the metrics of a stage and appends them to the metrics file
+
+        Parameters
+        __________
+        stage: str
+            The name of the stage
+        seconds: float
+            The wall time of the stage
+        info: optional
+            Other values to keep with the metrics of the stage
+        """
+        peak, children_peak = peak_memory()
+        metrics = {"stage": stage, "start": round(time.time() - seconds, 3), "seconds": round(seconds, 3),
+                   "peak_rss_mb": peak, "children_peak_rss_mb": children_peak}
+        for key, value in info.items():
+            metrics[key] = round(value, 3) if isinstance(value, float) else value
+        self.info("{} took {:.2f} s, peak memory {} MB".format(stage, seconds, peak))
+        self.add([metrics])
+
+    def add(self, records):
+        """
+        Adds the metrics of stages measured somewhere else, for example in another process
+
+        Parameters
+        __________
+        records: list[dict]
+            The metrics of the stages
+        """
+        self.records.extend(records)
+        if self.metrics_file and records:
+            # only the new records are written, one JSON object per line
+            with open(self.metrics_file, "a" if self._appending else "w") as metrics_file:
+                metrics_file.writelines("{}\n".format(json.dumps(x)) for x in records)
+                metrics_file.flush()
+            self._appending = True
+
+    def debug(self, messages, exc_info=False):
+        """
+        It pulls a debug message.
+        Parameters
+        ----------
+        messages : str
+            The messages to log
+        exc_info : bool, optional
+            Set to true to include the exception error message
+        """
+        self._logger.debug(messages, exc_info=exc_info)
+
+    def info(self, messages, exc_info=False):
+        """
+        It pulls an info message.
+        Parameters
+        ----------
+        messages : str
+            The messages to log
+        exc_info : bool, optional
+            Set to true to include the exception error message
+        """
+        self._logger.info(messages, exc_info=exc_info)
+
+    def warning(self, messages, exc_info=False):
+        """
+        It pulls a warning message.
+        Parameters
+        ----------
+        messages : str
+            The messages to log
+        exc_info : bool, optional
+            Set to true to include the exception error message
+        """
+        self._logger.warning(messages, exc_info=exc_info)
+
+    def error(self, messages, exc_info=False):
+        """
+        It pulls a error message.
+        Parameters
+        ----------
+        messages : str
+            The messages to log
+        exc_info : bool, optional
+            Set to true to include the exception error message
+        """
+        self._logger.error(messages, exc_info=exc_info)
+
+    def critical(self, messages, exc_info=False):
+        """
+        It pulls a critical message.
+        Parameters
+        ----------
+        messages : str
+            The messages to log
+        exc_info : bool, optional
+            Set to true to include the exception error message
+        """
         self._logger.critical(messages, exc_info=exc_info)
\ No newline at end of file
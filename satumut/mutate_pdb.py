@@ -1,299 +1,926 @@
-from pmx import Model
-from pmx.rotamer import load_bbdep
-import argparse
-import os
-from helper import map_atom_string
-from pmx.library import _aacids_dic
-from pmx.rotamer import get_rotamers, select_best_rotamer
-from os.path import basename
-from multiprocessing import Process
-
-
-# Argument parsers
-def parse_args():
-    parser = argparse.ArgumentParser(description="Performs saturated mutagenesis given a PDB file")
-    # main required arguments
-    parser.add_argument("-i", "--input", required=True, help="Include PDB file's path")
-    parser.add_argument("-p", "--position", required=True, nargs="+",
-                        help="Include one or more chain IDs and positions -> Chain ID:position")
-    parser.add_argument("-m", "--multiple", required=False, action="store_true",
-                        help="if you want to mutate 2 residue in the same pdb")
-    parser.add_argument("-hy", "--hydrogen", required=False, action="store_false", help="leave it to default")
-    parser.add_argument("-pd", "--pdb_dir", required=False, default="pdb_files",
-                        help="The name for the mutated pdb folder")
-    parser.add_argument("-co", "--consecutive", required=False, action="store_true",
-                        help="Consecutively mutate the PDB file for several rounds")
-    # arguments = vars(parser.parse_args())
-    args = parser.parse_args()
-    return args.input, args.position, args.hydrogen, args.multiple, args.pdb_dir, args.consecutive
-
-
-class Mutagenesis:
-    """
-    To perform mutations on PDB files
-    """
-    def __init__(self, model, position, folder="pdb_files", consec=False):
-        """
-        Initialize the Mutagenesis object
-
-        Parameters
-        ___________
-        model: str
-           path to the PDB file
-        position: str
-           chain ID:position of the residue, for example A:132
-        folder: str
-           The folder where the pdbs are written
-        consec: bool
-           If this is the second round of mutation
-        """
-        self.model = Model(model)
-        self.input = model
-        self.coords = position
-        self.rotamers = load_bbdep()
-        self.residues = ['ALA', 'CYS', 'GLU', 'ASP', 'GLY', 'PHE', 'ILE', 'HIS', 'LYS', 'MET', 'LEU', 'ASN', 'GLN',
-                         'PRO', 'SER', 'ARG', 'THR', 'TRP', 'VAL', 'TYR']
-        self.final_pdbs = []
-        self.chain = None
-        self.position = None
-        self._invert_aa = {v: k for k, v in _aacids_dic.items()}
-        self.folder = folder
-        self.chain_id = None
-        self.consec = consec
-
-    def mutate(self, residue, new_aa, bbdep, hydrogens=True):
-        """
-        Mutate the wild type residue to a new residue
-
-        Parameters
-        ___________
-        residue: pmx object
-            The residue has to be a pmx object
-        new_aa: str
-            A 3 letter or 1 letter code to represent the new residue
-        bbdep:
-            A database that can be interpreted by pmx
-        hydrogens: bool, optional
-            A boolean, leave it to True because False cause problems with cysteine
-        """
-        if len(new_aa) == 1:
-            new_aa = _aacids_dic[new_aa]
-        phi = residue.get_phi()
-        psi = residue.get_psi()
-        rotamers = get_rotamers(bbdep, new_aa, phi, psi, residue=residue, full=True, hydrogens=hydrogens)
-        new_r = select_best_rotamer(self.model, rotamers)
-        self.model.replace_residue(residue, new_r)
-
-    def _check_coords(self):
-        """
-        map the user coordinates with pmx coordinates
-        """
-        if not os.path.exists(self.folder):
-            os.makedirs(self.folder)
-        if not os.path.exists("{}/original.pdb".format(self.folder)):
-            self.model.write("{}/original.pdb".format(self.folder))
-            self.final_pdbs.append("{}/original.pdb".format(self.folder))
-        if self.consec:
-            self.final_pdbs.remove("{}/original.pdb")
-
-        after = map_atom_string(self.coords, self.input, "{}/original.pdb".format(self.folder))
-        self.chain_id = after.split(":")[0]
-        self.position = int(after.split(":")[1]) - 1
-
-        for chain_ in self.model.chains:
-            if chain_.id == self.chain_id:
-                self.chain = chain_
-
-    def saturated_mutagenesis(self, hydrogens=True):
-        """
-        Generate all the other 19 mutations
-
-        Parameters
-        ___________
-        hydrogens: bool, optional
-            Leave it true since it removes hydrogens (mostly unnecessary) but creates an error for CYS
-        mode: 0/1, optional
-            Acts as a switch, 0 if only 1 mutation per PDB, 1 if 2 mutations per PDB
-
-        Returns
-        _______
-         final_pdbs: list[path]
-            A list of the new files
-        """
-        self._check_coords()
-        aa_init_resname = self.chain.residues[self.position].resname
-        aa_name = self._invert_aa[aa_init_resname]
-        for new_aa in self.residues:
-            if new_aa != aa_init_resname:
-                self.mutate(self.chain.residues[self.position], new_aa, self.rotamers, hydrogens=hydrogens)
-                # writing into a pdb
-                if self.consec:
-                    name = basename(self.input).replace("pdb", "")
-                    output = "{}_{}{}{}.pdb".format(name, aa_name, self.position + 1, self._invert_aa[new_aa])
-                else:
-                    output = "{}{}{}.pdb".format(aa_name, self.position + 1, self._invert_aa[new_aa])
-
-                self.model.write("{}/{}".format(self.folder, output))
-                self.final_pdbs.append("{}/{}".format(self.folder, output))
-
-        return self.final_pdbs
-
-    def single_mutagenesis(self, new_aa, hydrogens=True):
-        """
-        Create single mutations
-
-        Parameters
-        ___________
-        new_aa: str
-            The aa to mutate to, in 3 letter code or 1 letter code
-        hydrogens: bool, optional
-            Leave it true since it removes hydrogens (mostly unnecessary) but creates an error for CYS
-        mode: 0/1, optional
-            0 if it is just 1 mutation per PDB, 1 if there are more than one mutations
-
-        Returns
-        ______
-        file_: str
-            The name of the new pdb file
-        """
-        self._check_coords()
-        aa_init_resname = self.chain.residues[self.position].resname
-        aa_name = self._invert_aa[aa_init_resname]
-        self.mutate(self.chain.residues[self.position], new_aa, self.rotamers, hydrogens=hydrogens)
-        # writing into a pdb
-        if len(new_aa) == 1:
-            new = new_aa
-        elif self._invert_aa.get(new_aa):
-            new = self._invert_aa[new_aa]
-        else:
-            raise Exception("Aminoacid not recognized")
-
-        if self.consec:
-            name = basename(self.input).replace("pdb", "")
-            output = "{}_{}{}{}.pdb".format(name, aa_name, self.position + 1, new)
-        else:
-            output = "{}{}{}.pdb".format(aa_name, self.position + 1, new)
-
-        file_ = "{}/{}".format(self.folder, output)
-        self.model.write(file_)
-        self.insert_atomtype(file_)
-
-        return file_
-
-    def insert_atomtype(self, prep_pdb):
-        """
-        modifies the pmx PDB files to include the atom type
-
-        Parameters
-        ___________
-        prep_pdb: path
-            PDB files to modify
-        """
-        # read in user input
-        with open(self.input, "r") as initial:
-            initial_lines = initial.readlines()
-
-        # read in preprocessed input
-        with open(prep_pdb, "r") as prep:
-            prep_lines = prep.readlines()
-
-        for ind, line in enumerate(prep_lines):
-            if (line.startswith("HETATM") or line.startswith("ATOM")) and (
-                    line[21].strip() != self.chain_id.strip() or line[
-                                                                 22:26].strip() != str(self.position + 1)):
-                coords = line[30:54].split()
-                for linex in initial_lines:
-                    if linex[30:54].split() == coords:
-                        prep_lines[ind] = line.strip("\n") + linex[66:81]
-                        break
-
-            elif (line.startswith("HETATM") or line.startswith("ATOM")) and line[
-                21].strip() == self.chain_id.strip() and line[
-                                                         22:26].strip() == str(self.position + 1):
-
-                atom_name = line[12:16].strip()
-                if atom_name[0].isalpha():
-                    atom_type = "           {}  \n".format(atom_name[0])
-                else:
-                    atom_type = "           {}  \n".format(atom_name[1])
-
-                prep_lines[ind] = line.strip("\n") + atom_type
-
-        # rewrittes the files now with the atom type
-        with open(prep_pdb, "w") as prep:
-            prep.writelines(prep_lines)
-
-    def accelerated_insert(self, file_list=None):
-        """
-        Paralelizes the insert atomtype function
-
-        Parameters
-        ___________
-        file_list: list[path]
-            optional if you want to include another list
-        """
-        pros = []
-        if file_list:
-            self.final_pdbs = file_list
-        for prep_pdb in self.final_pdbs:
-            p = Process(target=self.insert_atomtype, args=(prep_pdb,))
-            p.start()
-            pros.append(p)
-        for p in pros:
-            p.join()
-
-
-def generate_mutations(input_, position, hydrogens=True, multiple=False, folder="pdb_files", consec=False):
-    """
-    To generate up to 2 mutations per pdb
-
-    Parameters
-    ___________
-    input_: str
-        Input pdb to be used to generate the mutations
-    position: list[str]
-        [chain ID:position] of the residue, for example [A:139,..]
-    hydrogens: bool, optional
-        Leave it true since it removes hydrogens (mostly unnecessary) but creates an error for CYS
-    multiple: bool, optional
-        Specify if to mutate 2 positions at the same pdb
-    folder: str, optional
-        The name of the folder where the new PDb files will be stored
-    consec: bool, optional
-        Consecutively mutate the PDB file for several rounds
-
-    Returns
-    ________
-    pdbs: list[paths]
-        The list of all generated pdbs' path
-    """
-    pdbs = []
-    # Perform single saturated mutations
-    for mutation in position:
-        run = Mutagenesis(input_, mutation, folder, consec)
-        final_pdbs = run.saturated_mutagenesis(hydrogens=hydrogens)
-        pdbs.extend(final_pdbs)
-        run.accelerated_insert()
-        # Mutate in a second position for each of the single mutations
-        if multiple and len(position) == 2:
-            for files in final_pdbs:
-                name = basename(files).replace(".pdb", "")
-                if name != "original.pdb":
-                    run_ = Mutagenesis(files, position[1], folder, consec)
-                    final_pdbs_2 = run_.saturated_mutagenesis(hydrogens=hydrogens)
-                    pdbs.extend(final_pdbs_2)
-                    run_.accelerated_insert()
-
-    return pdbs
-
-
-def main():
-    input_, position, hydrogen, multiple, folder, consec = parse_args()
-    output = generate_mutations(input_, position, hydrogen, multiple, folder, consec)
-
-    return output
-
-
-if __name__ == "__main__":
-    # Run this if this file is executed from command line but not if is imported as API
-    all_pdbs = main()
+from pmx import Model
+from pmx.rotamer import load_bbdep
+import pmx
+import argparse
+import os
+import hashlib
+import shutil
+import copy
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+from helper import map_atom_string, read_pdb, Log, atomic_write
+from compact import compact_pdbs
+from pmx.library import _aacids_dic
+from pmx.rotamer import get_rotamers, select_best_rotamer
+from os.path import basename
+import multiprocessing as mp
+from functools import partial
+import numpy as np
+
+# The backbone dependent rotamer library, loaded once per process and inherited by the forked workers
+_ROTAMERS = None
+# The atom types of the input PDB in the workers of accelerated_insert
+_ATOM_MAP = None
+# The wild type model in the workers generating the double mutants
+_MUTAGENESIS = None
+# The rotamers are scored as in pmx select_best_rotamer: the atoms that are not scored, the residues that are
+# not neighbours, the distance below which heavy atoms overlap, the size of the box around the rotamer where
+# the neighbours are and the score below which a rotamer is taken without checking the rest
+BACKBONE = ["N", "CA", "C", "O", "H", "CB", "HA"]
+SOLVENT = ["SOL", "NaS", "ClS", "NA", "CL", "NaJ", "ClJ"]
+CLASH_DISTANCE = 3.2
+NEIGHBOUR_CUTOFF = 6.0
+GOOD_SCORE = 0.2
+# Part of the key of the mutant cache, changed when the same inputs give other mutants
+CACHE_VERSION = 2
+
+
+# Argument parsers
+def parse_args():
+    parser = argparse.ArgumentParser(description="Performs saturated mutagenesis given a PDB file")
+    # main required arguments
+    parser.add_argument("-i", "--input", required=True, help="Include PDB file's path")
+    parser.add_argument("-p", "--position", required=True, nargs="+",
+                        help="Include one or more chain IDs and positions -> Chain ID:position")
+    parser.add_argument("-m", "--multiple", required=False, action="store_true",
+                        help="if you want to mutate 2 residue in the same pdb")
+    parser.add_argument("-hy", "--hydrogen", required=False, action="store_false", help="leave it to default")
+    parser.add_argument("-pd", "--pdb_dir", required=False, default="pdb_files",
+                        help="The name for the mutated pdb folder")
+    parser.add_argument("-co", "--consecutive", required=False, action="store_true",
+                        help="Consecutively mutate the PDB file for several rounds")
+    parser.add_argument("-rc", "--rotamer_cache", required=False,
+                        help="A file to keep a pre-parsed copy of the rotamer library for a faster start")
+    parser.add_argument("-w", "--workers", required=False, default=1, type=int,
+                        help="The number of positions to mutate in parallel")
+    parser.add_argument("-cp", "--compact", required=False, action="store_true",
+                        help="Store the mutants as patches of the wild type, they are written by satumut.compact")
+    parser.add_argument("-ca", "--cache", required=False,
+                        help="A folder to keep the mutants so that they are not generated again in later runs")
+    parser.add_argument("-fr", "--fast_rotamers", required=False, action="store_true",
+                        help="Score the rotamers with numpy, the same rotamers as pmx are chosen")
+    # arguments = vars(parser.parse_args())
+    args = parser.parse_args()
+    return args.input, args.position, args.hydrogen, args.multiple, args.pdb_dir, args.consecutive, \
+        args.rotamer_cache, args.workers, args.compact, args.cache, args.fast_rotamers
+
+
+def rotamer_version():
+    """
+    Identifies the rotamer library shipped with the installed pmx
+
+    Returns
+    _______
+    version: str
+        The pmx version and the modification time of its rotamer module
+    """
+    module = pmx.rotamer.__file__
+    return "{}-{}".format(getattr(pmx, "__version__", "unknown"), int(os.path.getmtime(module)))
+
+
+def load_rotamers(cache_file=None):
+    """
+    Loads the backbone dependent rotamer library only once per process, load it before creating
+    the processes or pools so that the workers share it
+
+    Parameters
+    ___________
+    cache_file: str, optional
+        A pickled copy of the library, it is used if it matches the installed pmx or created otherwise
+
+    Returns
+    _______
+    rotamers: dict
+        The rotamer library that pmx uses
+    """
+    global _ROTAMERS
+    if _ROTAMERS is not None:
+        return _ROTAMERS
+    version = rotamer_version()
+    if cache_file and os.path.exists(cache_file):
+        with open(cache_file, "rb") as lib:
+            cached = pickle.load(lib)
+        if cached.get("version") == version:
+            _ROTAMERS = cached["library"]
+    if _ROTAMERS is None:
+        _ROTAMERS = load_bbdep()
+        if cache_file:
+            with atomic_write(cache_file, "wb") as lib:
+                pickle.dump({"version": version, "library": _ROTAMERS}, lib, pickle.HIGHEST_PROTOCOL)
+
+    return _ROTAMERS
+
+
+def annotate_pdb(prep_pdb, atom_map, residues):
+    """
+    modifies a pmx PDB file to include the atom type
+
+    Parameters
+    ___________
+    prep_pdb: path
+        PDB file to modify
+    atom_map: dict
+        {coordinates: element columns} of the input PDB
+    residues: list[tuple(str, int)]
+        The chain ID and residue number of the mutated residues, their atom types are taken from the atom names
+    """
+    # read in preprocessed input, it is rewritten so it is not kept in the cache
+    prep = read_pdb(prep_pdb, cache=False)
+    prep_lines = prep.lines[:]
+    mutated = np.zeros(len(prep), dtype=bool)
+    for chain_id, resnum in residues:
+        mutated |= (prep.chain == chain_id.strip()) & (prep.resnum == str(resnum))
+
+    for row, key, atom_name, mut in zip(prep.rows, prep.coord_keys(), prep.atom, mutated):
+        line = prep_lines[row].strip("\n")
+        if not mut:
+            if key in atom_map:
+                prep_lines[row] = line + atom_map[key] + "\n"
+        else:
+            if atom_name[0].isalpha():
+                atom_type = "           {}  \n".format(atom_name[0])
+            else:
+                atom_type = "           {}  \n".format(atom_name[1])
+
+            prep_lines[row] = line + atom_type
+
+    # rewrittes the files now with the atom type
+    with open(prep_pdb, "w") as prep:
+        prep.writelines(prep_lines)
+
+
+def _annotate_files(files, atom_map, residues):
+    """
+    Inserts the atom types in several files, a file that fails does not stop the rest
+
+    Parameters
+    ___________
+    files: list[path]
+        The PDB files to modify
+    atom_map: dict
+        {coordinates: element columns} of the input PDB
+    residues: list[tuple(str, int)]
+        The chain ID and residue number of the mutated residues
+
+    Returns
+    _______
+    failed: list[tuple(path, str)]
+        The files that could not be modified and the error
+    """
+    failed = []
+    for prep_pdb in files:
+        try:
+            annotate_pdb(prep_pdb, atom_map, residues)
+        except Exception as e:
+            failed.append((prep_pdb, "{}: {}".format(type(e).__name__, e)))
+
+    return failed
+
+
+def _init_insert(input_):
+    """
+    Builds the atom type map of the input once per worker of accelerated_insert
+
+    Parameters
+    ___________
+    input_: str
+        The input PDB
+    """
+    global _ATOM_MAP
+    _ATOM_MAP = read_pdb(input_).element_map()
+
+
+def _insert_batch(batch, chain_id, resnum):
+    """
+    Inserts the atom types in a batch of files
+
+    Parameters
+    ___________
+    batch: list[path]
+        The PDB files to modify
+    chain_id: str
+        The chain ID of the mutated residue
+    resnum: str
+        The residue number of the mutated residue
+
+    Returns
+    _______
+    failed: list[tuple(path, str)]
+        The files that could not be modified and the error
+    """
+    return _annotate_files(batch, _ATOM_MAP, [(chain_id, resnum)])
+
+
+def _link(source, target):
+    """
+    Hard links a file or copies it if they are in different file systems
+
+    Parameters
+    ___________
+    source: str
+        The existing file
+    target: str
+        The new path, it is replaced if it exists
+    """
+    if os.path.exists(target):
+        os.remove(target)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+def _init_double(input_, position, folder, consec, fast_rotamers=False):
+    """
+    Parses the wild type once per worker generating the double mutants
+
+    Parameters
+    ___________
+    input_: str
+        The input PDB
+    position: str
+        chain ID:position of the first residue to mutate
+    folder: str
+        The folder where the pdbs are written
+    consec: bool
+        If this is the second round of mutation
+    fast_rotamers: bool, optional
+        Score the rotamers with numpy instead of with pmx
+    """
+    global _MUTAGENESIS
+    _MUTAGENESIS = Mutagenesis(input_, position, folder, consec, fast_rotamers=fast_rotamers)
+    _MUTAGENESIS._check_coords()
+
+
+def _double_mutants(new_aa, position, hydrogens=True):
+    """
+    Generates the double mutants of a first residue in a worker
+
+    Parameters
+    ___________
+    new_aa: str
+        The 3 letter code of the new residue in the first position
+    position: str
+        chain ID:position of the second residue to mutate
+    hydrogens: bool, optional
+        Leave it true since it removes hydrogens (mostly unnecessary) but creates an error for CYS
+
+    Returns
+    _______
+    pdbs: list[path]
+        The new files
+    failed: list[tuple(path, str)]
+        The files where the atom types could not be inserted and the error
+    """
+    _MUTAGENESIS.failed = []
+    pdbs = _MUTAGENESIS.double_mutagenesis(position, new_aa, hydrogens)
+
+    return pdbs, _MUTAGENESIS.failed
+
+
+class Mutagenesis:
+    """
+    To perform mutations on PDB files
+    """
+    residues = ['ALA', 'CYS', 'GLU', 'ASP', 'GLY', 'PHE', 'ILE', 'HIS', 'LYS', 'MET', 'LEU', 'ASN', 'GLN', 'PRO',
+                'SER', 'ARG', 'THR', 'TRP', 'VAL', 'TYR']
+
+    def __init__(self, model, position, folder="pdb_files", consec=False, rotamers=None, cache=None,
+                 fast_rotamers=False):
+        """
+        Initialize the Mutagenesis object
+
+        Parameters
+        ___________
+        model: str
+           path to the PDB file
+        position: str
+           chain ID:position of the residue, for example A:132
+        folder: str
+           The folder where the pdbs are written
+        consec: bool
+           If this is the second round of mutation
+        rotamers: dict, optional
+           The rotamer library, by default the one shared by the process
+        cache: str, optional
+           A folder to keep the mutants so that identical ones are linked instead of generated again
+        fast_rotamers: bool, optional
+           Score the rotamers with numpy instead of with pmx, the same rotamers are chosen
+        """
+        self.model = Model(model)
+        self.input = model
+        self.coords = position
+        if rotamers is None:
+            rotamers = load_rotamers()
+        self.rotamers = rotamers
+        self.final_pdbs = []
+        self.chain = None
+        self.position = None
+        self._invert_aa = {v: k for k, v in _aacids_dic.items()}
+        self.folder = folder
+        self.chain_id = None
+        self.consec = consec
+        self.cache = cache
+        self.cached = []
+        self._cache_files = {}
+        self._input_hash = None
+        self.fast_rotamers = fast_rotamers
+        self._neighbours = None
+        self.failed = []
+
+    def mutate(self, residue, new_aa, bbdep, hydrogens=True):
+        """
+        Mutate the wild type residue to a new residue
+
+        Parameters
+        ___________
+        residue: pmx object
+            The residue has to be a pmx object
+        new_aa: str
+            A 3 letter or 1 letter code to represent the new residue
+        bbdep:
+            A database that can be interpreted by pmx
+        hydrogens: bool, optional
+            A boolean, leave it to True because False cause problems with cysteine
+        """
+        if len(new_aa) == 1:
+            new_aa = _aacids_dic[new_aa]
+        phi = residue.get_phi()
+        psi = residue.get_psi()
+        rotamers = get_rotamers(bbdep, new_aa, phi, psi, residue=residue, full=True, hydrogens=hydrogens)
+        if self.fast_rotamers:
+            new_r = self.select_rotamer(residue, rotamers)
+        else:
+            new_r = select_best_rotamer(self.model, rotamers)
+        self.model.replace_residue(residue, new_r)
+
+    def _neighbour_coords(self, residue):
+        """
+        The coordinates of the heavy atoms of the other residues, computed once per position and model
+
+        Parameters
+        ___________
+        residue: pmx object
+            The residue to mutate
+
+        Returns
+        _______
+        coords: numpy.ndarray
+            The coordinates of the heavy atoms that are not solvent nor part of the residue
+        """
+        key = (residue.chain_id, residue.id)
+        if self._neighbours is None or self._neighbours[0] is not self.model or self._neighbours[1] != key:
+            coords = [atom.x for atom in self.model.atoms if atom.symbol != "H" and atom.resname not in SOLVENT
+                      and (atom.chain_id, atom.resnr) != key]
+            self._neighbours = (self.model, key, np.array(coords, dtype=float).reshape(-1, 3))
+        return self._neighbours[2]
+
+    def select_rotamer(self, residue, rotamers):
+        """
+        Chooses the same rotamer as pmx select_best_rotamer with the distances computed by numpy
+
+        Parameters
+        ___________
+        residue: pmx object
+            The residue to mutate
+        rotamers: list[pmx object]
+            The rotamers of the new residue
+
+        Returns
+        _______
+        rotamer: pmx object
+            The first rotamer with a score below GOOD_SCORE or the one with the lowest score
+        """
+        if len(rotamers) == 1:
+            return rotamers[0]
+        # the residue being replaced is still in the model and pmx counts it as a neighbour
+        own = [atom.x for atom in residue.atoms if atom.symbol != "H" and atom.resname not in SOLVENT]
+        coords = np.vstack([self._neighbour_coords(residue), np.array(own, dtype=float).reshape(-1, 3)])
+        center = np.array(rotamers[0].com(vector_only=True))
+        neighbours = coords[(np.abs(coords - center) <= NEIGHBOUR_CUTOFF).all(axis=1)]
+        best, min_score = 0, 999.
+        for ind, rotamer in enumerate(rotamers):
+            side_chain = np.array([atom.x for atom in rotamer.atoms if atom.name not in BACKBONE
+                                   and atom.symbol != "H"], dtype=float).reshape(-1, 3)
+            distances = np.sqrt(((side_chain[:, np.newaxis] - neighbours[np.newaxis]) ** 2).sum(-1))
+            score = np.clip(CLASH_DISTANCE - distances, 0, None).sum() / len(side_chain)
+            if score < GOOD_SCORE:
+                return rotamer
+            if score < min_score:
+                best, min_score = ind, score
+
+        return rotamers[best]
+
+    def _check_coords(self):
+        """
+        map the user coordinates with pmx coordinates
+        """
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+        if not os.path.exists("{}/original.pdb".format(self.folder)):
+            self.model.write("{}/original.pdb".format(self.folder))
+            self.final_pdbs.append("{}/original.pdb".format(self.folder))
+        if self.consec and "{}/original.pdb".format(self.folder) in self.final_pdbs:
+            self.final_pdbs.remove("{}/original.pdb".format(self.folder))
+
+        self.chain_id, self.position = self._map_position(self.coords)
+        self.chain = self._find_chain(self.chain_id)
+
+    def _map_position(self, position):
+        """
+        map a position of the input with the pmx chain ID and residue index
+
+        Parameters
+        ___________
+        position: str
+            chain ID:position of the residue in the input
+
+        Returns
+        _______
+        chain_id: str
+            The chain ID in pmx
+        index: int
+            The index of the residue in the pmx chain
+        """
+        after = map_atom_string(position, self.input, "{}/original.pdb".format(self.folder))
+        return after.split(":")[0], int(after.split(":")[1]) - 1
+
+    def _find_chain(self, chain_id):
+        """
+        Finds a chain in the current model
+
+        Parameters
+        ___________
+        chain_id: str
+            The chain ID
+
+        Returns
+        _______
+        chain: pmx object
+            The chain of the model
+        """
+        chain = None
+        for chain_ in self.model.chains:
+            if chain_.id == chain_id:
+                chain = chain_
+        return chain
+
+    def _cache_file(self, new_aa, hydrogens=True):
+        """
+        The path of a mutant in the cache, it depends on the content of the input, the mapped position,
+        the new residue, the hydrogens, the rotamer library and how the rotamers are scored
+
+        Parameters
+        ___________
+        new_aa: str
+            The 3 letter code of the new residue
+        hydrogens: bool, optional
+            The hydrogens argument of the mutation
+
+        Returns
+        _______
+        cache_file: str
+            The path of the mutant in the cache
+        """
+        if self._input_hash is None:
+            with open(self.input, "rb") as initial:
+                self._input_hash = hashlib.sha1(initial.read()).hexdigest()
+        key = "{}-{}:{}-{}-{}-{}-{}-{}".format(self._input_hash, self.chain_id, self.position + 1, new_aa, hydrogens,
+                                                rotamer_version(), "numpy" if self.fast_rotamers else "pmx",
+                                                CACHE_VERSION)
+        key = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache, key[:2], "{}.pdb".format(key))
+
+    def _store_cache(self):
+        """
+        Links the new mutants into the cache once they have the atom types
+        """
+        for file_, cache_file in self._cache_files.items():
+            if os.path.exists(file_) and not os.path.exists(cache_file):
+                if not os.path.exists(os.path.dirname(cache_file)):
+                    try:
+                        os.makedirs(os.path.dirname(cache_file))
+                    except OSError:
+                        # created in the meantime by another worker
+                        pass
+                try:
+                    os.link(file_, cache_file)
+                except OSError:
+                    if not os.path.exists(cache_file):
+                        shutil.copyfile(file_, cache_file)
+        self._cache_files = {}
+
+    def saturated_mutagenesis(self, hydrogens=True):
+        """
+        Generate all the other 19 mutations
+
+        Parameters
+        ___________
+        hydrogens: bool, optional
+            Leave it true since it removes hydrogens (mostly unnecessary) but creates an error for CYS
+        mode: 0/1, optional
+            Acts as a switch, 0 if only 1 mutation per PDB, 1 if 2 mutations per PDB
+
+        Returns
+        _______
+         final_pdbs: list[path]
+            A list of the new files
+        """
+        self._check_coords()
+        wild = self.chain.residues[self.position]
+        aa_init_resname = wild.resname
+        aa_name = self._invert_aa[aa_init_resname]
+        for new_aa in self.residues:
+            if new_aa != aa_init_resname:
+                if self.consec:
+                    name = basename(self.input).replace("pdb", "")
+                    output = "{}_{}{}{}.pdb".format(name, aa_name, self.position + 1, self._invert_aa[new_aa])
+                else:
+                    output = "{}{}{}.pdb".format(aa_name, self.position + 1, self._invert_aa[new_aa])
+                file_ = "{}/{}".format(self.folder, output)
+                # the mutants already in the cache are linked instead of generated
+                if self.cache and os.path.exists(self._cache_file(new_aa, hydrogens)):
+                    _link(self._cache_file(new_aa, hydrogens), file_)
+                    self.cached.append(file_)
+                else:
+                    # the residue at the position is scored as a neighbour of the rotamers, so each mutant starts
+                    # from the wild type to be the same whatever mutants were taken from the cache before it
+                    self._restore(wild)
+                    self.mutate(wild, new_aa, self.rotamers, hydrogens=hydrogens)
+                    # writing into a pdb, removed first so that it does not write into a file linked to the cache
+                    if os.path.exists(file_):
+                        os.remove(file_)
+                    self.model.write(file_)
+                    if self.cache:
+                        self._cache_files[file_] = self._cache_file(new_aa, hydrogens)
+                self.final_pdbs.append(file_)
+        self._restore(wild)
+
+        return self.final_pdbs
+
+    def _restore(self, wild):
+        """
+        Puts the wild type residue back at the position if a mutant replaced it
+
+        Parameters
+        ___________
+        wild: pmx object
+            The residue of the wild type at the position
+        """
+        current = self.chain.residues[self.position]
+        if current is not wild:
+            self.model.replace_residue(current, wild)
+
+    def double_mutagenesis(self, position, new_aa, hydrogens=True):
+        """
+        Mutates the first position in a copy of the model and then the second position to the other 19
+        aminoacids, the model is restored at the end
+
+        Parameters
+        ___________
+        position: str
+            chain ID:position of the second residue in the input, for example A:139
+        new_aa: str
+            The 3 letter code of the new residue in the first position
+        hydrogens: bool, optional
+            Leave it true since it removes hydrogens (mostly unnecessary) but creates an error for CYS
+
+        Returns
+        _______
+        pdbs: list[path]
+            The double mutants
+        """
+        if self.chain is None:
+            self._check_coords()
+        wild = self.model
+        chain_id2, position2 = self._map_position(position)
+        aa_init_resname = self.chain.residues[self.position].resname
+        aa_init_resname2 = self._find_chain(chain_id2).residues[position2].resname
+        pdbs = []
+        if new_aa == aa_init_resname:
+            return pdbs
+        self.model = copy.deepcopy(wild)
+        try:
+            chain = self._find_chain(self.chain_id)
+            self.mutate(chain.residues[self.position], new_aa, self.rotamers, hydrogens=hydrogens)
+            if self.consec:
+                name = basename(self.input).replace("pdb", "")
+                first = "{}_{}{}{}".format(name, self._invert_aa[aa_init_resname], self.position + 1,
+                                           self._invert_aa[new_aa])
+            else:
+                first = "{}{}{}".format(self._invert_aa[aa_init_resname], self.position + 1, self._invert_aa[new_aa])
+            chain2 = self._find_chain(chain_id2)
+            for new_aa2 in self.residues:
+                if new_aa2 != aa_init_resname2:
+                    self.mutate(chain2.residues[position2], new_aa2, self.rotamers, hydrogens=hydrogens)
+                    file_ = "{}/{}_{}{}{}.pdb".format(self.folder, first, self._invert_aa[aa_init_resname2],
+                                                      position2 + 1, self._invert_aa[new_aa2])
+                    if os.path.exists(file_):
+                        os.remove(file_)
+                    self.model.write(file_)
+                    pdbs.append(file_)
+        finally:
+            self.model = wild
+
+        atom_map = read_pdb(self.input).element_map()
+        failed = _annotate_files(pdbs, atom_map, [(self.chain_id, self.position + 1), (chain_id2, position2 + 1)])
+        self._discard(failed)
+        failed = set(prep_pdb for prep_pdb, _ in failed)
+
+        return [file_ for file_ in pdbs if file_ not in failed]
+
+    def single_mutagenesis(self, new_aa, hydrogens=True):
+        """
+        Create single mutations
+
+        Parameters
+        ___________
+        new_aa: str
+            The aa to mutate to, in 3 letter code or 1 letter code
+        hydrogens: bool, optional
+            Leave it true since it removes hydrogens (mostly unnecessary) but creates an error for CYS
+        mode: 0/1, optional
+            0 if it is just 1 mutation per PDB, 1 if there are more than one mutations
+
+        Returns
+        ______
+        file_: str
+            The name of the new pdb file
+        """
+        self._check_coords()
+        aa_init_resname = self.chain.residues[self.position].resname
+        aa_name = self._invert_aa[aa_init_resname]
+        self.mutate(self.chain.residues[self.position], new_aa, self.rotamers, hydrogens=hydrogens)
+        # writing into a pdb
+        if len(new_aa) == 1:
+            new = new_aa
+        elif self._invert_aa.get(new_aa):
+            new = self._invert_aa[new_aa]
+        else:
+            raise Exception("Aminoacid not recognized")
+
+        if self.consec:
+            name = basename(self.input).replace("pdb", "")
+            output = "{}_{}{}{}.pdb".format(name, aa_name, self.position + 1, new)
+        else:
+            output = "{}{}{}.pdb".format(aa_name, self.position + 1, new)
+
+        file_ = "{}/{}".format(self.folder, output)
+        self.model.write(file_)
+        self.insert_atomtype(file_)
+
+        return file_
+
+    def insert_atomtype(self, prep_pdb, atom_map=None):
+        """
+        modifies the pmx PDB files to include the atom type
+
+        Parameters
+        ___________
+        prep_pdb: path
+            PDB files to modify
+        atom_map: dict, optional
+            {coordinates: element columns} of the input PDB, it is built from the input if not given
+        """
+        # read in user input
+        if atom_map is None:
+            atom_map = read_pdb(self.input).element_map()
+        annotate_pdb(prep_pdb, atom_map, [(self.chain_id, self.position + 1)])
+
+    def _discard(self, failed):
+        """
+        Removes the files where the atom types could not be inserted so that no simulation is launched with them
+
+        Parameters
+        ___________
+        failed: list[tuple(path, str)]
+            The files and the errors
+        """
+        for prep_pdb, error in failed:
+            self._cache_files.pop(prep_pdb, None)
+            if prep_pdb in self.final_pdbs:
+                self.final_pdbs.remove(prep_pdb)
+            if os.path.exists(prep_pdb):
+                os.remove(prep_pdb)
+        self.failed.extend(failed)
+
+    def insert_atomtypes(self, file_list=None):
+        """
+        Inserts the atom type in several PDB files reusing the same map of the input PDB
+
+        Parameters
+        ___________
+        file_list: list[path], optional
+            The PDB files to modify, by default the ones created by the object
+
+        Returns
+        _______
+        failed: list[tuple(path, str)]
+            The files where the atom types could not be inserted and the error, they are removed
+        """
+        atom_map = read_pdb(self.input).element_map()
+        # the mutants from the cache already have them
+        pdbs = [prep_pdb for prep_pdb in file_list or self.final_pdbs if prep_pdb not in self.cached]
+        failed = _annotate_files(pdbs, atom_map, [(self.chain_id, self.position + 1)])
+        self._discard(failed)
+        self._store_cache()
+
+        return failed
+
+    def accelerated_insert(self, file_list=None, cpus=None):
+        """
+        Paralelizes the insert atomtype function in a pool of processes working on batches of files
+
+        Parameters
+        ___________
+        file_list: list[path]
+            optional if you want to include another list
+        cpus: int, optional
+            The maximum number of processes, by default the number of cpus available
+
+        Returns
+        _______
+        failed: list[tuple(path, str)]
+            The files where the atom types could not be inserted and the error, they are removed
+        """
+        if file_list:
+            self.final_pdbs = list(file_list)
+        # the mutants from the cache already have them
+        pdbs = [prep_pdb for prep_pdb in self.final_pdbs if prep_pdb not in self.cached]
+        if not pdbs:
+            return []
+        processes = min(cpus or mp.cpu_count(), len(pdbs))
+        size = -(-len(pdbs) // processes)
+        batches = [pdbs[i:i + size] for i in range(0, len(pdbs), size)]
+        # built before forking so that the workers inherit it instead of parsing the input again
+        read_pdb(self.input).element_map()
+        pool = mp.Pool(processes, initializer=_init_insert, initargs=(self.input,))
+        func = partial(_insert_batch, chain_id=self.chain_id, resnum=self.position + 1)
+        failed = []
+        for batch_failed in pool.map(func, batches, 1):
+            failed.extend(batch_failed)
+        pool.close()
+        pool.join()
+        self._discard(failed)
+        self._store_cache()
+
+        return failed
+
+
+def saturate_position(mutation, input_, hydrogens=True, folder="pdb_files", consec=False, accelerated=True,
+                      cache=None, fast_rotamers=False):
+    """
+    Generates the 19 mutations of one position and inserts the atom types
+
+    Parameters
+    ___________
+    mutation: str
+        chain ID:position of the residue, for example A:139
+    input_: str
+        Input pdb to be used to generate the mutations
+    hydrogens: bool, optional
+        Leave it true since it removes hydrogens (mostly unnecessary) but creates an error for CYS
+    folder: str, optional
+        The name of the folder where the new PDb files will be stored
+    consec: bool, optional
+        Consecutively mutate the PDB file for several rounds
+    accelerated: bool, optional
+        Insert the atom types in parallel, False inside the workers of a pool since they cannot start processes
+    cache: str, optional
+        A folder to keep the mutants so that identical ones are linked instead of generated again
+    fast_rotamers: bool, optional
+        Score the rotamers with numpy instead of with pmx
+
+    Returns
+    ________
+    final_pdbs: list[paths]
+        The new files
+    failed: list[tuple(path, str)]
+        The files where the atom types could not be inserted and the error, they are not in final_pdbs
+    """
+    run = Mutagenesis(input_, mutation, folder, consec, cache=cache, fast_rotamers=fast_rotamers)
+    run.saturated_mutagenesis(hydrogens=hydrogens)
+    if accelerated:
+        failed = run.accelerated_insert()
+    else:
+        failed = run.insert_atomtypes()
+
+    return run.final_pdbs, failed
+
+
+def generate_mutations(input_, position, hydrogens=True, multiple=False, folder="pdb_files", consec=False,
+                       rotamer_cache=None, workers=1, compact=False, cache=None, fast_rotamers=False, log=None):
+    """
+    To generate up to 2 mutations per pdb
+
+    Parameters
+    ___________
+    input_: str
+        Input pdb to be used to generate the mutations
+    position: list[str]
+        [chain ID:position] of the residue, for example [A:139,..]
+    hydrogens: bool, optional
+        Leave it true since it removes hydrogens (mostly unnecessary) but creates an error for CYS
+    multiple: bool, optional
+        Specify if to mutate 2 positions at the same pdb, the double mutants are named after both mutations
+    folder: str, optional
+        The name of the folder where the new PDb files will be stored
+    consec: bool, optional
+        Consecutively mutate the PDB file for several rounds
+    rotamer_cache: str, optional
+        A file to keep a pre-parsed copy of the rotamer library
+    workers: int, optional
+        The number of positions to mutate in parallel, also used for the double mutants
+    compact: bool, optional
+        Store the mutants as patches of original.pdb in one file, the full PDBs are written later with
+        compact.materialize
+    cache: str, optional
+        A folder to keep the mutants, the ones already generated with the same input, position, residue,
+        hydrogens, rotamer library and rotamer scoring are linked from there instead of generated again
+    fast_rotamers: bool, optional
+        Score the rotamers with numpy instead of with pmx, the same rotamers are chosen
+    log: helper.Log, optional
+        The log that keeps the time and memory of each stage
+
+    Returns
+    ________
+    pdbs: list[paths]
+        The list of all generated pdbs' path, without the ones where the atom types could not be inserted
+    """
+    if log is None:
+        log = Log(None)
+    pdbs = []
+    failed = []
+    with log.timer("load_rotamers"):
+        rotamers = load_rotamers(rotamer_cache)
+    if workers > 1 and len(position) > 1:
+        with log.timer("saturation", positions=len(position), workers=workers):
+            # the wild type is written before the pool starts so that the workers only read it
+            run = Mutagenesis(input_, position[0], folder, consec, rotamers)
+            run._check_coords()
+            failed.extend(run.insert_atomtypes())
+            pdbs.extend(run.final_pdbs)
+            # Perform the single saturated mutations of each position in parallel
+            pool = mp.Pool(min(workers, len(position)))
+            func = partial(saturate_position, input_=input_, hydrogens=hydrogens, folder=folder, consec=consec,
+                           accelerated=False, cache=cache, fast_rotamers=fast_rotamers)
+            for final_pdbs, position_failed in pool.map(func, position, 1):
+                pdbs.extend(final_pdbs)
+                failed.extend(position_failed)
+            pool.close()
+            pool.join()
+    else:
+        # Perform single saturated mutations
+        for mutation in position:
+            with log.timer("saturation", position=mutation):
+                final_pdbs, position_failed = saturate_position(mutation, input_, hydrogens, folder, consec,
+                                                                cache=cache, fast_rotamers=fast_rotamers)
+                pdbs.extend(final_pdbs)
+                failed.extend(position_failed)
+
+    # Mutate in a second position for each of the single mutations of the first one, in memory
+    if multiple and len(position) == 2:
+        residues = Mutagenesis.residues
+        with log.timer("double_mutants", position="{} {}".format(*position), workers=workers):
+            if workers > 1:
+                pool = mp.Pool(min(workers, len(residues)), initializer=_init_double,
+                               initargs=(input_, position[0], folder, consec, fast_rotamers))
+                func = partial(_double_mutants, position=position[1], hydrogens=hydrogens)
+                for final_pdbs, double_failed in pool.map(func, residues, 1):
+                    pdbs.extend(final_pdbs)
+                    failed.extend(double_failed)
+                pool.close()
+                pool.join()
+            else:
+                run = Mutagenesis(input_, position[0], folder, consec, rotamers, fast_rotamers=fast_rotamers)
+                run._check_coords()
+                for new_aa in residues:
+                    pdbs.extend(run.double_mutagenesis(position[1], new_aa, hydrogens))
+                failed.extend(run.failed)
+
+    for prep_pdb, error in failed:
+        log.warning("The atom types could not be inserted in {}, it is left out: {}".format(prep_pdb, error))
+
+    if compact:
+        name = basename(input_).replace(".pdb", "")
+        with log.timer("compact", mutants=len(pdbs)):
+            compact_pdbs(pdbs, "{}/original.pdb".format(folder), "{}/{}.patch".format(folder, name))
+
+    return pdbs
+
+
+def main():
+    input_, position, hydrogen, multiple, folder, consec, rotamer_cache, workers, compact, cache, \
+        fast_rotamers = parse_args()
+    log = Log("mutate_pdb")
+    output = generate_mutations(input_, position, hydrogen, multiple, folder, consec, rotamer_cache, workers, compact,
+                                cache, fast_rotamers, log)
+
+    return output
+
+
+if __name__ == "__main__":
+    # Run this if this file is executed from command line but not if is imported as API
+    all_pdbs = main()
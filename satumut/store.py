@@ -0,0 +1,195 @@
+"""
+This module keeps the steps of the PELE reports of all the positions in one SQLite file, so that the simulations can
+be ranked again without reading the reports
+"""
+
+import sqlite3
+import json
+import numpy as np
+import pandas as pd
+
+
+def _quote(name):
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+def connect(store):
+    """
+    Opens the store and creates its tables if it is new
+
+    Parameters
+    ___________
+    store: str
+        The path to the SQLite file
+
+    Returns
+    _______
+    conn: sqlite3.Connection
+        The connection in autocommit mode, the writes open their own transactions
+    """
+    # several positions can be stored at the same time by different processes
+    conn = sqlite3.connect(store, timeout=600, isolation_level=None)
+    conn.execute("CREATE TABLE IF NOT EXISTS simulations (position TEXT, mutation TEXT, folder TEXT, "
+                 "signature TEXT, steps INTEGER, PRIMARY KEY (position, mutation))")
+    conn.execute("CREATE TABLE IF NOT EXISTS steps (position TEXT, mutation TEXT, replica INTEGER)")
+    conn.execute("CREATE INDEX IF NOT EXISTS steps_simulation ON steps (position, mutation)")
+
+    return conn
+
+
+def _columns(conn):
+    """
+    The columns of the steps table with their types
+    """
+    return [(row[1], row[2]) for row in conn.execute("PRAGMA table_info(steps)")]
+
+
+def write_simulation(store, position, mutation, folder, chunks, signature):
+    """
+    Replaces the steps of a simulation in the store unless they were stored from the same reports
+
+    Parameters
+    ___________
+    store: str
+        The path to the SQLite file
+    position: str
+        The name of the position, for example T454
+    mutation: str
+        The name of the mutation, for example T454A, or original for the wild type
+    folder: str
+        The path to the simulation
+    chunks: iterable
+        The rows of the reports in dataframes with the ID column, they are only read if the reports changed
+    signature: list
+        The size and modification time of the reports, as returned by helper.file_signature
+
+    Returns
+    _______
+    written: bool
+        False if the simulation was already stored from the same reports
+    """
+    signature = json.dumps(signature)
+    conn = connect(store)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        stored = conn.execute("SELECT signature FROM simulations WHERE position = ? AND mutation = ?",
+                              (position, mutation)).fetchone()
+        if stored is not None and stored[0] == signature:
+            conn.execute("ROLLBACK")
+            return False
+        conn.execute("DELETE FROM steps WHERE position = ? AND mutation = ?", (position, mutation))
+        existing = set(name for name, _ in _columns(conn))
+        steps = 0
+        for chunk in chunks:
+            chunk = chunk.rename(columns={"ID": "replica"})
+            for name in chunk.columns:
+                if name not in existing:
+                    type_ = "INTEGER" if np.issubdtype(chunk[name].dtype, np.integer) else "REAL"
+                    conn.execute("ALTER TABLE steps ADD COLUMN {} {}".format(_quote(name), type_))
+                    existing.add(name)
+            columns = ["position", "mutation"] + list(chunk.columns)
+            values = [[position] * len(chunk), [mutation] * len(chunk)] + [chunk[x].tolist() for x in chunk.columns]
+            conn.executemany("INSERT INTO steps ({}) VALUES ({})".format(", ".join(_quote(x) for x in columns),
+                                                                         ", ".join("?" * len(columns))),
+                             zip(*values))
+            steps += len(chunk)
+        conn.execute("INSERT OR REPLACE INTO simulations VALUES (?, ?, ?, ?, ?)",
+                     (position, mutation, folder, signature, steps))
+        conn.execute("COMMIT")
+    except BaseException:
+        try:
+            conn.execute("ROLLBACK")
+        except sqlite3.OperationalError:
+            # there was no transaction to roll back
+            pass
+        raise
+    finally:
+        conn.close()
+
+    return True
+
+
+def _where(positions=None, mutations=None):
+    """
+    The condition to select some positions and mutations with its parameters
+    """
+    conditions = []
+    params = []
+    for column, values in (("position", positions), ("mutation", mutations)):
+        if values is not None:
+            values = list(values)
+            conditions.append("{} IN ({})".format(column, ", ".join("?" * len(values)) or "NULL"))
+            params.extend(values)
+    if not conditions:
+        return "", params
+    return " WHERE " + " AND ".join(conditions), params
+
+
+def load_simulations(store, positions=None, mutations=None):
+    """
+    Reads the simulations kept in the store
+
+    Parameters
+    ___________
+    store: str
+        The path to the SQLite file
+    positions: iterable, optional
+        Only these positions, all of them by default
+    mutations: iterable, optional
+        Only these mutations, all of them by default
+
+    Returns
+    _______
+    simulations: pd.DataFrame
+        The position, mutation, folder and number of steps of each simulation
+    """
+    where, params = _where(positions, mutations)
+    conn = connect(store)
+    try:
+        return pd.read_sql_query("SELECT position, mutation, folder, steps FROM simulations{} "
+                                 "ORDER BY position, mutation".format(where), conn, params=params)
+    finally:
+        conn.close()
+
+
+def load_steps(store, positions=None, mutations=None, columns=None):
+    """
+    Reads the steps of the reports kept in the store
+
+    Parameters
+    ___________
+    store: str
+        The path to the SQLite file
+    positions: iterable, optional
+        Only the steps of these positions, all of them by default
+    mutations: iterable, optional
+        Only the steps of these mutations, all of them by default
+    columns: iterable, optional
+        The columns of the reports to read, all of them by default
+
+    Returns
+    _______
+    steps: pd.DataFrame
+        The position, mutation and replica of each step with the columns of the reports, with the same compact
+        types used by the analysis
+    """
+    where, params = _where(positions, mutations)
+    conn = connect(store)
+    try:
+        types = _columns(conn)
+        if columns is None:
+            columns = [x for x, _ in types if x not in ("position", "mutation", "replica")]
+        types = dict(types)
+        missing = [x for x in columns if x not in types]
+        if missing:
+            raise Exception("The columns {} are not in {}".format(", ".join(missing), store))
+        names = ["position", "mutation", "replica"] + list(columns)
+        data = pd.read_sql_query("SELECT {} FROM steps{}".format(", ".join(_quote(x) for x in names), where), conn,
+                                 params=params)
+    finally:
+        conn.close()
+    data["replica"] = data["replica"].astype(np.int16)
+    for name in columns:
+        data[name] = data[name].astype(np.int32 if types[name] == "INTEGER" else np.float32)
+
+    return data
@@ -1,84 +1,347 @@
-"""
-This module tests the analysis module
-"""
-
-from ..analysis import SimulationData, analyse_all, box_plot, all_profiles, extract_snapshot_from_pdb
-from ..analysis import create_report, consecutive_analysis
-import pandas as pd
-import pytest
-import os
-import shutil
-
-
-class TestSimulationData:
-    """
-    It is a class to test the SimulationData class
-    """
-
-    def test_filtering(self):
-        """
-        To test the filtering function in SimulationData
-        """
-        data = SimulationData("data/test/PELE/PELE_original")
-        assert isinstance(data.dataframe, (pd.DataFrame, pd.Series)), "report is not read correctly"
-        assert isinstance(data.profile, (pd.DataFrame, pd.Series))
-        assert isinstance(data.trajectory, (pd.DataFrame, pd.Series))
-        assert isinstance(data.distance, (pd.DataFrame, pd.Series))
-        assert isinstance(data.binding, (pd.DataFrame, pd.Series))
-
-
-@pytest.fixture()
-def test_analyse_all():
-    """
-    Test the analyse_all function
-    """
-    data_dict = analyse_all("data/test/PELE/T454")
-    assert type(data_dict) == dict, "data_dict not a dictionary"
-    assert isinstance(data_dict["original"], (pd.DataFrame, pd.Series)), "There is no dataframe in the dictionary"
-
-    return data_dict
-
-
-def test_boxplot(test_analyse_all):
-    """
-    A function to test the boxplot function
-    """
-    box_plot("data/test/test", test_analyse_all, "test")
-    assert os.path.exists("data/test/test_results/Plots/box/test_binding.png"), "the boxplot is not correct"
-    if os.path.exists("data/test/test_results"):
-        shutil.rmtree("data/test/test_results")
-
-
-def test_pele_profiles(test_analyse_all):
-    """
-    Test the all_profiles function
-    """
-    all_profiles("data/test/test", test_analyse_all, "test")
-    path = "data/test/test_results/Plots/scatter_test_distance0.5/{}_distance0.5.png"
-    assert os.path.exists(path), "pele_profiles not correct"
-    if os.path.exists(path):
-        shutil.rmtree("data/test/test_results")
-
-
-def test_extract_snapshot():
-    """
-    Test the extract_snapshot_from_pdb function
-    """
-    extract_snapshot_from_pdb("data/test/test", "data/test/PELE/PELE_original", 1, "test", "test", 10, -12, -3)
-    path_ = "{}_results/distances_{}/{}_pdbs".format("data/test/test", "test", "test")
-    name = "traj{}_step{}_dist{}_bind{}.pdb".format(1, 10, -12, -3)
-    assert os.path.exists(os.path.join(path_, name)), "the trajectories has not been created"
-    if os.path.exists(path_):
-        shutil.rmtree("data/test/test_results")
-
-
-def test_create_report(test_analyse_all):
-    """
-    To test the create report function
-    """
-    summary = create_report("data/test/plot", test_analyse_all, "T454")
-    assert os.path.exists(summary), "the summary has not been created"
-    if os.path.exists(summary):
-        shutil.rmtree("data/test/test_results")
-
-
+"""
+This module tests the analysis module
+"""
+
+from ..analysis import SimulationData, analyse_all, box_plot, all_profiles, extract_snapshot_from_pdb
+from ..analysis import create_report, consecutive_analysis, read_reports, read_model, trajectory_index
+from ..analysis import extract_snapshots, load_original, original_folder, profile_tasks, render_plots
+from ..analysis import select_mutations, LiveSimulation, StreamingSimulation, QuantileSketch
+import numpy as np
+from ..helper import ArtifactCache
+import pandas as pd
+import json
+import pytest
+import os
+import shutil
+from glob import glob
+from os.path import basename
+
+
+class TestSimulationData:
+    """
+    It is a class to test the SimulationData class
+    """
+
+    def test_filtering(self):
+        """
+        To test the filtering function in SimulationData
+        """
+        data = SimulationData("data/test/PELE/PELE_original")
+        assert isinstance(data.dataframe, (pd.DataFrame, pd.Series)), "report is not read correctly"
+        assert isinstance(data.profile, (pd.DataFrame, pd.Series))
+        assert isinstance(data.trajectory, (pd.DataFrame, pd.Series))
+        assert isinstance(data.distance, (pd.DataFrame, pd.Series))
+        assert isinstance(data.binding, (pd.DataFrame, pd.Series))
+
+    def test_compact_dtypes(self):
+        """
+        To test that the frames of the simulation keep the compact types of the reports
+        """
+        data = SimulationData("data/test/PELE/T454/PELE_T454A")
+        data.filtering()
+        assert set(data.profile.dtypes) == {np.dtype(np.float32)}, "the profile is not compact"
+        assert data.trajectory["ID"].dtype == np.int16, "the trajectory is not compact"
+        assert data.trajectory["numberOfAcceptedPeleSteps"].dtype == np.int32, "the trajectory is not compact"
+        assert data.dataframe.memory_usage(index=False).sum() <= 26 * len(data.dataframe), "the dataframe is too big"
+
+    def test_filtering_top_k(self):
+        """
+        To test that the partial selection gives the same values as sorting all the rows
+        """
+        data = SimulationData("data/test/PELE/T454/PELE_T454A")
+        data.filtering()
+        full = read_reports("data/test/PELE/T454/PELE_T454A").sort_values(by="Binding Energy")
+        full = full.iloc[:len(full) - 99]
+        best = full.iloc[:len(full) * 20 // 100].sort_values(by="distance0.5").iloc[:data.points]
+        assert sorted(data.dataframe["Binding Energy"]) == list(full["Binding Energy"]), "wrong rows left out"
+        assert list(data.distance) == list(best["distance0.5"]), "wrong distances for the box plots"
+        assert list(data.binding) == sorted(best["Binding Energy"]), "wrong binding energies for the box plots"
+        assert list(data.trajectory["distance0.5"]) == sorted(full["distance0.5"])[:data.pdb], "wrong snapshots"
+
+
+def test_streaming_simulation():
+    """
+    Test that reading the reports in chunks gives the same selection as reading all of them
+    """
+    data = SimulationData("data/test/PELE/T454/PELE_T454A")
+    data.filtering()
+    stream = StreamingSimulation("data/test/PELE/T454/PELE_T454A")
+    stream.filtering()
+    assert list(stream.distance) == list(data.distance), "wrong distances for the box plots"
+    assert list(stream.binding) == list(data.binding), "wrong binding energies for the box plots"
+    assert list(stream.trajectory.columns) == list(data.trajectory.columns), "wrong columns of the snapshots"
+    assert list(stream.trajectory["distance0.5"]) == list(data.trajectory["distance0.5"]), "wrong snapshots"
+    assert sorted(stream.dataframe["Binding Energy"]) == sorted(data.dataframe["Binding Energy"]), "wrong rows"
+    sample = StreamingSimulation("data/test/PELE/T454/PELE_T454A", sample=50)
+    sample.filtering()
+    assert len(sample.dataframe) <= 50 and sample.rows == len(data.dataframe), "the sample is not bounded"
+    sketch = QuantileSketch(capacity=64)
+    sketch.update(np.arange(1000.0))
+    assert abs(sketch.kth(500) - 499) < 100 and sum(len(x) for x in sketch.levels) <= 64 * 5, "wrong quantile"
+
+
+def test_read_reports():
+    """
+    Test that all the reports are read in one pass with the IDs of the reports
+    """
+    data = read_reports("data/test/PELE/PELE_original")
+    with open("data/test/PELE/PELE_original/output/0/report_2") as report:
+        header = report.readline()
+        lines = len(report.readlines())
+    assert list(data.columns) == ["ID"] + [x for x in header.strip().split("    ")][1:], "wrong columns"
+    assert (data["ID"] == 2).sum() == lines, "the rows are not assigned to their report"
+    assert data["Binding Energy"].dtype == np.float32 and data["Step"].dtype == np.int32, "wrong dtypes"
+    assert data["ID"].dtype == np.int16, "the IDs of the reports are not compact"
+
+
+def test_blank_lines(tmpdir):
+    """
+    Test that the empty lines of the reports are skipped and the rows keep the ID of their report
+    """
+    output = tmpdir.mkdir("PELE_T454A").mkdir("output").mkdir("0")
+    for files in glob("data/test/PELE/T454/PELE_T454A/output/0/report_*"):
+        with open(files) as report:
+            lines = report.readlines()
+        # an empty line before the first step, one in the middle and blank lines at the end
+        output.join(basename(files)).write("".join(lines[:1] + ["\n"] + lines[1:50] + ["   \n"] + lines[50:] +
+                                                   ["\n", "\n"]))
+    folder = str(tmpdir.join("PELE_T454A"))
+    clean = read_reports("data/test/PELE/T454/PELE_T454A").sort_values(["ID", "Step"]).reset_index(drop=True)
+    data = read_reports(folder).sort_values(["ID", "Step"]).reset_index(drop=True)
+    assert data.equals(clean), "the rows are not read as in the reports without empty lines"
+    full = SimulationData("data/test/PELE/T454/PELE_T454A")
+    full.filtering()
+    for simulation in (StreamingSimulation(folder), LiveSimulation(folder)):
+        if isinstance(simulation, LiveSimulation):
+            simulation.update()
+        else:
+            simulation.filtering()
+        assert simulation.rows == len(full.dataframe), "the rows are not all read"
+        assert list(simulation.distance) == list(full.distance), "wrong distances for the box plots"
+
+
+def test_live_simulation(tmpdir):
+    """
+    Test that only the new lines of the reports are read and that a line being written is left for later
+    """
+    with open("data/test/PELE/T454/PELE_T454A/output/0/report_1") as report:
+        lines = report.readlines()
+    report = tmpdir.mkdir("PELE_T454A").mkdir("output").mkdir("0").join("report_1")
+    report.write("".join(lines[:150]) + lines[150][:10])
+    data = LiveSimulation(str(tmpdir.join("PELE_T454A")))
+    assert data.update() == 149, "the complete lines are not read"
+    report.write(lines[150][10:] + "".join(lines[151:]), mode="a")
+    assert data.update() == len(lines) - 150, "the new lines are not read"
+    assert data.update() == 0, "the lines are read again"
+    assert len(data.dataframe) == len(lines) - 1 - 99, "the rows are not selected again"
+
+
+def test_live_simulation_bounded(tmpdir):
+    """
+    Test that the updates keep a bounded state with the same selection as reading all the reports and that a report
+    written again from the beginning is not counted twice
+    """
+    full = SimulationData("data/test/PELE/T454/PELE_T454A")
+    full.filtering()
+    output = tmpdir.mkdir("PELE_T454A").mkdir("output").mkdir("0")
+    reports = sorted(glob("data/test/PELE/T454/PELE_T454A/output/0/report_*"))
+    for files in reports:
+        shutil.copy(files, str(output))
+    # few shortest distances so that the box plots need the reports again
+    data = LiveSimulation(str(tmpdir.join("PELE_T454A")), sample=50, pool=10)
+    data.update()
+    assert len(data.dataframe) <= 50 and data.rows == len(full.dataframe), "the sample is not bounded"
+    assert len(data._closest) == data.pool and len(data._worst) == 99, "the state is not bounded"
+    assert list(data.distance) == list(full.distance), "wrong distances for the box plots"
+    assert list(data.binding) == list(full.binding), "wrong binding energies for the box plots"
+    assert list(data.trajectory["distance0.5"]) == list(full.trajectory["distance0.5"]), "wrong snapshots"
+    first = output.join(basename(reports[0]))
+    second = output.join(basename(reports[1]))
+    removed = len(first.readlines()) + len(second.readlines()) - 2
+    first.write(first.readlines()[0])
+    second.write(second.readlines()[0])
+    data.update()
+    assert data.rows == len(full.dataframe) - removed, "the rows of the reports written again are counted twice"
+
+
+@pytest.fixture()
+def test_analyse_all():
+    """
+    Test the analyse_all function
+    """
+    data_dict = analyse_all("data/test/PELE/T454")
+    assert type(data_dict) == dict, "data_dict not a dictionary"
+    assert isinstance(data_dict["original"], (pd.DataFrame, pd.Series)), "There is no dataframe in the dictionary"
+
+    return data_dict
+
+
+def test_load_original(tmpdir):
+    """
+    Test that the wild type is only analysed once and is kept in the cache of the analysis
+    """
+    folder = original_folder("data/test/PELE/T454")
+    memo = {}
+    cache = ArtifactCache(str(tmpdir.join("cache")))
+    original = load_original(folder, memo=memo, cache=cache)
+    assert load_original(folder, memo=memo) is original, "the wild type is analysed again"
+    assert load_original(folder, cache=cache).distance == original.distance, "the cache is not read"
+    assert len(tmpdir.join("cache").listdir()) == 1, "the wild type is kept more than once"
+    data_dict = analyse_all("data/test/PELE/T454", original=original)
+    assert data_dict["original"] is original, "the wild type is not shared between positions"
+
+
+def test_boxplot(test_analyse_all):
+    """
+    A function to test the boxplot function
+    """
+    box_plot("data/test/test", test_analyse_all, "test")
+    assert os.path.exists("data/test/test_results/Plots/box/test_binding.png"), "the boxplot is not correct"
+    if os.path.exists("data/test/test_results"):
+        shutil.rmtree("data/test/test_results")
+
+
+def test_pele_profiles(test_analyse_all):
+    """
+    Test the all_profiles function
+    """
+    all_profiles("data/test/test", test_analyse_all, "test")
+    path = "data/test/test_results/Plots/scatter_test_distance0.5/{}_distance0.5.png"
+    assert os.path.exists(path), "pele_profiles not correct"
+    if os.path.exists(path):
+        shutil.rmtree("data/test/test_results")
+
+
+@pytest.fixture()
+def data_t454():
+    return analyse_all("data/test/PELE/T454")
+
+
+def test_render_plots(data_t454):
+    """
+    Test that the scatter plots are rendered in a pool with the same names
+    """
+    tasks = profile_tasks("data/test/test", data_t454, "test", dpi=50)
+    assert len(tasks) == 3 * (len(data_t454) - 1), "wrong number of plots"
+    render_plots(tasks, workers=2)
+    for key in data_t454:
+        if key != "original":
+            path = "data/test/test_results/Plots/scatter_test_sasaLig/{}_sasaLig.png".format(key)
+            assert os.path.exists(path), "the plots are not rendered"
+    shutil.rmtree("data/test/test_results")
+
+
+def test_lazy_plots(data_t454):
+    """
+    Test that only the plots of the selected mutations are prepared in the lazy mode
+    """
+    selected = select_mutations(data_t454, "distance", thres=1000)
+    tasks = profile_tasks("data/test/test", data_t454, "test", keys=selected)
+    assert len(tasks) == 3 * len(selected), "the plots are not limited to the selected mutations"
+    assert profile_tasks("data/test/test", data_t454, "test", keys=[]) == [], "plots of other mutations"
+    shutil.rmtree("data/test/test_results", ignore_errors=True)
+
+
+def test_extract_snapshot():
+    """
+    Test the extract_snapshot_from_pdb function
+    """
+    extract_snapshot_from_pdb("data/test/test", "data/test/PELE/PELE_original", 1, "test", "test", 10, -12, -3)
+    path_ = "{}_results/distances_{}/{}_pdbs".format("data/test/test", "test", "test")
+    name = "traj{}_step{}_dist{}_bind{}.pdb".format(1, 10, -12, -3)
+    assert os.path.exists(os.path.join(path_, name)), "the trajectories has not been created"
+    if os.path.exists(path_):
+        shutil.rmtree("data/test/test_results")
+
+
+def test_read_model(tmpdir):
+    """
+    Test that the models are read through the index of the trajectory
+    """
+    traj = tmpdir.join("trajectory_1.pdb")
+    traj.write("".join("MODEL     {}\nATOM {}\nENDMDL\n".format(x, x) for x in range(1, 13)))
+    assert read_model(str(traj), 12) == "\nATOM 12\n", "the wrong model is read"
+    assert read_model(str(traj), 13) is None, "a missing model is found"
+    assert tmpdir.join("trajectory_1.pdb.index").check(), "the index is not kept next to the trajectory"
+    traj.write("MODEL     13\nATOM 13\nENDMDL\n", mode="a")
+    assert 13 in trajectory_index(str(traj)), "the index is not updated"
+    other = tmpdir.join("trajectory_2.pdb")
+    other.write("REMARK MODELLED BY PELE\nMODEL     1\nATOM 1\nENDMDL\nMODEL\nMODEL     2\nATOM 2\nENDMDL\n")
+    assert sorted(trajectory_index(str(other))) == [1, 2], "a model after another MODEL word is skipped"
+
+
+def test_extract_snapshots(tmpdir):
+    """
+    Test that the snapshots are extracted in one pass and the missing ones are reported together
+    """
+    traj = tmpdir.mkdir("PELE_T454A").mkdir("output").mkdir("0").join("trajectory_1.pdb")
+    traj.write("".join("MODEL     {}\nATOM {}\nENDMDL\n".format(x, x) for x in range(1, 13)))
+    res_dir = str(tmpdir.join("test"))
+    missing = extract_snapshots(res_dir, str(tmpdir.join("PELE_T454A")), "T454", "T454A",
+                                [(1, 4, 1.5, -3.0), (1, 0, 2.0, -1.0), (2, 0, 1.0, 1.0), (1, 40, 1.0, 1.0)])
+    assert sorted(missing) == ["trajectory_1 step 40", "trajectory_2 step 0"], "the missing snapshots are not reported"
+    with open("{}_results/distances_T454/T454A_pdbs/traj1_step4_dist1.5_bind-3.0.pdb".format(res_dir)) as pdb:
+        assert pdb.read() == "MODEL     5\n\nATOM 5\n\nENDMDL\n", "the wrong model is extracted"
+
+
+def test_create_report(test_analyse_all):
+    """
+    To test the create report function
+    """
+    summary = create_report("data/test/plot", test_analyse_all, "T454")
+    assert os.path.exists(summary), "the summary has not been created"
+    if os.path.exists(summary):
+        shutil.rmtree("data/test/test_results")
+
+
+@pytest.fixture()
+def campaign(tmpdir):
+    """
+    Two positions that share the wild type
+    """
+    pele = tmpdir.mkdir("PELE")
+    shutil.copytree("data/test/PELE/PELE_original", str(pele.join("PELE_original")))
+    for position, mutation in (("T454", "T454A"), ("T455", "T455G")):
+        shutil.copytree("data/test/PELE/T454/PELE_T454A", str(pele.join(position, "PELE_{}".format(mutation))))
+    return pele
+
+
+def _results(plot_dir):
+    """
+    The messages of the positions in the log and the files created by an analysis
+    """
+    with open("{}_results/top_mutations.log".format(plot_dir)) as log:
+        lines = sorted(line for line in log if "position" in line)
+    files = []
+    for root, _, names in os.walk("{}_results".format(plot_dir)):
+        files.extend(os.path.relpath(os.path.join(root, name), "{}_results".format(plot_dir)) for name in names
+                     if not name.endswith((".log", ".json", ".db")))
+    return lines, sorted(files)
+
+
+def test_parallel_positions(campaign, tmpdir):
+    """
+    Test that the positions analysed in several processes give the same results as one after the other
+    """
+    folders = [str(campaign.join("T454")), str(campaign.join("T455"))]
+    consecutive_analysis(folders, dpi=20, plot_dir=str(tmpdir.join("serial")), cpus=2, thres=1000)
+    consecutive_analysis(folders, dpi=20, plot_dir=str(tmpdir.join("parallel")), cpus=2, thres=1000, positions=2)
+    lines, files = _results(str(tmpdir.join("parallel")))
+    assert (lines, files) == _results(str(tmpdir.join("serial"))), "the positions give other results in parallel"
+    assert any("position T455" in line for line in lines), "the records of the processes are not in the log"
+    with open(str(tmpdir.join("parallel_results", "analysis_metrics.jsonl"))) as metrics:
+        stages = [(x["stage"], x.get("position")) for x in map(json.loads, metrics)]
+    assert ("report", "T455") in stages, "the metrics of the processes are lost"
+
+
+def test_parallel_positions_error(campaign, tmpdir):
+    """
+    Test that an error in one of the processes is reported and the other positions are still analysed
+    """
+    report = campaign.mkdir("T456").mkdir("PELE_T456C").mkdir("output").mkdir("0").join("report_1")
+    report.write("#Task    Step    numberOfAcceptedPeleSteps    \n1    0    0    \n")
+    folders = [str(campaign.join("T454")), str(campaign.join("T456"))]
+    with pytest.raises(Exception) as error:
+        consecutive_analysis(folders, dpi=20, plot_dir=str(tmpdir.join("test")), cpus=2, thres=1000, positions=2)
+    assert "T456" in str(error.value) and "Binding Energy" in str(error.value), "the error is lost"
+    assert any("position T454" in line for line in _results(str(tmpdir.join("test")))[0]), "T454 is not analysed"
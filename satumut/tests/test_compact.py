@@ -0,0 +1,29 @@
+"""
+This module tests the compact module
+"""
+
+from ..compact import compact_pdbs, find_patch, materialize, patch_index
+import shutil
+import os
+
+
+def test_compact_pdbs(tmpdir):
+    """
+    Test that a compact mutant is written back exactly as it was
+    """
+    base = str(tmpdir.join("original.pdb"))
+    shutil.copy("data/test/original.pdb", base)
+    with open(base, "r") as pdb:
+        lines = pdb.readlines()
+    mutant = str(tmpdir.join("T454A.pdb"))
+    with open(mutant, "w") as pdb:
+        pdb.writelines(lines[:100] + lines[103:])
+    patch_file = compact_pdbs([base, mutant], base, str(tmpdir.join("PK2_F454T.patch")))
+    assert not os.path.exists(mutant), "the mutant has not been compacted"
+    assert os.path.getsize(patch_file) < os.path.getsize(base), "the patch is not compact"
+    assert find_patch(mutant) == patch_file, "the patch file is not found"
+    assert patch_index(str(tmpdir)) == {"T454A.pdb": patch_file}, "the mutants are not mapped to their patch"
+
+    pdbs = materialize(patch_file)
+    with open(pdbs[0], "r") as pdb:
+        assert pdb.readlines() == lines[:100] + lines[103:], "the mutant is not written back correctly"
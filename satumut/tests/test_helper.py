@@ -0,0 +1,119 @@
+"""
+This module tests the helper module
+"""
+
+import json
+import logging
+import multiprocessing as mp
+from ..helper import map_atom_string, map_atom_strings, read_pdb, Log, ArtifactCache, atomic_write
+from ..helper import QueueHandler, listen_logs
+
+
+def test_map_atom_string():
+    """
+    Test the mapping of a single atom string to the pmx PDB
+    """
+    after = map_atom_string("C:1:CU", "data/test/PK2_F454T.pdb", "data/test/original.pdb")
+    assert after == "C:497:CU", "the atom is not mapped correctly"
+
+
+def test_map_atom_strings():
+    """
+    Test the mapping of several positions and atoms in one pass
+    """
+    after = map_atom_strings(["C:1:CU", "L:1:N1", "A:135"], "data/test/PK2_F454T.pdb", "data/test/original.pdb")
+    assert after == ["C:497:CU", "L:501:N1", "A:135"], "the positions are not mapped correctly"
+
+
+def test_read_pdb():
+    """
+    Test that the parsed records are shared between calls
+    """
+    records = read_pdb("data/test/PK2_F454T.pdb")
+    assert records is read_pdb("data/test/PK2_F454T.pdb"), "the PDB is parsed again"
+    assert records.coords.shape == (len(records), 3), "the coordinates are not read correctly"
+    with open("data/test/PK2_F454T.pdb") as pdb:
+        first = [line for line in pdb if line.startswith("ATOM") or line.startswith("HETATM")][0]
+    assert records.element[0] == first.rstrip("\r\n")[66:81], "the element columns are not read correctly"
+
+
+def test_log_timer(tmpdir):
+    """
+    Test that the stages are written in the metrics file next to the log
+    """
+    for _ in range(2):
+        # a new run replaces the metrics of the earlier one
+        log = Log(str(tmpdir.join("test")))
+        with log.timer("stage", position="A:135"):
+            sum(range(1000))
+        log.add([{"stage": "other"}])
+    with open(str(tmpdir.join("test_metrics.jsonl"))) as metrics:
+        records = [json.loads(line) for line in metrics]
+    assert [x["stage"] for x in records] == ["stage", "other"], "the stages are not appended one per line"
+    assert records[0]["position"] == "A:135", "the stage is not recorded"
+    assert records[0]["status"] == "done" and records[0]["seconds"] >= 0, "the metrics are not correct"
+
+
+def test_artifact_cache(tmpdir):
+    """
+    Test that the results are reused until the files they created change
+    """
+    cache = ArtifactCache(str(tmpdir.join("cache")))
+    output = tmpdir.join("plot.png")
+    output.write("image")
+    key = cache.key("plot", 800, [1, 2])
+    assert cache.get(key) is None, "a result is found before it is kept"
+    cache.put(key, "done", [str(output)])
+    assert cache.get(key) == "done", "the result is not reused"
+    assert cache.get(cache.key("plot", 400, [1, 2])) is None, "the inputs are not part of the key"
+    output.remove()
+    assert cache.get(key) is None, "the result is reused after its file is removed"
+
+
+def test_atomic_write(tmpdir):
+    """
+    Test that a file is only replaced once it is completely written
+    """
+    path = tmpdir.join("metrics.json")
+    path.write("old")
+    try:
+        with atomic_write(str(path)) as new:
+            new.write("half")
+            raise ValueError("interrupted")
+    except ValueError:
+        pass
+    assert path.read() == "old" and len(tmpdir.listdir()) == 1, "a half written file is left"
+    with atomic_write(str(path)) as new:
+        new.write("new")
+    assert path.read() == "new", "the file is not replaced"
+
+
+def _log_in_process(queue):
+    logger = logging.getLogger("test_queue")
+    logger.handlers = [QueueHandler(queue)]
+    logger.propagate = False
+    logger.warning("position %s done", "T454")
+    try:
+        raise ValueError("broken report")
+    except ValueError:
+        logger.error("position T455 failed", exc_info=True)
+
+
+def test_queue_handler(tmpdir):
+    """
+    Test that the records of another process are written by the handlers of this one
+    """
+    logger = logging.getLogger("test_queue")
+    handler = logging.FileHandler(str(tmpdir.join("test.log")))
+    logger.handlers = [handler]
+    queue = mp.Queue()
+    process = mp.Process(target=_log_in_process, args=(queue,))
+    process.start()
+    listener = listen_logs(queue)
+    process.join()
+    queue.put(None)
+    listener.join()
+    handler.close()
+    lines = tmpdir.join("test.log").read()
+    assert "position T454 done" in lines and "position T455 failed" in lines, "the records are lost"
+    assert "ValueError: broken report" in lines, "the traceback is lost"
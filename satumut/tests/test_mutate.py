@@ -1,75 +1,190 @@
-"""
-This module provides test of the mutate_pdb.py's functions
-"""
-import pytest
-from ..mutate_pdb import Mutagenesis, generate_mutations
-import os
-from os.path import basename
-
-
-@pytest.fixture()
-def data_m():
-    run = Mutagenesis("data/test/PK2_F454T.pdb", "A:135", "data/test")
-    run._check_coords()
-    return run
-
-
-class TestMutagenesis:
-    """
-    Test the class Mutagenesis on mutate.py
-    """
-    def test_mutate(self, data_m):
-        """
-        It checks if the pmx library is working correctly
-        """
-        from pmx import Model
-
-        assert isinstance(data_m.model, Model), "model not being an instance of Model in pmx"
-        data_m.mutate(data_m.chain.residues[134], "SER", data_m.rotamers)
-        assert data_m.chain.residues[134].resname == "SER", "The mutate function is broken"
-
-    @pytest.mark.slow_s
-    def test_insert(self, data_m):
-        """
-        Checks if insert_atomtype function within the Mutagenesis works
-        """
-        # read in user input
-        file_ = data_m.single_mutagenesis("ALA")
-        assert "135A" in basename(file_), "naming of the file incorrect"
-        assert basename(file_).split(".")[1] == "pdb", "the file format is wrong"
-
-        with open(data_m.input, "r") as initial:
-            initial_lines = initial.readlines()
-        # read in preprocessed input
-        with open("data/test/{}".format(file_), "r") as prep:
-            prep_lines = prep.readlines()
-
-        for line in prep_lines:
-            if line.startswith("HETATM") or line.startswith("ATOM"):
-                for linex in initial_lines:
-                    if linex.startswith("HETATM") or linex.startswith("ATOM"):
-                        assert line[66:81].strip() == linex[66:81].strip(), "atom type insertion incorrect"
-                        break
-                break
-
-        if os.path.exists(file_):
-            os.remove(file_)
-
-
-@pytest.mark.slow
-def test_generate_mutations():
-    """
-    Tests the generate mutations from the mutate_pdb module
-    """
-    pdbs = generate_mutations("data/test/PK2_F454T.pdb", "A:135", folder = "data/test")
-    assert len(pdbs) >= 19, "failure to generate all the files"
-    assert basename(pdbs[0]).split(".")[1] == "pdb", "the file has a wrong format"
-    for f in pdbs:
-        if os.path.isfile(f):
-            os.remove(f)
-
-
-
-
-
-
+"""
+This module provides test of the mutate_pdb.py's functions
+"""
+import pytest
+from ..mutate_pdb import Mutagenesis, generate_mutations
+from .. import mutate_pdb
+import os
+import re
+from os.path import basename
+
+
+@pytest.fixture()
+def data_m():
+    run = Mutagenesis("data/test/PK2_F454T.pdb", "A:135", "data/test")
+    run._check_coords()
+    return run
+
+
+class TestMutagenesis:
+    """
+    Test the class Mutagenesis on mutate.py
+    """
+    def test_mutate(self, data_m):
+        """
+        It checks if the pmx library is working correctly
+        """
+        from pmx import Model
+
+        assert isinstance(data_m.model, Model), "model not being an instance of Model in pmx"
+        data_m.mutate(data_m.chain.residues[134], "SER", data_m.rotamers)
+        assert data_m.chain.residues[134].resname == "SER", "The mutate function is broken"
+
+    @pytest.mark.slow_s
+    def test_select_rotamer(self, data_m):
+        """
+        Checks that the numpy rotamer scoring chooses the same rotamer as pmx
+        """
+        from pmx.rotamer import get_rotamers, select_best_rotamer
+
+        residue = data_m.chain.residues[134]
+        for new_aa in data_m.residues:
+            rotamers = get_rotamers(data_m.rotamers, new_aa, residue.get_phi(), residue.get_psi(), residue=residue,
+                                    full=True, hydrogens=True)
+            best = select_best_rotamer(data_m.model, rotamers)
+            assert data_m.select_rotamer(residue, rotamers) is best, "The {} rotamer differs from pmx".format(new_aa)
+
+    @pytest.mark.slow_s
+    def test_insert_failed(self, data_m, tmpdir):
+        """
+        Checks that a file where the atom types cannot be inserted is left out in the serial and parallel paths
+        """
+        good = str(tmpdir.join("A135S.pdb"))
+        bad = str(tmpdir.join("missing.pdb"))
+        data_m.model.write(good)
+        failed = data_m.insert_atomtypes([good, bad])
+        assert [x[0] for x in failed] == [bad], "the failed file is not reported"
+        data_m.model.write(good)
+        failed = data_m.accelerated_insert([good, bad], cpus=2)
+        assert [x[0] for x in failed] == [bad], "the failed file is not reported by the pool"
+        assert data_m.final_pdbs == [good], "the failed file is kept with the mutants"
+        with open(good, "r") as pdb:
+            atoms = [line for line in pdb if line.startswith("ATOM")]
+        assert atoms[0][66:81].strip(), "the atom types are not inserted in the other files"
+
+    @pytest.mark.slow_s
+    def test_insert(self, data_m):
+        """
+        Checks if insert_atomtype function within the Mutagenesis works
+        """
+        # read in user input
+        file_ = data_m.single_mutagenesis("ALA")
+        assert "135A" in basename(file_), "naming of the file incorrect"
+        assert basename(file_).split(".")[1] == "pdb", "the file format is wrong"
+
+        with open(data_m.input, "r") as initial:
+            initial_lines = initial.readlines()
+        # read in preprocessed input
+        with open("data/test/{}".format(file_), "r") as prep:
+            prep_lines = prep.readlines()
+
+        for line in prep_lines:
+            if line.startswith("HETATM") or line.startswith("ATOM"):
+                for linex in initial_lines:
+                    if linex.startswith("HETATM") or linex.startswith("ATOM"):
+                        assert line[66:81].strip() == linex[66:81].strip(), "atom type insertion incorrect"
+                        break
+                break
+
+        if os.path.exists(file_):
+            os.remove(file_)
+
+
+@pytest.mark.slow_s
+def test_mutant_cache(tmpdir, monkeypatch):
+    """
+    Tests that a second run links the mutants from the cache and that other inputs or rotamers do not use them
+    """
+    cache = str(tmpdir.join("cache"))
+    first = Mutagenesis("data/test/PK2_F454T.pdb", "A:135", str(tmpdir.join("first")), cache=cache)
+    first.saturated_mutagenesis()
+    assert first.insert_atomtypes() == [], "the atom types are not inserted"
+
+    def fail(*args, **kwargs):
+        raise Exception("the mutant is generated again")
+
+    def annotate(prep_pdb, *args):
+        # only the wild type of the new folder is annotated
+        assert "original" in prep_pdb, "the cached mutant is annotated again"
+
+    second = Mutagenesis("data/test/PK2_F454T.pdb", "A:135", str(tmpdir.join("second")), cache=cache)
+    monkeypatch.setattr(second, "mutate", fail)
+    monkeypatch.setattr(mutate_pdb, "annotate_pdb", annotate)
+    pdbs = second.saturated_mutagenesis()
+    assert second.insert_atomtypes() == [], "the cached mutants are annotated again"
+    assert sorted(second.cached) == sorted(x for x in pdbs if "original" not in x), "the mutants are not cached"
+    for pdb in second.cached:
+        assert os.path.samefile(pdb, second._cache_file(mutate_pdb._aacids_dic[pdb[-5]])), "the mutant is not linked"
+        with open(pdb) as new, open(pdb.replace("second", "first")) as old:
+            assert new.read() == old.read(), "the cached mutant is not identical"
+
+    changed = str(tmpdir.join("changed.pdb"))
+    with open("data/test/PK2_F454T.pdb") as initial, open(changed, "w") as new:
+        new.write("REMARK changed\n" + initial.read())
+    other = Mutagenesis(changed, "A:135", str(tmpdir.join("other")), cache=cache)
+    other._check_coords()
+    assert not os.path.exists(other._cache_file("ALA")), "a changed input uses the cache"
+    monkeypatch.setattr(mutate_pdb, "rotamer_version", lambda: "another library")
+    assert not os.path.exists(second._cache_file("ALA")), "another rotamer library uses the cache"
+
+
+@pytest.mark.slow_s
+def test_partial_cache(tmpdir):
+    """
+    Tests that a run with only some of the mutants in the cache writes the same files as a run without cache
+    """
+    cold = Mutagenesis("data/test/PK2_F454T.pdb", "A:135", str(tmpdir.join("cold")))
+    pdbs = cold.saturated_mutagenesis()
+    cold.insert_atomtypes()
+    cache = str(tmpdir.join("cache"))
+    first = Mutagenesis("data/test/PK2_F454T.pdb", "A:135", str(tmpdir.join("first")), cache=cache)
+    first.saturated_mutagenesis()
+    first.insert_atomtypes()
+    # every other mutant has to be generated again after one linked from the cache
+    for ind, new_aa in enumerate(x for x in Mutagenesis.residues if x != "SER"):
+        if ind % 2:
+            os.remove(first._cache_file(new_aa))
+    warm = Mutagenesis("data/test/PK2_F454T.pdb", "A:135", str(tmpdir.join("warm")), cache=cache)
+    warm.saturated_mutagenesis()
+    warm.insert_atomtypes()
+    assert 0 < len(warm.cached) < len(pdbs) - 1, "the cache is not partial"
+    for pdb in pdbs:
+        with open(pdb) as expected, open(pdb.replace("cold", "warm")) as new:
+            assert new.read() == expected.read(), "{} depends on the mutants in the cache".format(basename(pdb))
+
+
+@pytest.mark.slow_s
+@pytest.mark.parametrize("workers", [1, 2])
+def test_double_mutants(tmpdir, workers):
+    """
+    Tests the names, number and atom types of the double mutants in the serial and in the parallel path
+    """
+    folder = str(tmpdir.join("pdb_files"))
+    pdbs = generate_mutations("data/test/PK2_F454T.pdb", ["A:135", "A:136"], multiple=True, folder=folder,
+                              workers=workers)
+    doubles = [basename(x) for x in pdbs if "_" in basename(x)]
+    assert len(set(pdbs)) == len(pdbs) == 1 + 2 * 19 + 19 * 19, "wrong number of mutants"
+    assert all(re.match(r"^S135[A-RT-Z]_L136[A-KM-Z]\.pdb$", x) for x in doubles), "wrong names of the double mutants"
+    for name in doubles[:5]:
+        with open(os.path.join(folder, name), "r") as pdb:
+            atoms = [line for line in pdb if line.startswith("ATOM") and line[22:26].strip() in ("135", "136")]
+        assert atoms and all(line[66:81].strip() for line in atoms), "the atom types of {} are missing".format(name)
+
+
+@pytest.mark.slow
+def test_generate_mutations():
+    """
+    Tests the generate mutations from the mutate_pdb module
+    """
+    pdbs = generate_mutations("data/test/PK2_F454T.pdb", "A:135", folder = "data/test")
+    assert len(pdbs) >= 19, "failure to generate all the files"
+    assert basename(pdbs[0]).split(".")[1] == "pdb", "the file has a wrong format"
+    for f in pdbs:
+        if os.path.isfile(f):
+            os.remove(f)
+
+
+
+
+
+
@@ -1,68 +1,102 @@
-"""
-This module tests the pele files module
-"""
-
-from ..pele_files import CreateLaunchFiles, create_20sbatch
-import pytest
-import shutil
-from os.path import basename, dirname
-import os
-
-
-@pytest.fixture()
-def data_p():
-    run = CreateLaunchFiles("data/test/PK2_F454T.pdb", "L", "ANL", "C:1:CU", "L:1:N1", 5, test=True)
-    return run
-
-
-class TestCreateFiles:
-    """
-    A class to test the CreateLaunchFiles class
-    """
-    def test_yaml(self, data_p):
-        """
-        A function to test the input_creation function
-        """
-        data_p.input_creation("test")
-        assert basename(data_p.yaml).split(".")[1] == "yaml", "the file has the wrong format"
-        with open(data_p.yaml, "r") as fi:
-            assert fi.readline() == "system: '{}'\n".format(data_p.input), "yaml file not created"
-
-        if os.path.exists(dirname(data_p.yaml)):
-            shutil.rmtree(dirname(data_p.yaml))
-
-    def test_slurm(self, data_p):
-        """
-        A function that tests the slurm_creation function
-        """
-        data_p.slurm_creation("test")
-        assert basename(data_p.slurm).split(".")[1] == "sh", "the file has the wrong format"
-        with open(data_p.slurm, "r") as fi:
-            assert fi.readline() == "#!/bin/bash\n", "slurm file not created"
-        if os.path.exists(dirname(data_p.slurm)):
-            shutil.rmtree(dirname(data_p.slurm))
-
-    @pytest.mark.not_finished
-    def test_nord(self, data_p):
-        """
-        A function that tests the slurm_nord function
-        """
-        data_p.slurm_nord("nord")
-        assert basename(data_p.slurm).split(".")[1] == "sh", "the file has the wrong format"
-        with open(data_p.slurm, "r") as fi:
-            assert fi.readline() == "#!/bin/bash\n", "nord file not created"
-        if os.path.exists(dirname(data_p.slurm)):
-            shutil.rmtree(dirname(data_p.slurm))
-
-
-def test_create_20sbatch():
-    """
-    A function to test the create_20sbatch function
-    """
-    slurm_files = create_20sbatch("L", "ANL", "C:1:CU", "L:1:N1", ["data/test/PK2_F454T.pdb"], test=True)
-
-    with open(slurm_files[0], "r") as fi:
-        assert fi.readline() == "#!/bin/bash\n", "slurm file not created"
-
-    if os.path.exists(dirname(slurm_files[0])):
-        shutil.rmtree(dirname(slurm_files[0]))
\ No newline at end of file
+"""
+This module tests the pele files module
+"""
+
+from ..pele_files import CreateLaunchFiles, create_20sbatch
+from ..compact import compact_pdbs, find_patch
+from .. import pele_files
+import pytest
+import shutil
+from os.path import basename, dirname
+import os
+
+
+@pytest.fixture()
+def data_p():
+    run = CreateLaunchFiles("data/test/PK2_F454T.pdb", "L", "ANL", "C:1:CU", "L:1:N1", 5, test=True)
+    return run
+
+
+class TestCreateFiles:
+    """
+    A class to test the CreateLaunchFiles class
+    """
+    def test_yaml(self, data_p):
+        """
+        A function to test the input_creation function
+        """
+        data_p.input_creation("test")
+        assert basename(data_p.yaml).split(".")[1] == "yaml", "the file has the wrong format"
+        with open(data_p.yaml, "r") as fi:
+            assert fi.readline() == "system: '{}'\n".format(data_p.input), "yaml file not created"
+
+        if os.path.exists(dirname(data_p.yaml)):
+            shutil.rmtree(dirname(data_p.yaml))
+
+    def test_slurm(self, data_p):
+        """
+        A function that tests the slurm_creation function
+        """
+        data_p.slurm_creation("test")
+        assert basename(data_p.slurm).split(".")[1] == "sh", "the file has the wrong format"
+        with open(data_p.slurm, "r") as fi:
+            assert fi.readline() == "#!/bin/bash\n", "slurm file not created"
+        if os.path.exists(dirname(data_p.slurm)):
+            shutil.rmtree(dirname(data_p.slurm))
+
+    @pytest.mark.not_finished
+    def test_nord(self, data_p):
+        """
+        A function that tests the slurm_nord function
+        """
+        data_p.slurm_nord("nord")
+        assert basename(data_p.slurm).split(".")[1] == "sh", "the file has the wrong format"
+        with open(data_p.slurm, "r") as fi:
+            assert fi.readline() == "#!/bin/bash\n", "nord file not created"
+        if os.path.exists(dirname(data_p.slurm)):
+            shutil.rmtree(dirname(data_p.slurm))
+
+
+def test_create_20sbatch():
+    """
+    A function to test the create_20sbatch function
+    """
+    slurm_files = create_20sbatch("L", "ANL", "C:1:CU", "L:1:N1", ["data/test/PK2_F454T.pdb"], test=True)
+
+    with open(slurm_files[0], "r") as fi:
+        assert fi.readline() == "#!/bin/bash\n", "slurm file not created"
+
+    if os.path.exists(dirname(slurm_files[0])):
+        shutil.rmtree(dirname(slurm_files[0]))
+
+
+def test_create_20sbatch_compact(tmpdir, monkeypatch):
+    """
+    Test that the mutants of a folder in compact mode get running files that write them before the simulation
+    """
+    folder = tmpdir.mkdir("pdb_files")
+    base = str(folder.join("original.pdb"))
+    shutil.copy("data/test/original.pdb", base)
+    with open(base, "r") as pdb:
+        lines = pdb.readlines()
+    mutant = str(folder.join("T454A.pdb"))
+    with open(mutant, "w") as pdb:
+        pdb.writelines(lines[:100] + lines[103:])
+    patch_file = compact_pdbs([base, mutant], base, str(folder.join("original.patch")))
+    assert find_patch(mutant) == patch_file, "the patch file is not found"
+    monkeypatch.chdir(tmpdir)
+    reads = []
+    patch_index = pele_files.patch_index
+
+    def count(folder):
+        reads.append(folder)
+        return patch_index(folder)
+
+    monkeypatch.setattr(pele_files, "patch_index", count)
+    slurm_files = create_20sbatch("L", "ANL", "C:1:CU", "L:1:N1", str(folder), test=True)
+    assert sorted(basename(x) for x in slurm_files) == ["T454A.sh", "original.sh"], "the mutants are skipped"
+    assert len(reads) == 1, "the patch files are read for each mutant"
+    with open("slurm_files/T454A.sh", "r") as fi:
+        assert "-p {} -m T454A.pdb\n".format(patch_file) in fi.read(), "the mutant is not written before PELE"
+    with open("slurm_files/original.sh", "r") as fi:
+        assert "-p " not in fi.read(), "the wild type is written again"
@@ -0,0 +1,53 @@
+"""
+This module tests the store module
+"""
+
+from ..analysis import store_simulation, read_reports, analyse_all
+from .. import analysis
+from ..store import load_steps, load_simulations
+import numpy as np
+import pytest
+
+
+def test_store_simulation(tmpdir):
+    """
+    Test that the steps of the reports are kept once and read back with their position, mutation and replica
+    """
+    store = str(tmpdir.join("results.db"))
+    assert store_simulation(store, "T454", "T454A", "data/test/PELE/T454/PELE_T454A"), "the steps are not stored"
+    assert not store_simulation(store, "T454", "T454A", "data/test/PELE/T454/PELE_T454A"), "the steps are stored again"
+    store_simulation(store, "original", "original", "data/test/PELE/PELE_original")
+    reports = read_reports("data/test/PELE/T454/PELE_T454A")
+    steps = load_steps(store, mutations=["T454A"])
+    assert len(steps) == len(reports), "the steps are not all stored"
+    assert set(steps["position"]) == {"T454"} and steps["replica"].dtype == np.int16, "the steps are not tagged"
+    assert sorted(steps["Binding Energy"]) == sorted(reports["Binding Energy"]), "the values are not kept"
+    assert list(load_steps(store, columns=["distance0.5"]).columns) == ["position", "mutation", "replica",
+                                                                        "distance0.5"], "wrong columns"
+    simulations = load_simulations(store, positions=["T454"])
+    assert list(simulations["mutation"]) == ["T454A"], "the simulations are not listed"
+    assert load_steps(store, positions=[]).empty, "steps of other positions are read"
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_store_parsed(tmpdir, monkeypatch, stream):
+    """
+    Test that the analysis stores the rows it parses without reading the reports again and the wild type only once
+    """
+    store = str(tmpdir.join("results.db"))
+    reads = []
+    report_chunks = analysis.report_chunks
+
+    def count(folder, *args):
+        reads.append(folder)
+        return report_chunks(folder, *args)
+
+    monkeypatch.setattr(analysis, "report_chunks", count)
+    data_dict = analyse_all("data/test/PELE/T454", stream=stream, store=store)
+    assert len(reads) == (len(data_dict) if stream else 0), "the reports are read again for the store"
+    simulations = load_simulations(store)
+    assert list(simulations["position"]).count("original") == 1, "the wild type is not stored once"
+    assert sorted(simulations["mutation"]) == sorted(data_dict), "the simulations are not all stored"
+    steps = load_steps(store, mutations=["T454A"], columns=["Binding Energy"])
+    reports = read_reports("data/test/PELE/T454/PELE_T454A")
+    assert sorted(steps["Binding Energy"]) == sorted(reports["Binding Energy"]), "the parsed rows are not stored"